@@ -0,0 +1,109 @@
+"""
+Alerts Layer: Settings and upkeep of the materialized stock alerts.
+
+The alert tables (see database._create_alert_tables) are kept current by
+triggers on every product, batch and sale write. What triggers cannot see is
+time passing: each day some batches move into the near-expiry window and
+others expire out of it. roll_forward_expiry_alerts applies that once per day,
+at startup and from the scheduler just after midnight, so that reading the
+alerts never writes.
+"""
+from datetime import date, timedelta
+from database import get_db_connection, rebuild_alert_tables
+
+DEFAULT_NEAR_EXPIRY_DAYS = 30
+
+def _get_setting(conn, key, default=None):
+    row = conn.execute("SELECT value FROM alert_settings WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def _set_setting(conn, key, value):
+    conn.execute(
+        "INSERT INTO alert_settings (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+        (key, str(value))
+    )
+
+def get_near_expiry_days():
+    """Returns the near-expiry horizon in days."""
+    conn = get_db_connection()
+    try:
+        return int(_get_setting(conn, 'near_expiry_days', DEFAULT_NEAR_EXPIRY_DAYS))
+    finally:
+        conn.close()
+
+def set_near_expiry_days(days):
+    """Changes the near-expiry horizon and re-derives the near-expiry alerts for it."""
+    days = int(days)
+    if days < 0:
+        raise ValueError("The near-expiry horizon cannot be negative.")
+    conn = get_db_connection()
+    try:
+        _set_setting(conn, 'near_expiry_days', days)
+        _roll_forward(conn, date.today(), days)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def _roll_forward(conn, today, days):
+    """Moves the near-expiry window to [today, today + days]. Returns (added, removed)."""
+    start = today.strftime('%Y-%m-%d')
+    end = (today + timedelta(days=days)).strftime('%Y-%m-%d')
+    cursor = conn.cursor()
+    cursor.execute(
+        "DELETE FROM near_expiry_alerts WHERE expiry_date < ? OR expiry_date > ?",
+        (start, end)
+    )
+    removed = cursor.rowcount
+    cursor.execute("""
+        INSERT INTO near_expiry_alerts (batch_id, product_id, expiry_date)
+        SELECT b.batch_id, b.product_id, b.expiry_date
+        FROM batches b
+        WHERE b.quantity > 0 AND b.expiry_date BETWEEN ? AND ?
+          AND NOT EXISTS (SELECT 1 FROM near_expiry_alerts a WHERE a.batch_id = b.batch_id)
+    """, (start, end))
+    added = cursor.rowcount
+    _set_setting(conn, 'near_expiry_rolled_forward_on', start)
+    return added, removed
+
+def roll_forward_expiry_alerts(today=None, conn=None):
+    """
+    Brings the near-expiry alerts up to date for `today` (default: today).
+    Does nothing if that was already done today, so it is cheap to call often.
+    With `conn`, runs inside the caller's transaction and does not commit.
+
+    Returns a dict: {'added': count, 'removed': count}
+    """
+    today = today or date.today()
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        if _get_setting(conn, 'near_expiry_rolled_forward_on') == today.strftime('%Y-%m-%d'):
+            return {'added': 0, 'removed': 0}
+        days = int(_get_setting(conn, 'near_expiry_days', DEFAULT_NEAR_EXPIRY_DAYS))
+        added, removed = _roll_forward(conn, today, days)
+        if own_conn:
+            conn.commit()
+        return {'added': added, 'removed': removed}
+    except Exception:
+        if own_conn:
+            conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+def rebuild_alerts():
+    """Recomputes all alert tables from scratch, e.g. after restoring data by hand."""
+    conn = get_db_connection()
+    try:
+        rebuild_alert_tables(conn.cursor())
+        _set_setting(conn, 'near_expiry_rolled_forward_on', date.today().strftime('%Y-%m-%d'))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
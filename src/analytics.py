@@ -0,0 +1,159 @@
+"""
+Analytics Layer: ABC/XYZ classification, margins and sell-through per product.
+
+The sales of a period are read once, with one query summing the sale lines
+per product and day, into NumPy columns (product, day, units, revenue, batch
+cost). Every measure is then computed for all products together with
+bincount and sorting, instead of one SQL aggregate per measure:
+
+- ABC by revenue share: products are ranked by revenue; those making up the
+  first 80% of revenue are A, the next 15% B, the rest C.
+- XYZ by demand variability: the coefficient of variation of units sold per
+  day, taken week by week. Below 0.5 is X (steady), below 1.0 Y, else Z.
+  Products without sales are C and Z.
+- Margin: revenue less the cost of the batches the units were sold from.
+- Sell-through: units sold / (units sold + stock on hand now).
+
+Results are kept by report_cache until a table they are read from changes.
+"""
+from datetime import timedelta
+import numpy as np
+from database import get_db_connection
+from archive import attach_archives_for_range
+import report_cache
+
+ABC_THRESHOLDS = (0.80, 0.95)
+XYZ_THRESHOLDS = (0.5, 1.0)
+
+# Tables whose writes can change the analytics of a period. Sell-through
+# reads the stock on hand now, so every sale counts through batches.
+ANALYTICS_TABLES = ('products', 'batches')
+
+def _load_daily_sales(conn, start_date, end_date):
+    """
+    Returns the sales of the period per product and day as an int64 array
+    with the columns product_id, day (from start_date), units, revenue and
+    cost in cents.
+    """
+    attach_archives_for_range(conn, start_date, end_date)
+    cursor = conn.cursor()
+    cursor.row_factory = None # Plain tuples convert to an array directly.
+    rows = cursor.execute("""
+        SELECT b.product_id,
+               CAST(julianday(substr(s.sale_date, 1, 10)) - julianday(:start_date) AS INTEGER) AS day,
+               SUM(si.quantity_sold),
+               SUM(si.quantity_sold * si.price_per_unit_cents),
+               SUM(si.quantity_sold * b.cost_price_cents)
+        FROM all_sales s
+        JOIN all_sale_items si ON si.sale_id = s.sale_id
+        JOIN batches b ON b.batch_id = si.batch_id
+        WHERE s.sale_date BETWEEN :start_datetime AND :end_datetime
+        GROUP BY b.product_id, day
+    """, {
+        'start_date': start_date.isoformat(),
+        'start_datetime': f"{start_date} 00:00:00",
+        'end_datetime': f"{end_date} 23:59:59",
+    }).fetchall()
+    return np.array(rows, dtype=np.int64).reshape(-1, 5)
+
+def _classify(values, thresholds, labels):
+    """Returns labels[i] for the first threshold each value is below, else the last label."""
+    return np.array(labels)[np.searchsorted(np.array(thresholds), values, side='right')]
+
+def _compute(products, sales, days):
+    count = len(products)
+    product_ids = np.array([p['product_id'] for p in products], dtype=np.int64)
+    stock = np.array([p['stock'] for p in products], dtype=np.int64)
+
+    # Sales of products deleted since are dropped.
+    index = np.searchsorted(product_ids, sales[:, 0])
+    known = index < count
+    known[known] = product_ids[index[known]] == sales[known, 0]
+    sales, index = sales[known], index[known]
+    day, units = sales[:, 1], sales[:, 2]
+
+    units_sold = np.bincount(index, weights=units, minlength=count).astype(np.int64)
+    revenue = np.bincount(index, weights=sales[:, 3], minlength=count).astype(np.int64)
+    cogs = np.bincount(index, weights=sales[:, 4], minlength=count).astype(np.int64)
+    margin = revenue - cogs
+
+    # ABC: the share of revenue ranked above each product decides its class.
+    order = np.argsort(-revenue, kind='stable')
+    total_revenue = revenue.sum()
+    share = revenue / total_revenue if total_revenue else np.zeros(count)
+    share_before = np.empty(count)
+    share_before[order] = np.cumsum(share[order]) - share[order]
+    abc = np.where(revenue > 0, _classify(share_before, ABC_THRESHOLDS, ['A', 'B', 'C']), 'C')
+
+    # XYZ: units per day in each week of the period; a short last week is scaled up.
+    weeks = -(-days // 7)
+    weekly = np.bincount(index * weeks + day // 7, weights=units, minlength=count * weeks).reshape(count, weeks)
+    days_in_week = np.minimum(7, days - 7 * np.arange(weeks))
+    daily_rate = weekly / days_in_week
+    mean = daily_rate.mean(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cv = np.where(mean > 0, daily_rate.std(axis=1) / mean, np.inf)
+        sell_through = np.where(units_sold + stock > 0, units_sold / (units_sold + stock), 0.0)
+    xyz = _classify(cv, XYZ_THRESHOLDS, ['X', 'Y', 'Z'])
+
+    rows = []
+    for i in order:
+        rows.append({
+            'product_id': products[i]['product_id'],
+            'name': products[i]['name'],
+            'category': products[i]['category'],
+            'units_sold': int(units_sold[i]),
+            'revenue_cents': int(revenue[i]),
+            'cogs_cents': int(cogs[i]),
+            'margin_cents': int(margin[i]),
+            'margin_percent': round(float(100.0 * margin[i] / revenue[i]), 1) if revenue[i] else None,
+            'revenue_share': round(float(100.0 * share[i]), 2),
+            'abc': str(abc[i]),
+            'cv': None if np.isinf(cv[i]) else round(float(cv[i]), 2),
+            'xyz': str(xyz[i]),
+            'stock': int(stock[i]),
+            'sell_through': round(float(100.0 * sell_through[i]), 1),
+        })
+    return {
+        'products': rows,
+        'totals': {
+            'revenue_cents': int(total_revenue),
+            'cogs_cents': int(cogs.sum()),
+            'margin_cents': int(margin.sum()),
+            'units_sold': int(units_sold.sum()),
+        },
+    }
+
+def _analyse(start_date, end_date):
+    conn = get_db_connection()
+    try:
+        products = conn.execute("""
+            SELECT p.product_id, p.name, p.category, IFNULL(ps.total_stock, 0) AS stock
+            FROM products p
+            LEFT JOIN product_stock ps ON ps.product_id = p.product_id
+            ORDER BY p.product_id
+        """).fetchall()
+        sales = _load_daily_sales(conn, start_date, end_date)
+    finally:
+        conn.close()
+
+    days = (end_date - start_date + timedelta(days=1)).days
+    return _compute(products, sales, days)
+
+def get_product_analytics(start_date, end_date):
+    """
+    Classifies and measures every product over [start_date, end_date].
+
+    Returns a dict:
+        {'products': [{'product_id':, 'name':, 'category':, 'units_sold':,
+                       'revenue_cents':, 'cogs_cents':, 'margin_cents':,
+                       'margin_percent':, 'revenue_share': percent, 'abc':,
+                       'cv':, 'xyz':, 'stock':, 'sell_through': percent}, ...],
+         'totals': {'revenue_cents':, 'cogs_cents':, 'margin_cents':, 'units_sold':}}
+    Products are ordered by revenue, highest first.
+    """
+    return report_cache.get_report(
+        'product_analytics', (start_date, end_date),
+        lambda: _analyse(start_date, end_date),
+        tables=ANALYTICS_TABLES, sales_period=(start_date, end_date), persist=False
+    )
@@ -0,0 +1,309 @@
+"""
+Archival Layer: Moves closed periods of sales history out of the main database.
+
+Sales, sale items and activity logs older than the current year are moved into
+one encrypted archive database per year (archive/archive_<year>.db), keyed with
+the same key as the main database. Daily sales rollups stay in the main file so
+summaries never need to open an archive; detailed reports and the activity
+log attach only the archives that overlap the requested date range.
+"""
+import os
+from datetime import date
+from database import get_db_connection, attach_encrypted_database, migrate_money_columns, migrate_activity_log_columns, _create_fts_index, PROJECT_ROOT
+
+ARCHIVE_DIR = os.path.join(PROJECT_ROOT, "archive")
+
+ARCHIVE_TABLES = {
+    'sales': """
+        CREATE TABLE IF NOT EXISTS {schema}.sales (
+            sale_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            customer_id INTEGER,
+            sale_date TIMESTAMP,
+            total_amount_cents INTEGER NOT NULL,
+            discount_applied_cents INTEGER NOT NULL DEFAULT 0
+        )""",
+    'sale_items': """
+        CREATE TABLE IF NOT EXISTS {schema}.sale_items (
+            sale_item_id INTEGER PRIMARY KEY,
+            sale_id INTEGER NOT NULL,
+            batch_id INTEGER NOT NULL,
+            quantity_sold INTEGER NOT NULL,
+            price_per_unit_cents INTEGER NOT NULL
+        )""",
+    'activity_logs': """
+        CREATE TABLE IF NOT EXISTS {schema}.activity_logs (
+            log_id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            timestamp TIMESTAMP,
+            action_description TEXT NOT NULL,
+            event_type TEXT,
+            entity_type TEXT,
+            entity_id INTEGER,
+            amount REAL,
+            payload TEXT,
+            amount_cents INTEGER
+        )""",
+}
+
+ARCHIVE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_sales_date ON sales (sale_date)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_sale_items_sale ON sale_items (sale_id)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_activity_logs_timestamp ON activity_logs (timestamp)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_activity_logs_event_timestamp ON activity_logs (event_type, timestamp)",
+]
+
+# SQLite attaches at most 10 databases to one connection (SQLITE_MAX_ATTACHED).
+MAX_ATTACHED_ARCHIVES = 10
+
+def get_archive_path(year):
+    """Returns the path of the archive database for a given year."""
+    return os.path.join(ARCHIVE_DIR, f"archive_{year}.db")
+
+def get_archived_years():
+    """Returns the sorted list of years that have an archive database."""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    years = []
+    for file_name in os.listdir(ARCHIVE_DIR):
+        if file_name.startswith("archive_") and file_name.endswith(".db"):
+            year = file_name[len("archive_"):-len(".db")]
+            if year.isdigit():
+                years.append(int(year))
+    return sorted(years)
+
+def _attach_archive(conn, year):
+    """Attaches the archive database for `year` and returns its schema name."""
+    schema = f"archive_{year}"
+    attach_encrypted_database(conn, get_archive_path(year), schema)
+    return schema
+
+def _upgrade_archive_schema(conn, schema):
+    """
+    Creates the archive tables and indexes in an attached archive, and brings
+    archives written by older versions up to date. Does not commit.
+    """
+    for ddl in ARCHIVE_TABLES.values():
+        conn.execute(ddl.format(schema=schema))
+    # Archives written before amounts were stored in cents, or before audit
+    # events were structured, lack these columns.
+    migrate_money_columns(conn.cursor(), schema)
+    migrate_activity_log_columns(conn.cursor(), schema)
+    for ddl in ARCHIVE_INDEXES:
+        conn.execute(ddl.format(schema=schema))
+    # Archived activity stays searchable by text, like the main activity_logs.
+    _create_fts_index(conn.cursor(), 'activity_logs', 'log_id', ['action_description'], schema)
+
+def upgrade_archive(year):
+    """
+    Brings the archive for `year` to the current schema. Run once at startup
+    (see recovery.convert_archives), so that reports only ever read archives.
+    """
+    conn = get_db_connection()
+    try:
+        schema = _attach_archive(conn, year)
+        try:
+            _upgrade_archive_schema(conn, schema)
+            conn.commit()
+        finally:
+            conn.execute(f"DETACH DATABASE {schema}")
+    finally:
+        conn.close()
+
+def _year_bounds(year):
+    return f"{year}-01-01 00:00:00", f"{year + 1}-01-01 00:00:00"
+
+def archive_closed_years(before_year=None):
+    """
+    Moves all sales, sale items and activity logs dated before `before_year`
+    (default: the current year) into per-year archive databases.
+
+    For every archived day a row is added to `sales_daily_rollups` in the main
+    database.
+
+    Returns a list of dicts: [{'year':, 'sales':, 'sale_items':, 'activity_logs':}]
+    """
+    before_year = before_year or date.today().year
+    cutoff = f"{before_year}-01-01 00:00:00"
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute("""
+            SELECT DISTINCT CAST(strftime('%Y', sale_date) AS INTEGER) FROM sales WHERE sale_date < ?
+            UNION
+            SELECT DISTINCT CAST(strftime('%Y', timestamp) AS INTEGER) FROM activity_logs WHERE timestamp < ?
+        """, (cutoff, cutoff))
+        years = sorted(row[0] for row in cursor.fetchall() if row[0] is not None)
+
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        results = []
+        for year in years:
+            schema = _attach_archive(conn, year)
+            try:
+                _upgrade_archive_schema(conn, schema)
+                results.append(_archive_year(conn, schema, year))
+            finally:
+                conn.execute(f"DETACH DATABASE {schema}")
+        return results
+    finally:
+        conn.close()
+
+def _archive_year(conn, schema, year):
+    """
+    Copies one year of history into the archive, then rolls it up and deletes
+    it from the main database.
+
+    In WAL mode a transaction is only atomic per database file, so the archive
+    copy is committed first. Only rows that reached the archive are deleted,
+    and re-running after an interruption skips rows that are already there.
+    """
+    start, end = _year_bounds(year)
+    cursor = conn.cursor()
+    try:
+        # 1. Copy the detail rows into the archive.
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {schema}.sale_items
+            SELECT si.* FROM main.sale_items si
+            JOIN main.sales s ON si.sale_id = s.sale_id
+            WHERE s.sale_date >= ? AND s.sale_date < ?
+        """, (start, end))
+        sale_items = cursor.rowcount
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {schema}.sales
+            SELECT * FROM main.sales WHERE sale_date >= ? AND sale_date < ?
+        """, (start, end))
+        sales = cursor.rowcount
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {schema}.activity_logs
+                (log_id, user_id, timestamp, action_description, event_type, entity_type, entity_id, amount,
+                 amount_cents, payload)
+            SELECT log_id, user_id, timestamp, action_description, event_type, entity_type, entity_id, amount,
+                   amount_cents, payload
+            FROM main.activity_logs WHERE timestamp >= ? AND timestamp < ?
+        """, (start, end))
+        activity_logs = cursor.rowcount
+        conn.commit()
+
+        # 2. Daily rollups stay in the main database.
+        cursor.execute(f"""
+            INSERT INTO main.sales_daily_rollups
+                (day, sale_count, total_amount_cents, total_discount_cents, total_revenue_cents, total_cogs_cents)
+            SELECT
+                s.day, s.sale_count, s.total_amount, s.total_discount,
+                IFNULL(i.total_revenue, 0), IFNULL(i.total_cogs, 0)
+            FROM (
+                SELECT date(sale_date) AS day, COUNT(*) AS sale_count,
+                       SUM(total_amount_cents) AS total_amount, SUM(discount_applied_cents) AS total_discount
+                FROM main.sales
+                WHERE sale_date >= ? AND sale_date < ?
+                  AND sale_id IN (SELECT sale_id FROM {schema}.sales)
+                GROUP BY date(sale_date)
+            ) AS s
+            LEFT JOIN (
+                SELECT date(s.sale_date) AS day,
+                       SUM(si.quantity_sold * si.price_per_unit_cents) AS total_revenue,
+                       SUM(si.quantity_sold * b.cost_price_cents) AS total_cogs
+                FROM main.sale_items si
+                JOIN main.sales s ON si.sale_id = s.sale_id
+                JOIN main.batches b ON si.batch_id = b.batch_id
+                WHERE s.sale_date >= ? AND s.sale_date < ?
+                  AND s.sale_id IN (SELECT sale_id FROM {schema}.sales)
+                GROUP BY date(s.sale_date)
+            ) AS i ON i.day = s.day
+            WHERE true
+            ON CONFLICT (day) DO UPDATE SET
+                sale_count = sale_count + excluded.sale_count,
+                total_amount_cents = total_amount_cents + excluded.total_amount_cents,
+                total_discount_cents = total_discount_cents + excluded.total_discount_cents,
+                total_revenue_cents = total_revenue_cents + excluded.total_revenue_cents,
+                total_cogs_cents = total_cogs_cents + excluded.total_cogs_cents
+        """, (start, end, start, end))
+
+        # 3. Remove the archived rows from the main database.
+        cursor.execute(f"""
+            DELETE FROM main.sale_items
+            WHERE sale_item_id IN (SELECT sale_item_id FROM {schema}.sale_items)
+        """)
+        cursor.execute(f"""
+            DELETE FROM main.sales
+            WHERE sale_date >= ? AND sale_date < ?
+              AND sale_id IN (SELECT sale_id FROM {schema}.sales)
+        """, (start, end))
+        cursor.execute(f"""
+            DELETE FROM main.activity_logs
+            WHERE timestamp >= ? AND timestamp < ?
+              AND log_id IN (SELECT log_id FROM {schema}.activity_logs)
+        """, (start, end))
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {'year': year, 'sales': sales, 'sale_items': sale_items, 'activity_logs': activity_logs}
+
+def _archived_years_in_range(start_date, end_date):
+    start_year = int(str(start_date)[:4])
+    end_year = int(str(end_date)[:4])
+    return [year for year in get_archived_years() if start_year <= year <= end_year]
+
+def select_from_archives(conn, start_date, end_date, queries, params=()):
+    """
+    Makes the archives whose year overlaps [start_date, end_date] readable
+    from `conn`. Each of `queries` is a SELECT over one archive, with
+    {schema} in place of its schema name and `params` as its parameters.
+
+    Returns, per query, a list of (sql, params) sources, oldest archive
+    first, to be combined with UNION ALL. Up to MAX_ATTACHED_ARCHIVES
+    archives are attached and read directly. With more, they are attached a
+    batch at a time and each query's rows are copied into a temporary table
+    per batch before the batch is detached.
+    """
+    years = _archived_years_in_range(start_date, end_date)
+    sources = [[] for _ in queries]
+    if len(years) <= MAX_ATTACHED_ARCHIVES:
+        for year in years:
+            schema = _attach_archive(conn, year)
+            for query, query_sources in zip(queries, sources):
+                query_sources.append((query.format(schema=schema), list(params)))
+        return sources
+
+    for batch in range(0, len(years), MAX_ATTACHED_ARCHIVES):
+        schemas = [_attach_archive(conn, year) for year in years[batch:batch + MAX_ATTACHED_ARCHIVES]]
+        try:
+            for i, (query, query_sources) in enumerate(zip(queries, sources)):
+                table = f"temp.archived_{i}_{batch // MAX_ATTACHED_ARCHIVES}"
+                # DDL only, so no transaction is opened on the caller's connection.
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(
+                    f"CREATE TABLE {table} AS "
+                    + " UNION ALL ".join(f"SELECT * FROM ({query.format(schema=schema)})" for schema in schemas),
+                    list(params) * len(schemas)
+                )
+                query_sources.append((f"SELECT * FROM {table}", []))
+        finally:
+            for schema in schemas:
+                conn.execute(f"DETACH DATABASE {schema}")
+    return sources
+
+def attach_archives_for_range(conn, start_date, end_date):
+    """
+    Prepares `conn` for a report over [start_date, end_date].
+
+    Makes only the archive databases whose year overlaps the range readable
+    (see select_from_archives) and creates the temporary views `all_sales`
+    and `all_sale_items`, which union the main tables with those archives.
+    Returns the archived years included.
+    """
+    sales, items = select_from_archives(conn, start_date, end_date, [
+        "SELECT * FROM {schema}.sales",
+        "SELECT * FROM {schema}.sale_items",
+    ])
+    sales_sources = ["SELECT * FROM main.sales"] + [sql for sql, _ in sales]
+    item_sources = ["SELECT * FROM main.sale_items"] + [sql for sql, _ in items]
+
+    conn.execute("DROP VIEW IF EXISTS temp.all_sales")
+    conn.execute("DROP VIEW IF EXISTS temp.all_sale_items")
+    conn.execute("CREATE TEMP VIEW all_sales AS " + " UNION ALL ".join(sales_sources))
+    conn.execute("CREATE TEMP VIEW all_sale_items AS " + " UNION ALL ".join(item_sources))
+    return _archived_years_in_range(start_date, end_date)
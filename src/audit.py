@@ -0,0 +1,206 @@
+"""
+Audit Layer: Structured audit events and read access to the activity log.
+
+Every audit event is a row in activity_logs. Besides the human-readable
+description it has an event type, the entity it concerns, a numeric amount
+(a discount percentage, a stock quantity), a money amount in integer cents
+(a sale total, a discount's value) and a compact JSON payload with any other
+details. These columns are indexed, so questions such as "all discounts over
+10% by a user last month" are index range scans.
+
+Activity is read a page at a time with keyset pagination on
+(timestamp, log_id), so every page is an index range scan however deep the
+user has scrolled. Text filters use the activity_logs_fts index.
+Logs already moved to yearly archives are read from the archives that overlap
+the date window, each with the same indexes, and merged in order.
+"""
+import csv
+import json
+from enum import Enum
+from datetime import date, timedelta
+from database import get_db_connection, fts_query
+from archive import select_from_archives
+
+AUDIT_PAGE_SIZE = 200
+EXPORT_CHUNK_SIZE = 5000
+
+class AuditEventType(str, Enum):
+    LOGIN = 'login'
+    LOGIN_FAILED = 'login_failed'
+    SALE = 'sale'
+    DISCOUNT = 'discount'
+    STOCK_ADDED = 'stock_added'
+    STOCK_REMOVED = 'stock_removed'
+    STOCK_RECEIVED = 'stock_received'
+    IMPORT = 'import'
+
+    @property
+    def label(self):
+        return self.value.replace('_', ' ').title()
+
+def log_event(user_id, event_type, description, entity_type=None, entity_id=None,
+              amount=None, payload=None, conn=None, amount_cents=None):
+    """
+    Records an audit event.
+
+    Args:
+        user_id (int): The acting user, if any.
+        event_type (AuditEventType): What happened.
+        description (str): Human-readable text, shown in the activity log.
+        entity_type (str), entity_id (int): The record the event concerns, e.g. ('sale', 42).
+        amount (float): The event's key count or percentage; see the module docstring.
+        amount_cents (int): The money the event concerns, in cents, e.g. a sale total.
+        payload (dict): Any further details, stored as compact JSON.
+        conn: If given, the event is written inside the caller's transaction
+            and not committed, so it is saved only if the change it describes is.
+    """
+    params = (
+        user_id, description, AuditEventType(event_type).value, entity_type, entity_id, amount, amount_cents,
+        json.dumps(payload, separators=(',', ':'), default=str) if payload else None
+    )
+    sql = """
+        INSERT INTO activity_logs
+            (user_id, action_description, event_type, entity_type, entity_id, amount, amount_cents, payload)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    if conn is not None:
+        conn.execute(sql, params)
+        return
+    conn = get_db_connection()
+    try:
+        conn.execute(sql, params)
+        conn.commit()
+    finally:
+        conn.close()
+
+def _build_filters(user_id=None, start_date=None, end_date=None, event_type=None, min_amount=None, text=None,
+                   min_amount_cents=None):
+    """
+    Returns the WHERE clauses and parameters shared by paging and export.
+    The clauses contain {schema}, the database the rows are read from.
+    """
+    clauses = []
+    params = []
+    if event_type is not None:
+        clauses.append("l.event_type = ?")
+        params.append(AuditEventType(event_type).value)
+    if user_id is not None:
+        clauses.append("l.user_id = ?")
+        params.append(user_id)
+    if start_date is not None:
+        clauses.append("l.timestamp >= ?")
+        params.append(f"{start_date} 00:00:00")
+    if end_date is not None:
+        clauses.append("l.timestamp < ?")
+        params.append(f"{end_date + timedelta(days=1)} 00:00:00")
+    if min_amount is not None:
+        clauses.append("l.amount >= ?")
+        params.append(min_amount)
+    if min_amount_cents is not None:
+        clauses.append("l.amount_cents >= ?")
+        params.append(min_amount_cents)
+
+    query = fts_query(text)
+    if query:
+        clauses.append("l.log_id IN (SELECT rowid FROM {schema}.activity_logs_fts WHERE activity_logs_fts MATCH ?)")
+        params.append(query)
+    return clauses, params
+
+LOG_COLUMNS = "l.log_id, l.timestamp, l.user_id, l.action_description, l.event_type, l.entity_type, l.entity_id, l.amount, l.amount_cents, l.payload"
+
+def _select_logs(conn, start_date, end_date, clauses, params, limit=None):
+    """
+    Returns the SQL and parameters selecting the matching logs, newest first,
+    from the main database and the archives overlapping the date window,
+    which are made readable from `conn` (see archive.select_from_archives).
+    With `limit`, each source is cut to `limit` rows by its own index before
+    they are merged.
+    """
+    order = "ORDER BY l.timestamp DESC, l.log_id DESC"
+    page = " LIMIT ?" if limit is not None else ""
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = f"SELECT {LOG_COLUMNS} FROM {{schema}}.activity_logs l {where} {order}{page}"
+    query_params = list(params) + ([limit] if limit is not None else [])
+
+    sources = [(query.format(schema='main'), query_params)]
+    sources += select_from_archives(conn, start_date or date.min, end_date or date.max, [query], query_params)[0]
+    source_params = [param for _, query_params in sources for param in query_params]
+    sql = f"""
+        SELECT l.*, u.username
+        FROM ({" UNION ALL ".join(f"SELECT * FROM ({source})" for source, _ in sources)}) AS l
+        LEFT JOIN users u ON u.user_id = l.user_id
+        {order}{page}
+    """
+    if limit is not None:
+        source_params.append(limit)
+    return sql, source_params
+
+def get_activity_logs(user_id=None, start_date=None, end_date=None, event_type=None, min_amount=None,
+                      text=None, after=None, limit=AUDIT_PAGE_SIZE, min_amount_cents=None):
+    """
+    Returns one page of activity, newest first.
+
+    Args:
+        user_id (int): Only activity of this user.
+        start_date, end_date (date): Inclusive date window.
+        event_type (AuditEventType): Only events of this type.
+        min_amount (float): Only events whose amount is at least this.
+        min_amount_cents (int): Only events whose money amount is at least this many cents.
+        text (str): Words that must appear in the description.
+        after (tuple): The 'next' cursor of the previous page, to continue from it.
+        limit (int): Page size.
+
+    Returns:
+        {'rows': [{'log_id':, 'timestamp':, 'user_id':, 'username':, 'action_description':,
+                   'event_type':, 'entity_type':, 'entity_id':, 'amount':, 'amount_cents':, 'payload':}, ...],
+         'next': cursor for the following page, or None if this is the last page}
+    """
+    clauses, params = _build_filters(user_id, start_date, end_date, event_type, min_amount, text, min_amount_cents)
+    if after is not None:
+        clauses.append("(l.timestamp, l.log_id) < (?, ?)")
+        params.extend(after)
+
+    conn = get_db_connection()
+    try:
+        sql, params = _select_logs(conn, start_date, end_date, clauses, params, limit + 1)
+        rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+    finally:
+        conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1]['timestamp'], rows[-1]['log_id'])
+    return {'rows': rows, 'next': next_cursor}
+
+def export_activity_logs(file_path, user_id=None, start_date=None, end_date=None, event_type=None,
+                         min_amount=None, text=None, min_amount_cents=None):
+    """
+    Writes all activity matching the filters to a CSV file, newest first,
+    streaming it in chunks so memory use stays flat. Returns the number of rows written.
+    """
+    clauses, params = _build_filters(user_id, start_date, end_date, event_type, min_amount, text, min_amount_cents)
+
+    conn = get_db_connection()
+    try:
+        sql, params = _select_logs(conn, start_date, end_date, clauses, params)
+        cursor = conn.execute(f"""
+            SELECT log_id, timestamp, username, event_type, entity_type, entity_id,
+                   amount, amount_cents, action_description, payload
+            FROM ({sql})
+            ORDER BY timestamp DESC, log_id DESC
+        """, params)
+        written = 0
+        with open(file_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['log_id', 'timestamp', 'username', 'event_type', 'entity_type', 'entity_id',
+                             'amount', 'amount_cents', 'action_description', 'payload'])
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+                if not rows:
+                    break
+                writer.writerows(tuple(row) for row in rows)
+                written += len(rows)
+        return written
+    finally:
+        conn.close()
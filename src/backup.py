@@ -0,0 +1,165 @@
+"""
+Backup Layer: Online, encrypted backups of the main database.
+
+Backups use the SQLite online backup API, copying a few pages at a time from a
+pinned WAL read snapshot and sleeping between steps, so that sales can keep
+committing while a backup runs.
+Each backup is written to a temporary file, optionally re-keyed to a separate
+backup key, verified and only then renamed into place. Older generations are
+rotated out.
+
+A backup re-keyed to a backup key is named with BACKUP_KEY_SUFFIX. The backup
+key itself is not stored anywhere, so such backups can only be restored by
+hand, by someone who has it; recovery.restore_latest_backup skips them.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from sqlcipher3 import dbapi2 as sqlite3
+from database import get_db_connection, open_encrypted_connection, _key_literal, CIPHER_SETTINGS, LEGACY_CIPHER_SETTINGS, PROJECT_ROOT
+
+BACKUP_DIR = os.path.join(PROJECT_ROOT, "backups")
+BACKUP_PREFIX = "inventory-"
+# Backup names sort in the order they were taken, to the microsecond.
+BACKUP_TIMESTAMP_FORMAT = '%Y%m%d-%H%M%S-%f'
+# Marks backups encrypted with a separate backup key instead of the database key.
+BACKUP_KEY_SUFFIX = ".backup-key"
+BACKUP_GENERATIONS = 7
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.05  # seconds between steps
+
+# Metrics of the most recent backup, for display by the UI or scheduler.
+last_backup_metrics = None
+
+class BackupError(Exception):
+    """Raised when a backup could not be written or failed verification."""
+
+def list_backups():
+    """Returns the paths of all backup generations, newest first."""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    names = [
+        name for name in os.listdir(BACKUP_DIR)
+        if name.startswith(BACKUP_PREFIX) and name.endswith(".db")
+    ]
+    # Sorted by timestamp alone, so that names from before microseconds were
+    # added still sort before those taken later in the same second.
+    names.sort(key=lambda name: name[len(BACKUP_PREFIX):].split(".")[0], reverse=True)
+    return [os.path.join(BACKUP_DIR, name) for name in names]
+
+def uses_backup_key(path):
+    """Returns True if the backup at `path` is encrypted with a separate backup key."""
+    return os.path.basename(path).endswith(BACKUP_KEY_SUFFIX + ".db")
+
+def verify_backup(path, key=None):
+    """
+    Opens a backup with its key and runs `PRAGMA quick_check`.
+    Returns True if the file is readable and consistent.
+    """
+    # Backups taken before raw keys were introduced use the legacy settings.
+    for settings in (None,) if key else (CIPHER_SETTINGS, LEGACY_CIPHER_SETTINGS):
+        try:
+            conn = open_encrypted_connection(path, key, settings=settings)
+            try:
+                result = conn.execute("PRAGMA quick_check").fetchone()
+                return result is not None and result[0] == 'ok'
+            finally:
+                conn.close()
+        except sqlite3.DatabaseError:
+            continue
+    return False
+
+def _new_backup_path(with_backup_key):
+    """A path for a new backup, named after the current time and not yet in use."""
+    suffix = BACKUP_KEY_SUFFIX if with_backup_key else ""
+    taken_at = datetime.now()
+    while True:
+        path = os.path.join(BACKUP_DIR, f"{BACKUP_PREFIX}{taken_at.strftime(BACKUP_TIMESTAMP_FORMAT)}{suffix}.db")
+        if not os.path.exists(path) and not os.path.exists(path + ".partial"):
+            return path
+        # Clocks may tick more coarsely than a microsecond.
+        taken_at += timedelta(microseconds=1)
+
+def _rotate_backups(keep):
+    """Deletes the oldest backups so that at most `keep` generations remain."""
+    removed = []
+    for path in list_backups()[keep:]:
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+def create_backup(backup_key=None, pages_per_step=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP,
+                  keep=BACKUP_GENERATIONS, progress_callback=None):
+    """
+    Creates a verified, encrypted backup of the main database.
+
+    Args:
+        backup_key (str): If given, the backup is re-keyed to this key instead of
+            keeping the main database key, and named with BACKUP_KEY_SUFFIX.
+            Automatic recovery cannot use such a backup.
+        pages_per_step (int): Pages copied per backup step.
+        sleep (float): Seconds to sleep between steps.
+        keep (int): Number of backup generations to keep.
+        progress_callback (callable): Called as progress_callback(pages_copied, total_pages).
+
+    Returns:
+        A dictionary of metrics: path, total_pages, page_size, bytes, steps,
+        elapsed_seconds, pages_per_second, bytes_per_second and removed (rotated paths).
+    """
+    global last_backup_metrics
+
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    final_path = _new_backup_path(bool(backup_key))
+    partial_path = final_path + ".partial"
+
+    metrics = {'path': final_path, 'total_pages': 0, 'steps': 0}
+
+    def _on_progress(status, remaining, total):
+        metrics['steps'] += 1
+        metrics['total_pages'] = total
+        if progress_callback:
+            progress_callback(total - remaining, total)
+
+    source = get_db_connection()
+    target = open_encrypted_connection(partial_path)
+    start_time = time.perf_counter()
+    try:
+        metrics['page_size'] = int(source.execute("PRAGMA page_size").fetchone()[0])
+        # Pin a read snapshot for the whole backup. In WAL mode this does not
+        # block writers, and it stops the backup from restarting every time a
+        # sale commits between two steps.
+        source.execute("BEGIN")
+        source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=pages_per_step, progress=_on_progress, sleep=sleep)
+    except sqlite3.Error as e:
+        target.close()
+        os.remove(partial_path)
+        raise BackupError(f"Backup failed: {e}") from e
+    finally:
+        source.close()
+    target.close()
+    elapsed = time.perf_counter() - start_time
+
+    if backup_key:
+        # Quoted the same way as PRAGMA key in open_encrypted_connection, which
+        # opens the backup with this key as a passphrase.
+        literal = _key_literal(backup_key, 'passphrase').replace('"', '""')
+        conn = open_encrypted_connection(partial_path)
+        try:
+            conn.execute(f'PRAGMA rekey = "{literal}"')
+        finally:
+            conn.close()
+
+    if not verify_backup(partial_path, backup_key):
+        os.remove(partial_path)
+        raise BackupError("Backup failed verification and was discarded.")
+
+    os.replace(partial_path, final_path)
+
+    metrics['bytes'] = metrics['total_pages'] * metrics['page_size']
+    metrics['elapsed_seconds'] = elapsed
+    metrics['pages_per_second'] = metrics['total_pages'] / elapsed if elapsed else 0
+    metrics['bytes_per_second'] = metrics['bytes'] / elapsed if elapsed else 0
+    metrics['removed'] = _rotate_backups(keep)
+    last_backup_metrics = metrics
+    return metrics
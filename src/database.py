@@ -2,6 +2,9 @@ from sqlcipher3 import dbapi2 as sqlite3
 import hashlib
 import bcrypt
 import os
+import re
+import tempfile
+import time
 
 # Build a path to the database file in the project's root directory
 # This makes the path independent of where the script is run from.
@@ -27,34 +30,197 @@ def get_or_create_db_key():
             f.write(new_key)
         return new_key
 
-DB_KEY = get_or_create_db_key()
+_db_key = None
+
+def get_db_key():
+    """Returns the database key, reading or creating KEY_FILE on first use."""
+    global _db_key
+    if _db_key is None:
+        _db_key = get_or_create_db_key()
+    return _db_key
+
+# How files are encrypted. In 'raw' key mode the 32 random bytes of KEY_FILE
+# are the encryption key itself, so opening a connection skips the PBKDF2 key
+# derivation (kdf_iter rounds, about 0.3s per connection); stretching a key
+# that is already random adds no security. 'passphrase' mode derives the key
+# from a passphrase and is used for backup passphrases. Existing files must be
+# converted with rekey_database when these settings change.
+CIPHER_SETTINGS = {
+    'key_mode': 'raw',
+    'kdf_iter': 256000,
+    'cipher_page_size': 4096,
+    'cipher_hmac_algorithm': 'HMAC_SHA512',
+    'cipher_kdf_algorithm': 'PBKDF2_HMAC_SHA512',
+}
+# The settings of files written before raw keys: SQLCipher 4 defaults with
+# the key file's text used as a passphrase. recovery converts them on startup.
+LEGACY_CIPHER_SETTINGS = {
+    'key_mode': 'passphrase',
+    'kdf_iter': 256000,
+    'cipher_page_size': 4096,
+    'cipher_hmac_algorithm': 'HMAC_SHA512',
+    'cipher_kdf_algorithm': 'PBKDF2_HMAC_SHA512',
+}
+CIPHER_PRAGMAS = ('kdf_iter', 'cipher_page_size', 'cipher_hmac_algorithm', 'cipher_kdf_algorithm')
+
+# Rows read per index by ANALYZE, including the ANALYZE run by PRAGMA optimize.
+# Approximate statistics are enough for the planner and keep both fast.
+ANALYSIS_LIMIT = 1000
+
+class OptimizingConnection(sqlite3.Connection):
+    """
+    A connection that runs PRAGMA optimize when closed. SQLite then re-analyzes
+    only the tables whose statistics the queries on this connection would have
+    needed, which is usually none, so closing stays cheap.
+    """
+    def close(self):
+        try:
+            if not self.in_transaction:
+                self.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass  # Statistics are an optimization; never fail a close over them.
+        super().close()
+
+def _key_literal(key, key_mode):
+    """Returns the key as SQLCipher expects it: x'<hex>' for a raw key, else the passphrase."""
+    return f"x'{key}'" if key_mode == 'raw' else key
+
+def _apply_cipher_settings(conn, settings, schema=None):
+    prefix = f"{schema}." if schema else ""
+    for name in CIPHER_PRAGMAS:
+        conn.execute(f"PRAGMA {prefix}{name} = {settings[name]}")
+
+def open_encrypted_connection(path, key=None, factory=sqlite3.Connection, settings=None):
+    """
+    Opens a connection to an SQLCipher database file and applies its key.
+    Without `key`, the database key is used with CIPHER_SETTINGS. An explicit
+    key, such as a backup passphrase, is used as a passphrase.
+    """
+    if settings is None:
+        settings = CIPHER_SETTINGS if key is None else dict(CIPHER_SETTINGS, key_mode='passphrase')
+    literal = _key_literal(key or get_db_key(), settings['key_mode']).replace('"', '""')
+    conn = sqlite3.connect(path, factory=factory)
+    conn.execute(f'PRAGMA key = "{literal}"')
+    _apply_cipher_settings(conn, settings)
+    return conn
+
+def attach_encrypted_database(conn, path, schema, settings=CIPHER_SETTINGS):
+    """Attaches a database file encrypted with the database key as `schema`."""
+    conn.execute(f"ATTACH DATABASE ? AS {schema} KEY ?", (path, _key_literal(get_db_key(), settings['key_mode'])))
+    _apply_cipher_settings(conn, settings, schema)
 
 def get_db_connection():
-    """Establishes a connection to the database."""
-    conn = sqlite3.connect(DB_FILE)
+    """
+    Establishes a connection to the database.
+    The file is checked once at startup (see recovery.check_database_on_startup),
+    so connections do not probe the key or the schema.
+    """
+    conn = open_encrypted_connection(DB_FILE, factory=OptimizingConnection)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    return conn
+
+def checkpoint_wal(mode='PASSIVE'):
+    """
+    Copies committed WAL content back into the database file so the WAL does
+    not keep growing. PASSIVE never waits for readers or writers.
+    Returns (busy, wal_pages, checkpointed_pages).
+    """
+    conn = get_db_connection()
     try:
-        conn.execute(f"PRAGMA key = '{DB_KEY}'")
-        # Test the connection to see if the key is correct
-        conn.execute("SELECT count(*) FROM sqlite_master;")
-    except sqlite3.DatabaseError:
-        # This can happen if the key is wrong or the db is corrupt.
-        # As per the user's request, we delete the db and re-initialize.
+        return tuple(conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
+    finally:
         conn.close()
-        if os.path.exists(DB_FILE):
-            print("WARNING: Database file is corrupt or key is incorrect. Deleting and re-initializing database.")
-            os.remove(DB_FILE)
 
-        # Create a new connection for initialization
-        init_conn = sqlite3.connect(DB_FILE)
-        init_conn.execute(f"PRAGMA key = '{DB_KEY}'")
-        initialize_database(init_conn)
+def rekey_database(path, old_settings, new_settings=CIPHER_SETTINGS):
+    """
+    Re-encrypts the database at `path` from `old_settings` to `new_settings`,
+    e.g. to move it to raw-key mode or another page size. The data is exported
+    into a new file next to it, which is checked and only then swapped in, so
+    the original is untouched if anything fails. Nothing else may have the
+    file open meanwhile.
+    """
+    temp_path = path + ".rekey"
+    for leftover in (temp_path, temp_path + "-wal", temp_path + "-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
 
-        # Now, the main connection should work
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute(f"PRAGMA key = '{DB_KEY}'")
+    conn = open_encrypted_connection(path, settings=old_settings)
+    try:
+        # sqlcipher_export copies the schema and data, but not these header settings.
+        user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        attach_encrypted_database(conn, temp_path, 'rekeyed', new_settings)
+        conn.execute(f"PRAGMA rekeyed.auto_vacuum = {auto_vacuum}")
+        conn.execute("SELECT sqlcipher_export('rekeyed')")
+        conn.execute(f"PRAGMA rekeyed.user_version = {user_version}")
+        conn.execute("DETACH DATABASE rekeyed")
+    finally:
+        conn.close()
 
-    conn.row_factory = sqlite3.Row
-    return conn
+    conn = open_encrypted_connection(temp_path, settings=new_settings)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        if result != 'ok':
+            raise sqlite3.DatabaseError(f"Re-encrypted copy failed its check: {result}")
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    finally:
+        conn.close()
+
+    # The old WAL, if any, was read by the export and must not be applied to the new file.
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.replace(temp_path, path)
+
+def benchmark_connection_open(rounds=10):
+    """
+    Measures how long opening a connection and reading the schema takes with
+    raw keys and with passphrases at several KDF iteration counts, on
+    throwaway files. Returns [(label, seconds per open), ...].
+    """
+    profiles = [('raw key', CIPHER_SETTINGS)] + [
+        (f"passphrase, kdf_iter={iterations}", dict(CIPHER_SETTINGS, key_mode='passphrase', kdf_iter=iterations))
+        for iterations in (256000, 64000, 4000)
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for label, settings in profiles:
+            path = os.path.join(directory, f"benchmark-{len(results)}.db")
+            conn = open_encrypted_connection(path, settings=settings)
+            conn.execute("CREATE TABLE benchmark (id INTEGER PRIMARY KEY)")
+            conn.commit()
+            conn.close()
+            start_time = time.perf_counter()
+            for _ in range(rounds):
+                conn = open_encrypted_connection(path, settings=settings)
+                conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+                conn.close()
+            results.append((label, (time.perf_counter() - start_time) / rounds))
+    return results
+
+def stage_ids(cursor, table_name, ids):
+    """
+    Loads a set of ids into a temporary single-column table so that
+    set-based queries can join against it instead of looping in Python.
+    """
+    cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {table_name} (id INTEGER PRIMARY KEY)")
+    cursor.execute(f"DELETE FROM temp.{table_name}")
+    cursor.executemany(f"INSERT OR IGNORE INTO temp.{table_name} (id) VALUES (?)", [(i,) for i in ids])
+
+def fts_query(text):
+    """
+    Turns free text typed by a user into a safe FTS5 query: every word is
+    quoted, so FTS operators in the input are matched literally, and the
+    last word is a prefix so results appear while typing.
+    """
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
 
 def _hash_password(password):
     """Hashes a password using bcrypt."""
@@ -82,10 +248,521 @@ def delete_batch(batch_id):
     finally:
         conn.close()
 
+def add_missing_columns(cursor, table, columns, schema='main'):
+    """
+    Adds the columns in `columns` ({name: type}) that `schema.table` does not
+    have yet, for tables created by an older version. Returns the added names.
+    """
+    existing = {row[1] for row in cursor.execute(f"PRAGMA {schema}.table_info({table})").fetchall()}
+    added = []
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {name} {column_type}")
+            added.append(name)
+    return added
+
+# Structured audit columns of activity_logs (see audit.py).
+ACTIVITY_LOG_EVENT_COLUMNS = {
+    'event_type': 'TEXT',
+    'entity_type': 'TEXT',
+    'entity_id': 'INTEGER',
+    'amount': 'REAL',
+    'payload': 'TEXT',
+    'amount_cents': 'INTEGER',
+}
+
+# Money columns as they were before amounts were stored in integer cents.
+MONEY_COLUMNS = {
+    'batches': ('cost_price', 'selling_price'),
+    'sales': ('total_amount', 'discount_applied'),
+    'sale_items': ('price_per_unit',),
+    'sales_daily_rollups': ('total_amount', 'total_discount', 'total_revenue', 'total_cogs'),
+}
+
+def migrate_money_columns(cursor, schema='main'):
+    """
+    Replaces each REAL money column of MONEY_COLUMNS in `schema` with an
+    INTEGER <name>_cents column holding the same amount in cents. Columns
+    are converted one at a time, so they keep their order and `SELECT *`
+    copies between the main database and the archives still line up.
+    Tables that are converted already, or do not exist, are left alone.
+    """
+    for table, columns in MONEY_COLUMNS.items():
+        existing = {row[1] for row in cursor.execute(f"PRAGMA {schema}.table_info({table})")}
+        for column in columns:
+            if column not in existing:
+                continue
+            cursor.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {column}_cents INTEGER NOT NULL DEFAULT 0")
+            cursor.execute(f"UPDATE {schema}.{table} SET {column}_cents = CAST(round(IFNULL({column}, 0) * 100) AS INTEGER)")
+            cursor.execute(f"ALTER TABLE {schema}.{table} DROP COLUMN {column}")
+
+def _migrate_customer_contact_columns(cursor):
+    """
+    Adds the structured phone/address columns to a customers table created
+    before they existed, and fills them from the old "Phone: ..., Address: ..."
+    contact_info text.
+    """
+    if not add_missing_columns(cursor, 'customers', {'phone': 'TEXT', 'address': 'TEXT'}):
+        return
+    cursor.execute("""
+        UPDATE customers SET
+            phone = NULLIF(TRIM(SUBSTR(contact_info, 8, INSTR(contact_info, ', Address: ') - 8)), ''),
+            address = NULLIF(TRIM(SUBSTR(contact_info, INSTR(contact_info, ', Address: ') + 11)), '')
+        WHERE contact_info LIKE 'Phone: %, Address: %'
+    """)
+
+ORDER_TYPE_COLUMN_SQL = "TEXT NOT NULL DEFAULT 'Customer' CHECK(order_type IN ('Customer', 'Purchase'))"
+
+def _migrate_order_type_column(cursor):
+    """
+    Adds order_type to an orders table created before purchase orders were
+    told apart from customer orders. Orders already received into stock were
+    purchase orders; all others are taken to be customer orders.
+    """
+    if not add_missing_columns(cursor, 'orders', {'order_type': ORDER_TYPE_COLUMN_SQL}):
+        return
+    cursor.execute("UPDATE orders SET order_type = 'Purchase' WHERE order_id IN (SELECT order_id FROM goods_receipts)")
+
+def migrate_activity_log_columns(cursor, schema='main'):
+    """
+    Adds the structured event columns of ACTIVITY_LOG_EVENT_COLUMNS missing
+    from `schema`.activity_logs and returns the names of those added. Sale
+    totals logged in `amount` as REAL rupees before amount_cents existed are
+    moved to amount_cents.
+    """
+    added = add_missing_columns(cursor, 'activity_logs', ACTIVITY_LOG_EVENT_COLUMNS, schema)
+    if 'amount_cents' in added:
+        cursor.execute(f"""
+            UPDATE {schema}.activity_logs
+            SET amount_cents = CAST(round(amount * 100) AS INTEGER), amount = NULL
+            WHERE event_type = 'sale' AND amount IS NOT NULL
+        """)
+    return added
+
+def _migrate_activity_log_event_columns(cursor):
+    """
+    Adds the structured event columns to an activity_logs table created before
+    they existed, and classifies the old free-text entries where the text
+    identifies the event.
+    """
+    if 'event_type' not in migrate_activity_log_columns(cursor):
+        return
+    cursor.execute("""
+        UPDATE activity_logs SET event_type = CASE
+            WHEN action_description LIKE '% logged in.' THEN 'login'
+            WHEN action_description LIKE 'Created new sale with ID %' THEN 'sale'
+            WHEN action_description LIKE 'Received % orders into stock%' THEN 'stock_received'
+            WHEN action_description LIKE 'Imported %' THEN 'import'
+        END
+        WHERE event_type IS NULL
+    """)
+
+def _create_fts_index(cursor, table, key, columns, schema='main'):
+    """
+    Creates an external-content FTS5 index `<table>_fts` over `columns` of
+    `schema.table`, kept in sync by insert/update/delete triggers. A newly
+    created index is filled from the rows already in the table.
+    """
+    fts_table = f"{table}_fts"
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+
+    exists = cursor.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+    ).fetchone()
+    cursor.execute(f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.{fts_table} USING fts5(
+        {column_list},
+        content='{table}', content_rowid='{key}',
+        prefix='2 3'
+    )""")
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {schema}.{fts_table}_insert AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.{key}, {new_values});
+    END""")
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {schema}.{fts_table}_delete AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.{key}, {old_values});
+    END""")
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {schema}.{fts_table}_update AFTER UPDATE ON {table} BEGIN
+        INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.{key}, {old_values});
+        INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.{key}, {new_values});
+    END""")
+    if not exists:
+        cursor.execute(f"INSERT INTO {schema}.{fts_table} ({fts_table}) VALUES ('rebuild')")
+
+def _refresh_low_stock_sql(product_id):
+    """Trigger statements that re-derive the low stock alert of one product."""
+    return f"""
+        DELETE FROM low_stock_alerts WHERE product_id = {product_id};
+        INSERT INTO low_stock_alerts (product_id, total_stock, reorder_level)
+        SELECT p.product_id, s.total_stock, p.reorder_level
+        FROM products p JOIN product_stock s ON s.product_id = p.product_id
+        WHERE p.product_id = {product_id} AND s.total_stock < p.reorder_level;"""
+
+# Batches expiring between today and the configured horizon, as seen by triggers.
+NEAR_EXPIRY_WINDOW_SQL = """
+    BETWEEN date('now', 'localtime')
+    AND date('now', 'localtime', '+' || (SELECT value FROM alert_settings WHERE key = 'near_expiry_days') || ' days')"""
+
+def _create_alert_tables(cursor):
+    """
+    Creates the materialized alert tables and the triggers that keep them
+    current on every product, batch and sale write:
+
+    - product_stock: total batch quantity per product.
+    - low_stock_alerts: products whose stock is below their reorder level.
+    - near_expiry_alerts: batches with stock expiring within the
+      near_expiry_days setting. Batches also enter and leave this window as
+      days pass, which alerts.roll_forward_expiry_alerts handles once a day.
+    - alert_counts: the number of rows in each alert table, for the dashboard.
+    """
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_stock'"
+    ).fetchone()
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alert_settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )""")
+    cursor.execute("INSERT OR IGNORE INTO alert_settings (key, value) VALUES ('near_expiry_days', '30')")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS product_stock (
+        product_id INTEGER PRIMARY KEY,
+        total_stock INTEGER NOT NULL DEFAULT 0
+    )""")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS low_stock_alerts (
+        product_id INTEGER PRIMARY KEY,
+        total_stock INTEGER NOT NULL,
+        reorder_level INTEGER NOT NULL
+    )""")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS near_expiry_alerts (
+        batch_id INTEGER PRIMARY KEY,
+        product_id INTEGER NOT NULL,
+        expiry_date DATE NOT NULL
+    )""")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_near_expiry_alerts_expiry ON near_expiry_alerts (expiry_date)")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alert_counts (
+        alert_type TEXT PRIMARY KEY,
+        item_count INTEGER NOT NULL DEFAULT 0
+    )""")
+    cursor.execute("INSERT OR IGNORE INTO alert_counts (alert_type) VALUES ('low_stock'), ('near_expiry')")
+
+    # Alert counts
+    for table, alert_type in (('low_stock_alerts', 'low_stock'), ('near_expiry_alerts', 'near_expiry')):
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table} BEGIN
+            UPDATE alert_counts SET item_count = item_count + 1 WHERE alert_type = '{alert_type}';
+        END""")
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table} BEGIN
+            UPDATE alert_counts SET item_count = item_count - 1 WHERE alert_type = '{alert_type}';
+        END""")
+
+    # Low stock follows product stock and reorder levels
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS product_stock_alert_insert AFTER INSERT ON product_stock BEGIN
+        {_refresh_low_stock_sql('new.product_id')}
+    END""")
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS product_stock_alert_update AFTER UPDATE ON product_stock BEGIN
+        {_refresh_low_stock_sql('new.product_id')}
+    END""")
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS products_reorder_level_alert AFTER UPDATE OF reorder_level ON products BEGIN
+        {_refresh_low_stock_sql('new.product_id')}
+    END""")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS products_stock_insert AFTER INSERT ON products BEGIN
+        INSERT INTO product_stock (product_id, total_stock) VALUES (new.product_id, 0);
+    END""")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS products_stock_delete AFTER DELETE ON products BEGIN
+        DELETE FROM low_stock_alerts WHERE product_id = old.product_id;
+        DELETE FROM product_stock WHERE product_id = old.product_id;
+    END""")
+
+    # Product stock follows batch writes, including the quantity updates of sales
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS batches_stock_insert AFTER INSERT ON batches BEGIN
+        UPDATE product_stock SET total_stock = total_stock + new.quantity WHERE product_id = new.product_id;
+    END""")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS batches_stock_delete AFTER DELETE ON batches BEGIN
+        UPDATE product_stock SET total_stock = total_stock - old.quantity WHERE product_id = old.product_id;
+    END""")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS batches_stock_update AFTER UPDATE OF quantity, product_id ON batches BEGIN
+        UPDATE product_stock SET total_stock = total_stock - old.quantity WHERE product_id = old.product_id;
+        UPDATE product_stock SET total_stock = total_stock + new.quantity WHERE product_id = new.product_id;
+    END""")
+
+    # Near expiry follows batch writes
+    near_expiry_insert = f"""
+        INSERT INTO near_expiry_alerts (batch_id, product_id, expiry_date)
+        SELECT new.batch_id, new.product_id, new.expiry_date
+        WHERE new.quantity > 0 AND new.expiry_date {NEAR_EXPIRY_WINDOW_SQL};"""
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS batches_expiry_insert AFTER INSERT ON batches BEGIN
+        {near_expiry_insert}
+    END""")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS batches_expiry_delete AFTER DELETE ON batches BEGIN
+        DELETE FROM near_expiry_alerts WHERE batch_id = old.batch_id;
+    END""")
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS batches_expiry_update AFTER UPDATE OF quantity, expiry_date, product_id ON batches BEGIN
+        DELETE FROM near_expiry_alerts WHERE batch_id = old.batch_id;
+        {near_expiry_insert}
+    END""")
+
+    if not exists:
+        rebuild_alert_tables(cursor)
+
+def rebuild_alert_tables(cursor):
+    """Recomputes all materialized alert tables from the products and batches."""
+    cursor.execute("DELETE FROM near_expiry_alerts")
+    cursor.execute("DELETE FROM low_stock_alerts")
+    cursor.execute("DELETE FROM product_stock")
+    cursor.execute("""
+        INSERT INTO product_stock (product_id, total_stock)
+        SELECT p.product_id, IFNULL(SUM(b.quantity), 0)
+        FROM products p LEFT JOIN batches b ON b.product_id = p.product_id
+        GROUP BY p.product_id
+    """)
+    cursor.execute(f"""
+        INSERT INTO near_expiry_alerts (batch_id, product_id, expiry_date)
+        SELECT batch_id, product_id, expiry_date FROM batches
+        WHERE quantity > 0 AND expiry_date {NEAR_EXPIRY_WINDOW_SQL}
+    """)
+    cursor.execute("""
+        UPDATE alert_counts SET item_count = CASE alert_type
+            WHEN 'low_stock' THEN (SELECT COUNT(*) FROM low_stock_alerts)
+            WHEN 'near_expiry' THEN (SELECT COUNT(*) FROM near_expiry_alerts)
+        END
+    """)
+
+def _create_pricing_tables(cursor):
+    """
+    Creates the promotional pricing tables (see pricing.py):
+
+    - pricing_rules: markdowns by category, days to expiry and quantity.
+    - batch_prices: the cached effective prices of every batch with stock, one
+      row per quantity tier that has a rule.
+    - batch_price_queue: batches whose cached price is stale because they were
+      added, restocked or edited since the last pricing run. Filled by the
+      triggers below, emptied by pricing.refresh_prices.
+    - price_cache_state: the day and pricing_rules version batch_prices was
+      computed for. When either changes every batch is repriced.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS pricing_rules (
+        rule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        category TEXT,
+        max_days_to_expiry INTEGER CHECK (max_days_to_expiry >= 0),
+        min_quantity INTEGER NOT NULL DEFAULT 1 CHECK (min_quantity >= 1),
+        markdown_basis_points INTEGER NOT NULL CHECK (markdown_basis_points BETWEEN 1 AND 10000),
+        is_active INTEGER NOT NULL DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS batch_prices (
+        batch_id INTEGER NOT NULL,
+        min_quantity INTEGER NOT NULL,
+        price_cents INTEGER NOT NULL,
+        rule_id INTEGER,
+        PRIMARY KEY (batch_id, min_quantity)
+    ) WITHOUT ROWID""")
+    cursor.execute("CREATE TABLE IF NOT EXISTS batch_price_queue (batch_id INTEGER PRIMARY KEY)")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS price_cache_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        priced_on DATE,
+        rules_version INTEGER
+    )""")
+    cursor.execute("INSERT OR IGNORE INTO price_cache_state (id) VALUES (1)")
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS batches_price_insert AFTER INSERT ON batches BEGIN
+        INSERT OR IGNORE INTO batch_price_queue (batch_id) VALUES (new.batch_id);
+    END""")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS batches_price_update AFTER UPDATE OF selling_price_cents, expiry_date, product_id ON batches BEGIN
+        INSERT OR IGNORE INTO batch_price_queue (batch_id) VALUES (new.batch_id);
+    END""")
+    # Sold-out batches are not priced; one that is restocked needs a price again.
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS batches_price_restock AFTER UPDATE OF quantity ON batches
+    WHEN old.quantity <= 0 AND new.quantity > 0 BEGIN
+        INSERT OR IGNORE INTO batch_price_queue (batch_id) VALUES (new.batch_id);
+    END""")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS batches_price_delete AFTER DELETE ON batches BEGIN
+        DELETE FROM batch_prices WHERE batch_id = old.batch_id;
+        DELETE FROM batch_price_queue WHERE batch_id = old.batch_id;
+    END""")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS products_price_category AFTER UPDATE OF category ON products BEGIN
+        INSERT OR IGNORE INTO batch_price_queue (batch_id)
+        SELECT batch_id FROM batches WHERE product_id = new.product_id;
+    END""")
+
+def _create_sales_series_tables(cursor):
+    """
+    Creates sales_hourly, the number and amount of sales per hour, kept by
+    triggers on sales so that charts over any period read a few thousand
+    buckets instead of every sale (see timeseries.py).
+
+    Archiving deletes sales from the main database but leaves their buckets,
+    so the series stays complete. Days archived before this table existed
+    only have daily rollups; their totals are put in the day's first hour.
+
+    seq numbers bucket changes, newest highest, so a reader holding buckets
+    in memory fetches only those changed since it last looked.
+    """
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sales_hourly'"
+    ).fetchone() is not None
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sales_hourly (
+        hour TEXT PRIMARY KEY, -- 'YYYY-MM-DD HH'
+        sale_count INTEGER NOT NULL DEFAULT 0,
+        total_amount_cents INTEGER NOT NULL DEFAULT 0,
+        seq INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID""")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_hourly_seq ON sales_hourly (seq)")
+    if not exists:
+        cursor.execute("""
+            INSERT INTO sales_hourly (hour, sale_count, total_amount_cents)
+            SELECT hour, SUM(sale_count), SUM(total_amount_cents) FROM (
+                SELECT strftime('%Y-%m-%d %H', sale_date) AS hour, COUNT(*) AS sale_count,
+                       SUM(total_amount_cents) AS total_amount_cents
+                FROM sales GROUP BY hour
+                UNION ALL
+                SELECT day || ' 00', sale_count, total_amount_cents FROM sales_daily_rollups
+            )
+            WHERE hour IS NOT NULL
+            GROUP BY hour
+        """)
+
+    add_to_bucket = """
+        INSERT INTO sales_hourly (hour, sale_count, total_amount_cents, seq)
+        VALUES (strftime('%Y-%m-%d %H', {row}.sale_date), {sign}1, {sign}{row}.total_amount_cents,
+                (SELECT IFNULL(MAX(seq), 0) + 1 FROM sales_hourly))
+        ON CONFLICT (hour) DO UPDATE SET
+            sale_count = sale_count + excluded.sale_count,
+            total_amount_cents = total_amount_cents + excluded.total_amount_cents,
+            seq = excluded.seq;"""
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS sales_hourly_insert AFTER INSERT ON sales BEGIN
+        {add_to_bucket.format(row='new', sign='')}
+    END""")
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS sales_hourly_update AFTER UPDATE OF sale_date, total_amount_cents ON sales BEGIN
+        {add_to_bucket.format(row='old', sign='-')}
+        {add_to_bucket.format(row='new', sign='')}
+    END""")
+
+def _create_report_cache_table(cursor):
+    """
+    Creates report_cache, where report_cache.py keeps generated reports
+    between sessions. Being in the main database, the cached reports are
+    encrypted like the data they were made from.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS report_cache (
+        cache_key TEXT PRIMARY KEY,
+        stamp TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+
+# Tables whose changes are counted in data_versions.
+VERSIONED_TABLES = (
+    'users', 'products', 'batches', 'customers', 'sales', 'sale_items',
+    'orders', 'order_items', 'activity_logs', 'near_expiry_alerts', 'alert_settings',
+    'pricing_rules',
+)
+
+def _create_data_version_triggers(cursor):
+    """
+    Creates data_versions, a change counter per table bumped by triggers on
+    every insert, update and delete. Readers that keep data on screen or in a
+    cache compare counters to tell whether what they hold is stale, without
+    re-running their queries.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS data_versions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID""")
+    cursor.executemany(
+        "INSERT OR IGNORE INTO data_versions (table_name) VALUES (?)",
+        [(table,) for table in VERSIONED_TABLES]
+    )
+    for table in VERSIONED_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+            END""")
+
+    # Every sale updates batches.quantity, which reports on past sales do not
+    # read; 'batch_costs' only counts the batch changes that alter what a sold
+    # unit cost or which product it was.
+    cursor.execute("INSERT OR IGNORE INTO data_versions (table_name) VALUES ('batch_costs')")
+    for name, event in (('update', 'UPDATE OF cost_price_cents, product_id'), ('delete', 'DELETE')):
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS batch_costs_version_{name} AFTER {event} ON batches BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE table_name = 'batch_costs';
+        END""")
+
+def read_data_versions(cursor, tables=VERSIONED_TABLES):
+    """Returns {table_name: version} for the given tables."""
+    tables = list(tables)
+    placeholders = ', '.join('?' * len(tables))
+    rows = cursor.execute(
+        f"SELECT table_name, version FROM data_versions WHERE table_name IN ({placeholders})", tables
+    ).fetchall()
+    return {row[0]: row[1] for row in rows}
+
+def _enable_incremental_vacuum(cursor):
+    """
+    Switches the database to auto_vacuum=INCREMENTAL, so that pages freed by
+    deletes and archiving can be returned to the file system a few at a time
+    (see maintenance.incremental_vacuum). A new, empty database takes the
+    setting directly; an existing one needs a single full VACUUM to convert.
+    Returns True if that VACUUM ran.
+    """
+    if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    has_tables = cursor.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is not None
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    if has_tables:
+        cursor.execute("VACUUM")
+    return has_tables
+
+# Stored in PRAGMA user_version once initialize_database has brought a file up
+# to date. Bump it with every change to the schema below, so that existing
+# databases run the migrations on their next start.
+SCHEMA_VERSION = 7
+
 def initialize_database(conn=None):
     """
     Initializes the database and creates tables if they don't exist.
     If a connection object is provided, it uses it. Otherwise, it creates a new one.
+    Does nothing if the file is already at SCHEMA_VERSION.
+
+    Returns {'upgraded': whether the schema was brought up to date,
+             'vacuumed': whether the file was converted to incremental auto-vacuum}
     """
     close_conn = False
     if conn is None:
@@ -94,6 +771,17 @@ def initialize_database(conn=None):
 
     cursor = conn.cursor()
 
+    if cursor.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+        if close_conn:
+            conn.close()
+        return {'upgraded': False, 'vacuumed': False}
+
+    vacuumed = _enable_incremental_vacuum(cursor)
+
+    # Write-ahead logging lets readers such as reports and online backups run
+    # without blocking sales from committing. The setting is stored in the file.
+    cursor.execute("PRAGMA journal_mode=WAL")
+
     # User Management
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS users (
@@ -121,8 +809,8 @@ def initialize_database(conn=None):
         quantity INTEGER NOT NULL,
         manufacture_date DATE,
         expiry_date DATE,
-        cost_price REAL NOT NULL,
-        selling_price REAL NOT NULL,
+        cost_price_cents INTEGER NOT NULL,
+        selling_price_cents INTEGER NOT NULL,
         FOREIGN KEY (product_id) REFERENCES products (product_id) ON DELETE CASCADE
     )""")
 
@@ -131,8 +819,11 @@ def initialize_database(conn=None):
     CREATE TABLE IF NOT EXISTS customers (
         customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT NOT NULL,
-        contact_info TEXT
+        contact_info TEXT,
+        phone TEXT,
+        address TEXT
     )""")
+    _migrate_customer_contact_columns(cursor)
 
     # Sales Management
     cursor.execute("""
@@ -141,8 +832,8 @@ def initialize_database(conn=None):
         user_id INTEGER NOT NULL,
         customer_id INTEGER,
         sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        total_amount REAL NOT NULL,
-        discount_applied REAL DEFAULT 0,
+        total_amount_cents INTEGER NOT NULL,
+        discount_applied_cents INTEGER NOT NULL DEFAULT 0,
         FOREIGN KEY (user_id) REFERENCES users (user_id),
         FOREIGN KEY (customer_id) REFERENCES customers (customer_id)
     )""")
@@ -153,7 +844,7 @@ def initialize_database(conn=None):
         sale_id INTEGER NOT NULL,
         batch_id INTEGER NOT NULL,
         quantity_sold INTEGER NOT NULL,
-        price_per_unit REAL NOT NULL,
+        price_per_unit_cents INTEGER NOT NULL,
         FOREIGN KEY (sale_id) REFERENCES sales (sale_id),
         FOREIGN KEY (batch_id) REFERENCES batches (batch_id)
     )""")
@@ -165,6 +856,7 @@ def initialize_database(conn=None):
         customer_id INTEGER NOT NULL,
         order_date DATE NOT NULL,
         status TEXT NOT NULL CHECK(status IN ('Received', 'Ready to Pack', 'Ready to Distribute', 'Completed')),
+        order_type TEXT NOT NULL DEFAULT 'Customer' CHECK(order_type IN ('Customer', 'Purchase')),
         FOREIGN KEY (customer_id) REFERENCES customers (customer_id)
     )""")
 
@@ -178,6 +870,54 @@ def initialize_database(conn=None):
         FOREIGN KEY (product_id) REFERENCES products (product_id)
     )""")
 
+    # Daily totals of sales that have been moved to the yearly archives
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sales_daily_rollups (
+        day DATE PRIMARY KEY,
+        sale_count INTEGER NOT NULL DEFAULT 0,
+        total_amount_cents INTEGER NOT NULL DEFAULT 0,
+        total_discount_cents INTEGER NOT NULL DEFAULT 0,
+        total_revenue_cents INTEGER NOT NULL DEFAULT 0,
+        total_cogs_cents INTEGER NOT NULL DEFAULT 0
+    )""")
+    migrate_money_columns(cursor)
+
+    # Batch stock reserved for order lines by the fulfilment engine
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS order_allocations (
+        allocation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_item_id INTEGER NOT NULL,
+        batch_id INTEGER NOT NULL,
+        quantity_allocated INTEGER NOT NULL,
+        allocated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (order_item_id) REFERENCES order_items (order_item_id),
+        FOREIGN KEY (batch_id) REFERENCES batches (batch_id)
+    )""")
+
+    # Goods Receiving
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS goods_receipts (
+        order_id INTEGER PRIMARY KEY,
+        received_by INTEGER,
+        received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (order_id) REFERENCES orders (order_id),
+        FOREIGN KEY (received_by) REFERENCES users (user_id)
+    )""")
+    _migrate_order_type_column(cursor)
+
+    # Background Jobs
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS scheduled_jobs (
+        name TEXT PRIMARY KEY,
+        last_started_at TIMESTAMP,
+        last_finished_at TIMESTAMP,
+        last_status TEXT,
+        last_error TEXT,
+        last_duration REAL,
+        run_count INTEGER NOT NULL DEFAULT 0,
+        failure_count INTEGER NOT NULL DEFAULT 0
+    )""")
+
     # Activity Logging
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS activity_logs (
@@ -185,20 +925,62 @@ def initialize_database(conn=None):
         user_id INTEGER,
         timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         action_description TEXT NOT NULL,
+        event_type TEXT,
+        entity_type TEXT,
+        entity_id INTEGER,
+        amount REAL,
+        payload TEXT,
+        amount_cents INTEGER,
         FOREIGN KEY (user_id) REFERENCES users (user_id)
     )""")
+    _migrate_activity_log_event_columns(cursor)
 
-    # Pre-populate with a default admin user for initial login
-    try:
+    # Indexes
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_batches_product_expiry ON batches (product_id, expiry_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_allocations_item ON order_allocations (order_item_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_allocations_batch ON order_allocations (batch_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_date ON sales (sale_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_sale ON sale_items (sale_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_logs_timestamp ON activity_logs (timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_logs_user_timestamp ON activity_logs (user_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_logs_event_timestamp ON activity_logs (event_type, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_logs_event_user ON activity_logs (event_type, user_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_logs_entity ON activity_logs (entity_type, entity_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_phone ON customers (phone)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_name ON customers (name COLLATE NOCASE)")
+
+    # Full-text search
+    _create_fts_index(cursor, 'products', 'product_id', ['name', 'category'])
+    _create_fts_index(cursor, 'customers', 'customer_id', ['name', 'phone', 'address'])
+    _create_fts_index(cursor, 'activity_logs', 'log_id', ['action_description'])
+
+    # Materialized alerts
+    _create_alert_tables(cursor)
+
+    # Promotional pricing
+    _create_pricing_tables(cursor)
+
+    # Hourly sales buckets for charts
+    _create_sales_series_tables(cursor)
+
+    # Generated reports kept between sessions
+    _create_report_cache_table(cursor)
+
+    # Change counters for cached views and reports
+    _create_data_version_triggers(cursor)
+
+    # Pre-populate a new database with a default admin user for initial login
+    if cursor.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None:
         admin_password = "admin"
         hashed_password = _hash_password(admin_password)
         cursor.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
                        ('admin', hashed_password, 'Admin'))
-    except sqlite3.IntegrityError:
-        # Admin user already exists, do nothing.
-        pass
 
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     conn.commit()
     if close_conn:
         conn.close()
     print("Database initialized successfully.")
+    return {'upgraded': True, 'vacuumed': vacuumed}
@@ -0,0 +1,158 @@
+"""
+Forecasting Layer: Daily demand per product and reorder suggestions.
+
+Units sold per product and day over the last HISTORY_DAYS complete days are
+read with one query into a products x days NumPy matrix, so every statistic
+below is computed for the whole catalogue at once:
+
+- sma: the simple moving average of the last SMA_WINDOW days.
+- smoothed: simple exponential smoothing over the whole history, written as
+  one matrix-vector product with the smoothing weights. This is the forecast
+  daily demand; it follows recent changes faster than the average does.
+- days_of_cover: how many days the current stock lasts at that demand.
+- suggested_quantity: what to order so that stock plus open orders covers
+  demand over LEAD_TIME_DAYS + COVER_DAYS, and never less than the product's
+  reorder level.
+
+Open orders are purchase orders not yet received into stock (see
+services.receive_orders_into_stock), which is also where a suggestion ends
+up. Customer orders are filled from stock and never add to it.
+
+Results are cached in memory until the day changes or a table they are read
+from is written, e.g. by the next sale.
+"""
+import math
+import threading
+from datetime import date, timedelta
+import numpy as np
+from database import get_db_connection, read_data_versions
+from archive import attach_archives_for_range
+
+HISTORY_DAYS = 56
+SMA_WINDOW = 28
+SMOOTHING_ALPHA = 0.2
+LEAD_TIME_DAYS = 7
+COVER_DAYS = 14
+
+# Tables whose writes can change a forecast.
+FORECAST_TABLES = ('products', 'batches', 'sales', 'sale_items', 'orders', 'order_items')
+
+_cache_lock = threading.Lock()
+_cache = {'key': None, 'forecast': None}
+
+def _smoothing_weights(days, alpha):
+    """
+    Weights w with D @ w equal to the last level of exponential smoothing
+    started from the first day: alpha * (1 - alpha)^age per day, and the
+    remaining (1 - alpha)^(days - 1) on the first day.
+    """
+    ages = np.arange(days - 1, -1, -1)
+    weights = alpha * (1 - alpha) ** ages
+    weights[0] = (1 - alpha) ** (days - 1)
+    return weights
+
+def _load_demand(conn, first_day, days):
+    """
+    Returns (products, demand): the product rows, and a float matrix with the
+    units each product sold on each of the `days` days from `first_day`.
+    """
+    products = conn.execute("""
+        SELECT p.product_id, p.name, p.category, p.reorder_level,
+               IFNULL(ps.total_stock, 0) AS stock,
+               IFNULL((
+                   SELECT SUM(oi.quantity_ordered)
+                   FROM order_items oi
+                   JOIN orders o ON o.order_id = oi.order_id
+                   WHERE oi.product_id = p.product_id
+                     AND o.order_type = 'Purchase'
+                     AND NOT EXISTS (SELECT 1 FROM goods_receipts g WHERE g.order_id = oi.order_id)
+               ), 0) AS on_order
+        FROM products p
+        LEFT JOIN product_stock ps ON ps.product_id = p.product_id
+        ORDER BY p.product_id
+    """).fetchall()
+
+    last_day = first_day + timedelta(days=days - 1)
+    attach_archives_for_range(conn, first_day, last_day)
+    rows = conn.execute("""
+        SELECT b.product_id,
+               CAST(julianday(date(s.sale_date)) - julianday(:first_day) AS INTEGER) AS day_index,
+               SUM(si.quantity_sold)
+        FROM all_sales s
+        JOIN all_sale_items si ON si.sale_id = s.sale_id
+        JOIN batches b ON b.batch_id = si.batch_id
+        WHERE s.sale_date >= :first_day AND s.sale_date < date(:last_day, '+1 day')
+        GROUP BY b.product_id, day_index
+    """, {'first_day': first_day.isoformat(), 'last_day': last_day.isoformat()}).fetchall()
+
+    demand = np.zeros((len(products), days))
+    if rows:
+        product_ids = np.array([p['product_id'] for p in products])
+        sold = np.array([tuple(row) for row in rows], dtype=np.int64)
+        # Sales of products deleted since are dropped.
+        positions = np.searchsorted(product_ids, sold[:, 0])
+        known = (positions < len(product_ids)) & (product_ids[np.minimum(positions, len(product_ids) - 1)] == sold[:, 0])
+        demand[positions[known], sold[known, 1]] = sold[known, 2]
+    return products, demand
+
+def _compute_forecast(products, demand):
+    sma = demand[:, -SMA_WINDOW:].mean(axis=1)
+    smoothed = demand @ _smoothing_weights(demand.shape[1], SMOOTHING_ALPHA)
+    stock = np.array([p['stock'] for p in products], dtype=float)
+    on_order = np.array([p['on_order'] for p in products], dtype=float)
+    reorder_level = np.array([p['reorder_level'] for p in products], dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(smoothed > 0, stock / smoothed, np.inf)
+    # Round away float noise from the weights first, so steady demand of 2/day
+    # targets 42 units rather than ceil(42.0000000001) = 43.
+    cover = np.round(smoothed * (LEAD_TIME_DAYS + COVER_DAYS), 6)
+    target = np.maximum(np.ceil(cover), reorder_level)
+    suggested = np.maximum(target - stock - on_order, 0).astype(int)
+
+    forecast = []
+    for i, product in enumerate(products):
+        forecast.append({
+            'product_id': product['product_id'],
+            'name': product['name'],
+            'category': product['category'],
+            'stock': product['stock'],
+            'on_order': product['on_order'],
+            'sma': round(float(sma[i]), 2),
+            'smoothed': round(float(smoothed[i]), 2),
+            'days_of_cover': None if math.isinf(days_of_cover[i]) else round(float(days_of_cover[i]), 1),
+            'suggested_quantity': int(suggested[i]),
+        })
+    return forecast
+
+def forecast_demand(today=None):
+    """
+    Forecasts daily demand for every product, from sales up to yesterday.
+
+    Returns a list of dicts, one per product:
+        {'product_id':, 'name':, 'category':, 'stock':, 'on_order':,
+         'sma':, 'smoothed': forecast units per day,
+         'days_of_cover': None if nothing is selling, 'suggested_quantity':}
+    """
+    today = today or date.today()
+    conn = get_db_connection()
+    try:
+        key = (today, tuple(sorted(read_data_versions(conn, FORECAST_TABLES).items())))
+        with _cache_lock:
+            if _cache['key'] == key:
+                return _cache['forecast']
+        products, demand = _load_demand(conn, today - timedelta(days=HISTORY_DAYS), HISTORY_DAYS)
+    finally:
+        conn.close()
+
+    forecast = _compute_forecast(products, demand)
+    with _cache_lock:
+        _cache['key'] = key
+        _cache['forecast'] = forecast
+    return forecast
+
+def get_reorder_suggestions(today=None):
+    """Returns the forecasts with a suggested quantity, shortest days of cover first."""
+    suggestions = [f for f in forecast_demand(today) if f['suggested_quantity'] > 0]
+    suggestions.sort(key=lambda f: (f['days_of_cover'] is None, f['days_of_cover'] or 0, f['name']))
+    return suggestions
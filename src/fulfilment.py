@@ -0,0 +1,163 @@
+"""
+Order fulfilment engine: reserves batch stock for order lines.
+
+When orders move to 'Ready to Distribute', every order line is allocated to
+specific batches, earliest expiry first, the same policy sales use. A whole
+wave of orders is processed in one pass: the order lines and the available
+stock are each read with a single query, allocation runs against an in-memory
+stock ledger, and the allocations are written with one executemany.
+
+An order is allocated only if all of its lines can be filled. Otherwise it
+gets nothing and its shortfalls are reported. Allocations reserve stock while
+their order is 'Ready to Distribute': sales and later waves only see a
+batch's quantity minus its reservations (RESERVED_STOCK_SQL). They are
+released if the order steps back. Once the order is completed its allocated
+units leave their batches (ship_allocations), and the allocations are kept as
+a record.
+"""
+from collections import defaultdict, deque
+from datetime import date
+from database import stage_ids
+
+RESERVING_STATUS = 'Ready to Distribute'
+
+# Units of each batch reserved by orders awaiting distribution, as a subquery
+# with columns (batch_id, reserved).
+RESERVED_STOCK_SQL = f"""
+    SELECT a.batch_id, SUM(a.quantity_allocated) AS reserved
+    FROM order_allocations a
+    JOIN order_items oi ON oi.order_item_id = a.order_item_id
+    JOIN orders o ON o.order_id = oi.order_id
+    WHERE o.status = '{RESERVING_STATUS}'
+    GROUP BY a.batch_id
+"""
+
+def release_allocations(conn, order_ids):
+    """Deletes the allocations of the given orders, freeing their reserved stock."""
+    cursor = conn.cursor()
+    stage_ids(cursor, "release_orders", order_ids)
+    cursor.execute("""
+        DELETE FROM order_allocations
+        WHERE order_item_id IN (
+            SELECT oi.order_item_id
+            FROM temp.release_orders r
+            JOIN order_items oi ON oi.order_id = r.id
+        )
+    """)
+
+def ship_allocations(conn, order_ids):
+    """
+    Takes the units allocated to the given orders out of their batches, as the
+    orders are completed. Runs inside the caller's transaction and does not commit.
+    """
+    cursor = conn.cursor()
+    stage_ids(cursor, "ship_orders", order_ids)
+    cursor.execute("""
+        UPDATE batches
+        SET quantity = batches.quantity - shipped.quantity
+        FROM (
+            SELECT a.batch_id, SUM(a.quantity_allocated) AS quantity
+            FROM temp.ship_orders r
+            JOIN order_items oi ON oi.order_id = r.id
+            JOIN order_allocations a ON a.order_item_id = oi.order_item_id
+            GROUP BY a.batch_id
+        ) AS shipped
+        WHERE batches.batch_id = shipped.batch_id
+    """)
+
+def _load_stock_ledger(cursor, today):
+    """
+    Returns {product_id: [[batch_id, available], ...]} for the products staged
+    in temp.allocation_products, in expiry order. Available stock is the batch
+    quantity minus what is reserved for other orders. Expired batches are skipped.
+    """
+    cursor.execute(f"""
+        SELECT b.product_id, b.batch_id, b.quantity - IFNULL(res.reserved, 0) AS available
+        FROM batches b
+        LEFT JOIN ({RESERVED_STOCK_SQL}) AS res ON res.batch_id = b.batch_id
+        WHERE b.product_id IN (SELECT id FROM temp.allocation_products)
+          AND (b.expiry_date IS NULL OR b.expiry_date >= ?)
+          AND b.quantity - IFNULL(res.reserved, 0) > 0
+        ORDER BY b.product_id, b.expiry_date, b.batch_id
+    """, (today,))
+
+    ledger = defaultdict(deque)
+    for product_id, batch_id, available in cursor.fetchall():
+        ledger[product_id].append([batch_id, available])
+    return ledger
+
+def allocate_orders(conn, order_ids):
+    """
+    Allocates batch stock to every line of the given orders, as one wave.
+    Runs inside the caller's transaction on `conn` and does not commit.
+
+    Orders are served oldest first. Returns a dict:
+        {'allocated': [order_id, ...],
+         'shortfalls': {order_id: [{'product_id':, 'name':, 'requested':, 'available':}, ...]}}
+    """
+    cursor = conn.cursor()
+
+    # Any earlier allocations of these orders are replaced.
+    release_allocations(conn, order_ids)
+
+    stage_ids(cursor, "allocation_orders", order_ids)
+    cursor.execute("""
+        SELECT oi.order_id, oi.order_item_id, oi.product_id, oi.quantity_ordered, p.name
+        FROM temp.allocation_orders r
+        JOIN orders o ON o.order_id = r.id
+        JOIN order_items oi ON oi.order_id = o.order_id
+        JOIN products p ON p.product_id = oi.product_id
+        ORDER BY o.order_date, o.order_id, oi.order_item_id
+    """)
+    lines_by_order = defaultdict(list)
+    for order_id, order_item_id, product_id, quantity, name in cursor.fetchall():
+        lines_by_order[order_id].append((order_item_id, product_id, quantity, name))
+
+    product_ids = {line[1] for lines in lines_by_order.values() for line in lines}
+    stage_ids(cursor, "allocation_products", product_ids)
+    ledger = _load_stock_ledger(cursor, date.today().strftime('%Y-%m-%d'))
+    remaining = {product_id: sum(batch[1] for batch in batches) for product_id, batches in ledger.items()}
+
+    allocations = []
+    allocated = []
+    shortfalls = {}
+    for order_id, lines in lines_by_order.items():
+        # All-or-nothing: check the whole order against the ledger first.
+        needed = defaultdict(int)
+        names = {}
+        for _, product_id, quantity, name in lines:
+            needed[product_id] += quantity
+            names[product_id] = name
+        short = [
+            {'product_id': product_id, 'name': names[product_id],
+             'requested': quantity, 'available': remaining.get(product_id, 0)}
+            for product_id, quantity in needed.items()
+            if remaining.get(product_id, 0) < quantity
+        ]
+        if short:
+            shortfalls[order_id] = short
+            continue
+
+        for order_item_id, product_id, quantity, _ in lines:
+            batches = ledger[product_id]
+            while quantity > 0:
+                batch = batches[0]
+                take = min(quantity, batch[1])
+                allocations.append((order_item_id, batch[0], take))
+                batch[1] -= take
+                quantity -= take
+                remaining[product_id] -= take
+                if batch[1] == 0:
+                    batches.popleft()
+        allocated.append(order_id)
+
+    for order_id in order_ids:
+        if order_id not in lines_by_order and order_id not in shortfalls:
+            # Orders without lines have nothing to reserve.
+            allocated.append(order_id)
+
+    cursor.executemany(
+        "INSERT INTO order_allocations (order_item_id, batch_id, quantity_allocated) VALUES (?, ?, ?)",
+        allocations
+    )
+    return {'allocated': allocated, 'shortfalls': shortfalls}
@@ -0,0 +1,239 @@
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from datetime import date, timedelta
+from tkcalendar import DateEntry
+import threading
+import queue
+import audit
+from models import Money
+from services import get_all_users
+
+class ActivityLogView(ttk.Frame):
+    """
+    Admin view of the activity log. Pages are fetched in a background thread
+    with keyset pagination, so the view stays responsive however large the
+    log grows; "Load More" appends the next page.
+    """
+    ALL_USERS = "All Users"
+    ALL_EVENTS = "All Events"
+    DATA_TABLES = ('activity_logs',)
+
+    def __init__(self, parent, user_info, app_controller):
+        super().__init__(parent)
+        self.user_info = user_info
+        self.app_controller = app_controller
+        self.log_queue = queue.Queue()
+        self.user_ids = {} # username -> user_id
+        self.event_types = {t.label: t for t in audit.AuditEventType}
+        self.filters = {}
+        self.next_cursor = None
+        self.create_widgets()
+        self.apply_filters()
+
+    def create_widgets(self):
+        # Top frame for navigation
+        top_frame = ttk.Frame(self, padding="10")
+        top_frame.pack(fill='x', side='top')
+        back_button = ttk.Button(top_frame, text="< Back to Dashboard", command=self.back_to_dashboard)
+        back_button.pack(side='left')
+        ttk.Label(top_frame, text="Activity Log", font=("Arial", 16)).pack(side='left', padx=20)
+
+        # Filters
+        filter_frame = ttk.Frame(self)
+        filter_frame.pack(fill='x', padx=10)
+
+        ttk.Label(filter_frame, text="User:").pack(side='left')
+        self.user_ids = {u['username']: u['user_id'] for u in get_all_users()}
+        self.user_var = tk.StringVar(value=self.ALL_USERS)
+        ttk.Combobox(filter_frame, textvariable=self.user_var, state="readonly", width=15,
+                     values=[self.ALL_USERS] + list(self.user_ids)).pack(side='left', padx=5)
+
+        ttk.Label(filter_frame, text="Event:").pack(side='left')
+        self.event_var = tk.StringVar(value=self.ALL_EVENTS)
+        ttk.Combobox(filter_frame, textvariable=self.event_var, state="readonly", width=15,
+                     values=[self.ALL_EVENTS] + list(self.event_types)).pack(side='left', padx=5)
+
+        ttk.Label(filter_frame, text="Min Amount:").pack(side='left')
+        self.min_amount_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=self.min_amount_var, width=8).pack(side='left', padx=5)
+
+        ttk.Label(filter_frame, text="Min Value:").pack(side='left')
+        self.min_value_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=self.min_value_var, width=10).pack(side='left', padx=5)
+
+        ttk.Label(filter_frame, text="From:").pack(side='left')
+        self.start_date_entry = DateEntry(filter_frame, width=12, background='darkblue', foreground='white', borderwidth=2)
+        self.start_date_entry.set_date(date.today() - timedelta(days=30))
+        self.start_date_entry.pack(side='left', padx=5)
+
+        ttk.Label(filter_frame, text="To:").pack(side='left')
+        self.end_date_entry = DateEntry(filter_frame, width=12, background='darkblue', foreground='white', borderwidth=2)
+        self.end_date_entry.pack(side='left', padx=5)
+
+        ttk.Label(filter_frame, text="Search:").pack(side='left')
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(filter_frame, textvariable=self.search_var, width=20)
+        search_entry.pack(side='left', padx=5)
+        search_entry.bind("<Return>", lambda event: self.apply_filters())
+
+        self.apply_button = ttk.Button(filter_frame, text="Apply", command=self.apply_filters)
+        self.apply_button.pack(side='left', padx=5)
+
+        # Frame for the Treeview and Scrollbar
+        tree_frame = ttk.Frame(self)
+        tree_frame.pack(expand=True, fill='both', padx=10, pady=10)
+
+        self.tree = ttk.Treeview(tree_frame, columns=('ID', 'Time', 'User', 'Event', 'Amount', 'Value', 'Action'), show='headings')
+        self.tree.heading('ID', text='ID')
+        self.tree.heading('Time', text='Time')
+        self.tree.heading('User', text='User')
+        self.tree.heading('Event', text='Event')
+        self.tree.heading('Amount', text='Amount')
+        self.tree.heading('Value', text='Value')
+        self.tree.heading('Action', text='Action')
+
+        self.tree.column('ID', width=70)
+        self.tree.column('Time', width=150)
+        self.tree.column('User', width=120)
+        self.tree.column('Event', width=110)
+        self.tree.column('Amount', width=80)
+        self.tree.column('Value', width=110)
+        self.tree.column('Action', width=400)
+
+        self.tree.pack(side='left', expand=True, fill='both')
+
+        scrollbar = ttk.Scrollbar(tree_frame, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+
+        # Frame for buttons
+        button_frame = ttk.Frame(self)
+        button_frame.pack(fill='x', padx=10, pady=(0, 10))
+
+        self.more_button = ttk.Button(button_frame, text="Load More", command=self.load_more, state=tk.DISABLED)
+        self.more_button.pack(side='left', padx=5)
+
+        self.export_button = ttk.Button(button_frame, text="Export CSV...", command=self.export_csv)
+        self.export_button.pack(side='left', padx=5)
+
+        self.status_label = ttk.Label(button_frame, text="", font=("Arial", 10, "italic"))
+        self.status_label.pack(side='left', padx=10)
+
+    def back_to_dashboard(self):
+        self.app_controller.show_main_dashboard()
+
+    def _read_filters(self):
+        start_date = self.start_date_entry.get_date()
+        end_date = self.end_date_entry.get_date()
+        if start_date > end_date:
+            messagebox.showerror("Error", "Please select a valid date range.")
+            return None
+        min_amount = self.min_amount_var.get().strip()
+        try:
+            min_amount = float(min_amount) if min_amount else None
+        except ValueError:
+            messagebox.showerror("Error", "Minimum amount must be a number.")
+            return None
+        min_value = self.min_value_var.get().strip()
+        try:
+            min_value = Money.parse(min_value) if min_value else None
+        except ValueError:
+            messagebox.showerror("Error", "Minimum value must be an amount of money.")
+            return None
+        user = self.user_var.get()
+        return {
+            'user_id': self.user_ids.get(user) if user != self.ALL_USERS else None,
+            'start_date': start_date,
+            'end_date': end_date,
+            'event_type': self.event_types.get(self.event_var.get()),
+            'min_amount': min_amount,
+            'min_amount_cents': min_value.cents if min_value is not None else None,
+            'text': self.search_var.get(),
+        }
+
+    def refresh_view(self):
+        self.apply_filters()
+
+    def apply_filters(self):
+        filters = self._read_filters()
+        if filters is None:
+            return
+        self.filters = filters
+        self.tree.delete(*self.tree.get_children())
+        self._fetch_page(after=None)
+
+    def load_more(self):
+        if self.next_cursor:
+            self._fetch_page(after=self.next_cursor)
+
+    def _fetch_page(self, after):
+        self.apply_button.config(state=tk.DISABLED)
+        self.more_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Loading...")
+
+        def worker():
+            try:
+                self.log_queue.put(("page", audit.get_activity_logs(after=after, **self.filters)))
+            except Exception as e:
+                self.log_queue.put(("error", str(e)))
+
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        self.after(100, self._check_queue)
+
+    def export_csv(self):
+        filters = self._read_filters()
+        if filters is None:
+            return
+        file_path = filedialog.asksaveasfilename(
+            title="Export Activity Log",
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        self.export_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Exporting...")
+
+        def worker():
+            try:
+                self.log_queue.put(("export", audit.export_activity_logs(file_path, **filters)))
+            except Exception as e:
+                self.log_queue.put(("error", str(e)))
+
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        self.after(100, self._check_queue)
+
+    def _check_queue(self):
+        try:
+            message_type, data = self.log_queue.get_nowait()
+        except queue.Empty:
+            self.after(100, self._check_queue)
+            return
+
+        if message_type == "error":
+            messagebox.showerror("Error", f"Failed to load activity: {data}")
+            self.status_label.config(text="")
+        elif message_type == "export":
+            self.status_label.config(text="")
+            messagebox.showinfo("Export Complete", f"Exported {data} log entries.")
+        elif message_type == "page":
+            for row in data['rows']:
+                event_type = audit.AuditEventType(row['event_type']).label if row['event_type'] else ""
+                self.tree.insert('', 'end', values=(
+                    row['log_id'], row['timestamp'], row['username'] or "N/A", event_type,
+                    "" if row['amount'] is None else f"{row['amount']:g}",
+                    "" if row['amount_cents'] is None else Money(row['amount_cents']).format(currency=False),
+                    row['action_description']
+                ))
+            self.next_cursor = data['next']
+            shown = len(self.tree.get_children())
+            self.status_label.config(text=f"Showing {shown} entries" + (" (more available)" if self.next_cursor else ""))
+
+        self.apply_button.config(state=tk.NORMAL)
+        self.export_button.config(state=tk.NORMAL)
+        self.more_button.config(state=tk.NORMAL if self.next_cursor else tk.DISABLED)
@@ -1,17 +1,24 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import services
+import pricing
+from models import Money
 from gui.base_window import BaseWindow
 from gui.widgets.datepicker import create_datepicker_entry
 from gui.widgets.tooltip_button import TooltipButton
-from datetime import date, timedelta
+from datetime import date
+import threading
+import queue
 
 class InventoryView(tk.Frame):
+    DATA_TABLES = ('products', 'batches')
+
     def __init__(self, parent, user_info, app_controller):
         super().__init__(parent)
         self.user_info = user_info
         self.app_controller = app_controller
         self._search_job = None
+        self.import_queue = queue.Queue()
 
         self.create_widgets()
         self.refresh_products()
@@ -87,6 +94,12 @@ class InventoryView(tk.Frame):
         add_batch_button.pack(side=tk.LEFT, padx=5)
         delete_batch_button = TooltipButton(button_frame, text="Delete Batch (Del)", command=self.delete_batch)
         delete_batch_button.pack(side=tk.LEFT, padx=5)
+        self.import_button = TooltipButton(button_frame, text="Import CSV...", command=self.import_csv,
+                                           tooltip_text="Bulk import products or batches from a CSV file")
+        self.import_button.pack(side=tk.LEFT, padx=5)
+        pricing_button = TooltipButton(button_frame, text="Pricing Rules...", command=self.manage_pricing_rules,
+                                       tooltip_text="Markdowns for near-expiry stock and quantity breaks")
+        pricing_button.pack(side=tk.LEFT, padx=5)
         TooltipButton(button_frame, text="Back (Esc)", command=self.app_controller.show_main_dashboard).pack(side=tk.RIGHT, padx=5)
 
         if self.user_info['role'] in ['Viewer', 'Seller']:
@@ -95,10 +108,14 @@ class InventoryView(tk.Frame):
             delete_product_button.configure(state=tk.DISABLED)
             add_batch_button.configure(state=tk.DISABLED)
             delete_batch_button.configure(state=tk.DISABLED)
+            self.import_button.configure(state=tk.DISABLED)
+            pricing_button.configure(state=tk.DISABLED)
 
     def refresh_products(self):
-        self.all_products = services.get_all_products()
-        self.filter_products()
+        self._perform_filter()
+
+    def refresh_view(self):
+        self._perform_filter()
 
     def filter_products(self, event=None):
         if self._search_job:
@@ -106,14 +123,14 @@ class InventoryView(tk.Frame):
         self._search_job = self.after(300, self._perform_filter)
 
     def _perform_filter(self):
-        search_term = self.product_search_var.get().lower()
+        self._search_job = None
+        products = services.get_all_products(search=self.product_search_var.get())
 
         self.products_tree.delete(*self.products_tree.get_children())
         self.batches_tree.delete(*self.batches_tree.get_children())
 
-        for p in self.all_products:
-            if search_term in p['name'].lower() or search_term in p['category'].lower():
-                self.products_tree.insert("", tk.END, values=(p['product_id'], p['name'], p['category']))
+        for p in products:
+            self.products_tree.insert("", tk.END, values=(p['product_id'], p['name'], p['category']))
 
     def on_product_select(self, event):
         for i in self.batches_tree.get_children():
@@ -126,7 +143,10 @@ class InventoryView(tk.Frame):
         product_id = self.products_tree.item(selected_item[0])['values'][0]
         batches = services.get_batches_for_product(product_id)
         for b in batches:
-            self.batches_tree.insert("", tk.END, values=(b['batch_id'], b['batch_number'], b['quantity'], b['expiry_date'], f"{b['selling_price']:.2f}LKR"))
+            price_text = Money(b['selling_price_cents']).format()
+            if b['price_cents'] < b['selling_price_cents']:
+                price_text = f"{Money(b['price_cents']).format()} (was {Money(b['selling_price_cents']).format(currency=False)})"
+            self.batches_tree.insert("", tk.END, values=(b['batch_id'], b['batch_number'], b['quantity'], b['expiry_date'], price_text))
 
     def add_product(self):
         win = AddEditProductWindow(self)
@@ -174,7 +194,7 @@ class InventoryView(tk.Frame):
 
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete '{product_name}'? This will also delete all its batches."):
             try:
-                services.delete_product(product_id)
+                services.delete_product(product_id, user_id=self.user_info['user_id'])
                 messagebox.showinfo("Success", "Product deleted successfully.")
                 self.refresh_products()
             except Exception as e:
@@ -196,7 +216,7 @@ class InventoryView(tk.Frame):
         self.wait_window(win)
         if win.result:
             try:
-                services.add_batch(product_id, win.result)
+                services.add_batch(product_id, win.result, user_id=self.user_info['user_id'])
                 messagebox.showinfo("Success", "Batch added successfully.")
                 self.on_product_select(None) # Refresh batch list
             except Exception as e:
@@ -214,12 +234,66 @@ class InventoryView(tk.Frame):
 
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete batch '{batch_no}'?"):
             try:
-                services.delete_batch(batch_id)
+                services.delete_batch(batch_id, user_id=self.user_info['user_id'])
                 messagebox.showinfo("Success", "Batch deleted successfully.")
                 self.on_product_select(None) # Refresh batch list
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to delete batch: {e}")
 
+    def manage_pricing_rules(self):
+        win = PricingRulesWindow(self)
+        self.wait_window(win)
+        self.on_product_select(None) # Prices may have changed
+
+    def import_csv(self):
+        """Asks for a CSV file and imports it in a background thread."""
+        file_path = filedialog.askopenfilename(
+            title="Import Products or Batches",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        self.import_button.config(state=tk.DISABLED)
+        thread = threading.Thread(target=self._run_import, args=(file_path,))
+        thread.daemon = True
+        thread.start()
+        self.after(100, self._check_import_queue)
+
+    def _run_import(self, file_path):
+        """Worker function that runs the bulk import off the UI thread."""
+        try:
+            result = services.import_inventory_csv(file_path, self.user_info['user_id'])
+            self.import_queue.put(("done", result))
+        except Exception as e:
+            self.import_queue.put(("error", str(e)))
+
+    def _check_import_queue(self):
+        """Checks the queue for the import result and reports it."""
+        try:
+            message_type, data = self.import_queue.get_nowait()
+        except queue.Empty:
+            self.after(100, self._check_import_queue)
+            return
+
+        self.import_button.config(state=tk.NORMAL)
+        if message_type == "error":
+            messagebox.showerror("Import Error", f"Import failed, no rows were saved: {data}")
+            return
+
+        message = f"Imported {data['imported']} rows."
+        rejected = data['rejected']
+        if rejected:
+            message += f"\n\n{len(rejected)} rows were rejected:"
+            for line_number, reason in rejected[:15]:
+                message += f"\nLine {line_number}: {reason}"
+            if len(rejected) > 15:
+                message += f"\n... and {len(rejected) - 15} more."
+            messagebox.showwarning("Import Finished", message)
+        else:
+            messagebox.showinfo("Import Finished", message)
+        self.refresh_products()
+
 class AddEditProductWindow(BaseWindow):
     def __init__(self, parent, product=None):
         super().__init__(parent)
@@ -280,8 +354,8 @@ class AddBatchWindow(BaseWindow):
         self.quantity_var = tk.IntVar()
         self.batch_number_var = tk.StringVar()
         self.quantity_var = tk.IntVar()
-        self.cost_price_var = tk.DoubleVar()
-        self.sell_price_var = tk.DoubleVar()
+        self.cost_price_var = tk.StringVar()
+        self.sell_price_var = tk.StringVar()
 
         form_frame = ttk.Frame(self, padding="10")
         form_frame.pack(fill=tk.BOTH, expand=True)
@@ -332,13 +406,7 @@ class AddBatchWindow(BaseWindow):
             mfg_date_str = self.mfg_date_entry.get()
             mfg_date = date.fromisoformat(mfg_date_str)
 
-            years_to_add = 1 # Default
-            if self.product['category'] == 'Water':
-                years_to_add = 2
-            elif self.product['category'] == 'Soft Drink':
-                years_to_add = 1
-
-            expiry_date = mfg_date + timedelta(days=365 * years_to_add)
+            expiry_date = services.get_default_expiry_date(self.product['category'], mfg_date)
 
             self.exp_date_entry.delete(0, tk.END)
             self.exp_date_entry.insert(0, expiry_date.strftime('%Y-%m-%d'))
@@ -351,12 +419,117 @@ class AddBatchWindow(BaseWindow):
         if not all([self.batch_number_var.get(), self.quantity_var.get(), self.exp_date_entry.get(), self.sell_price_var.get()]):
             messagebox.showerror("Validation Error", "Please fill in all required fields.")
             return
+        try:
+            cost_price = Money.parse(self.cost_price_var.get() or 0)
+            selling_price = Money.parse(self.sell_price_var.get())
+        except ValueError:
+            messagebox.showerror("Validation Error", "Prices must be amounts such as 125.50.")
+            return
         self.result = {
             "batch_number": self.batch_number_var.get(),
             "quantity": self.quantity_var.get(),
             "manufacture_date": self.mfg_date_entry.get() or None,
             "expiry_date": self.exp_date_entry.get(),
-            "cost_price": self.cost_price_var.get(),
-            "selling_price": self.sell_price_var.get()
+            "cost_price": cost_price,
+            "selling_price": selling_price
         }
         self.destroy()
+
+class PricingRulesWindow(BaseWindow):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Pricing Rules")
+        self.create_widgets()
+        self.refresh_rules()
+        self.center_window()
+
+    def create_widgets(self):
+        list_frame = ttk.Frame(self, padding="10")
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        self.rules_tree = ttk.Treeview(
+            list_frame,
+            columns=("id", "name", "category", "days", "min_qty", "markdown", "active"),
+            show="headings", height=8
+        )
+        for column, heading, width in (
+            ("id", "ID", 40), ("name", "Name", 160), ("category", "Category", 90),
+            ("days", "Expires Within (Days)", 130), ("min_qty", "Min. Qty", 70),
+            ("markdown", "Markdown", 80), ("active", "Active", 60),
+        ):
+            self.rules_tree.heading(column, text=heading)
+            self.rules_tree.column(column, width=width)
+        self.rules_tree.pack(fill=tk.BOTH, expand=True)
+
+        form_frame = ttk.LabelFrame(self, text="New Rule", padding="10")
+        form_frame.pack(fill=tk.X, padx=10)
+        form_frame.grid_columnconfigure(1, weight=1)
+        self.name_var = tk.StringVar()
+        self.category_var = tk.StringVar(value="Any")
+        self.days_var = tk.StringVar()
+        self.min_quantity_var = tk.StringVar(value="1")
+        self.percent_var = tk.StringVar()
+
+        ttk.Label(form_frame, text="Name:").grid(row=0, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(form_frame, textvariable=self.name_var).grid(row=0, column=1, sticky=tk.EW, pady=2)
+        ttk.Label(form_frame, text="Category:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        ttk.Combobox(form_frame, textvariable=self.category_var, values=["Any"] + services.PRODUCT_CATEGORIES,
+                     state="readonly").grid(row=1, column=1, sticky=tk.EW, pady=2)
+        ttk.Label(form_frame, text="Expires within (days, blank = any):").grid(row=2, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(form_frame, textvariable=self.days_var).grid(row=2, column=1, sticky=tk.EW, pady=2)
+        ttk.Label(form_frame, text="Minimum quantity:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(form_frame, textvariable=self.min_quantity_var).grid(row=3, column=1, sticky=tk.EW, pady=2)
+        ttk.Label(form_frame, text="Markdown (%):").grid(row=4, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(form_frame, textvariable=self.percent_var).grid(row=4, column=1, sticky=tk.EW, pady=2)
+
+        button_frame = ttk.Frame(self, padding="10")
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="Add Rule", command=self.add_rule).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Enable/Disable", command=self.toggle_rule).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Delete", command=self.delete_rule).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close", command=self.destroy).pack(side=tk.RIGHT)
+
+    def refresh_rules(self):
+        for i in self.rules_tree.get_children():
+            self.rules_tree.delete(i)
+        for rule in pricing.get_pricing_rules():
+            self.rules_tree.insert("", tk.END, values=(
+                rule['rule_id'], rule['name'], rule['category'] or "Any",
+                "Any" if rule['max_days_to_expiry'] is None else rule['max_days_to_expiry'],
+                rule['min_quantity'], f"{rule['percent_off']:g}%", "Yes" if rule['is_active'] else "No"
+            ))
+
+    def add_rule(self):
+        try:
+            days = self.days_var.get().strip()
+            pricing.add_pricing_rule(
+                self.name_var.get().strip(),
+                self.percent_var.get().strip(),
+                category=None if self.category_var.get() == "Any" else self.category_var.get(),
+                max_days_to_expiry=int(days) if days else None,
+                min_quantity=int(self.min_quantity_var.get() or 1),
+            )
+        except ValueError as e:
+            messagebox.showerror("Validation Error", str(e), parent=self)
+            return
+        self.name_var.set("")
+        self.percent_var.set("")
+        self.refresh_rules()
+
+    def _selected_rule(self):
+        selected_item = self.rules_tree.selection()
+        if not selected_item:
+            messagebox.showwarning("Selection Error", "Please select a rule.", parent=self)
+            return None
+        return self.rules_tree.item(selected_item[0])['values']
+
+    def toggle_rule(self):
+        values = self._selected_rule()
+        if values:
+            pricing.set_pricing_rule_active(values[0], values[6] != "Yes")
+            self.refresh_rules()
+
+    def delete_rule(self):
+        values = self._selected_rule()
+        if values and messagebox.askyesno("Confirm Delete", f"Delete the pricing rule '{values[1]}'?", parent=self):
+            pricing.delete_pricing_rule(values[0])
+            self.refresh_rules()
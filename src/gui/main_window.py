@@ -1,11 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from services import get_dashboard_stats, get_near_expiry_items, get_low_stock_items, get_recent_sales
+from datetime import date, timedelta
+from models import Money
+import timeseries
 from .widgets.tooltip_button import TooltipButton
+from .widgets.sales_chart import SalesChart
 from .detailed_alert_view import DetailedAlertView
-from .user_management_view import UserManagementView
 
 class MainWindow(tk.Frame):
+    # Tables shown on the dashboard; see ViewManager.
+    DATA_TABLES = ('sales', 'products', 'batches', 'near_expiry_alerts', 'alert_settings')
+    # Sales trend periods in days; None is everything since the first sale.
+    TREND_PERIODS = {"Last 2 Days": 2, "Last 30 Days": 30, "Last 12 Months": 365, "All Time": None}
+
     def __init__(self, parent, user_info, app_controller):
         super().__init__(parent)
         self.parent = parent
@@ -15,6 +23,9 @@ class MainWindow(tk.Frame):
         self.create_widgets()
         self.update_stats()
 
+    def refresh_view(self):
+        self.update_stats()
+
     def show_near_expiry_details(self, event=None):
         items = get_near_expiry_items()
         if not items:
@@ -72,6 +83,9 @@ class MainWindow(tk.Frame):
             users_button = TooltipButton(nav_frame, text="Users", command=self.show_user_management_view, tooltip_text="Manage Users")
             users_button.pack(side=tk.LEFT, padx=5)
 
+            activity_button = TooltipButton(nav_frame, text="Activity Log", command=self.show_activity_log_view, tooltip_text="Review User Activity")
+            activity_button.pack(side=tk.LEFT, padx=5)
+
         if self.user_info['role'] == 'Viewer':
             sales_button.configure(state=tk.DISABLED)
             orders_button.configure(state=tk.DISABLED)
@@ -109,8 +123,9 @@ class MainWindow(tk.Frame):
         self.sales_label.pack(padx=20, pady=20)
 
         # Near Expiry Items
-        expiry_labelframe = ttk.LabelFrame(stats_frame, text="⚠ Items Nearing Expiry (30 days)", cursor="hand2")
+        expiry_labelframe = ttk.LabelFrame(stats_frame, text="⚠ Items Nearing Expiry", cursor="hand2")
         expiry_labelframe.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
+        self.expiry_labelframe = expiry_labelframe
         self.expiry_label = ttk.Label(expiry_labelframe, text="0 Items", font=("Arial", 24), style="Orange.TLabel")
         self.expiry_label.pack(padx=20, pady=20)
         expiry_labelframe.bind("<Button-1>", self.show_near_expiry_details)
@@ -163,14 +178,28 @@ class MainWindow(tk.Frame):
         self.low_stock_tree.heading("reorder_level", text="Reorder Level")
         self.low_stock_tree.pack(fill="both", expand=True, padx=3, pady=5)
 
+        # Sales Trend Chart
+        main_content.grid_rowconfigure(2, weight=1)
+        trend_frame = ttk.LabelFrame(main_content, text="Sales Trend")
+        trend_frame.grid(row=2, column=0, columnspan=3, sticky="nsew", padx=3, pady=5)
+        self.trend_period_var = tk.StringVar(value="Last 30 Days")
+        trend_period_menu = ttk.Combobox(trend_frame, textvariable=self.trend_period_var, state="readonly",
+                                         values=list(self.TREND_PERIODS), width=15)
+        trend_period_menu.pack(anchor="e", padx=3, pady=(3, 0))
+        trend_period_menu.bind("<<ComboboxSelected>>", lambda event: self.update_sales_chart())
+        self.sales_chart = SalesChart(trend_frame, on_resize=lambda width: self.update_sales_chart(), height=160)
+        self.sales_chart.pack(fill="both", expand=True, padx=3, pady=5)
+
     def update_stats(self):
         """Fetches stats from the service layer and updates the UI."""
         try:
             stats = get_dashboard_stats()
-            self.sales_label.config(text=f"{stats['total_sales_today']:.2f} LKR")
+            self.sales_label.config(text=stats['total_sales_today'].format())
+            self.expiry_labelframe.config(text=f"⚠ Items Nearing Expiry ({stats['near_expiry_days']} days)")
             self.expiry_label.config(text=f"{stats['near_expiry_items']} Items")
             self.stock_label.config(text=f"{stats['low_stock_items']} Items")
             self.update_tables()
+            self.update_sales_chart()
         except Exception as e:
             print(f"Error updating dashboard stats: {e}")
             # Optionally show an error message in the UI
@@ -192,7 +221,7 @@ class MainWindow(tk.Frame):
                     sale['sale_id'],
                     sale['sale_date'],
                     sale['customer_name'] or "N/A",
-                    f"{sale['total_amount']:.2f} LKR"
+                    Money(sale['total_amount_cents']).format()
                 ))
 
             # Populate Near Expiry Items
@@ -218,6 +247,18 @@ class MainWindow(tk.Frame):
             print(f"Error updating dashboard tables: {e}")
             messagebox.showerror("Error", "Could not update dashboard tables.")
 
+    def update_sales_chart(self):
+        """Redraws the sales trend for the chosen period at the chart's current width."""
+        days = self.TREND_PERIODS[self.trend_period_var.get()]
+        today = date.today()
+        start_date = today - timedelta(days=days - 1) if days else None
+        try:
+            series = timeseries.get_sales_series(start_date, today, max_points=self.sales_chart.plot_width())
+        except Exception as e:
+            print(f"Error updating sales trend: {e}")
+            return
+        self.sales_chart.set_series(series)
+
     def logout(self):
         """Calls the main app controller to handle logout."""
         self.app_controller.show_login_frame()
@@ -228,11 +269,15 @@ class MainWindow(tk.Frame):
             messagebox.showerror("Access Denied", "You do not have permission to access this feature.")
             return
 
-        if self.app_controller.current_frame:
-            self.app_controller.current_frame.destroy()
+        self.app_controller.show_view('users', "User Management", 'gui.user_management_view', 'UserManagementView')
+
+    def show_activity_log_view(self):
+        """Shows the activity log view."""
+        if self.user_info['role'] != 'Admin':
+            messagebox.showerror("Access Denied", "You do not have permission to access this feature.")
+            return
 
-        self.app_controller.current_frame = UserManagementView(self.parent, self.user_info, self.app_controller)
-        self.app_controller.current_frame.pack(fill=tk.BOTH, expand=True)
+        self.app_controller.show_view('activity_log', "Activity Log", 'gui.activity_log_view', 'ActivityLogView')
 
     def show_not_implemented(self):
         """Shows a 'Feature not implemented' message."""
@@ -1,15 +1,32 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import services
+import forecasting
+import threading
+import queue
 from gui.base_window import BaseWindow
 from .widgets.tooltip_button import TooltipButton
+from .widgets.customer_combobox import CustomerCombobox
+from .detailed_alert_view import DetailedAlertView
 
 class OrderView(tk.Frame):
+    # Number of orders whose details are fetched together when one is expanded.
+    DETAIL_PAGE_SIZE = 50
+    DATA_TABLES = ('orders', 'order_items', 'customers')
+
     def __init__(self, parent, user_info, app_controller):
         super().__init__(parent)
         self.user_info = user_info
         self.app_controller = app_controller
         self.all_orders = []
+        self.order_details = {} # order_id -> details, filled page by page
+        # Bumped whenever cached details are dropped, so prefetches started
+        # earlier do not put them back.
+        self._details_version = 0
+        self._details_reset_at = 0 # version at which all details were dropped
+        self._details_dropped_at = {} # order_id -> version at which its details were dropped
+        self.details_queue = queue.Queue()
+        self._search_job = None
         self.create_widgets()
         self.refresh_data()
         self.bind_shortcuts()
@@ -27,7 +44,7 @@ class OrderView(tk.Frame):
 
         header_frame = ttk.Frame(main_frame)
         header_frame.pack(fill=tk.X)
-        ttk.Label(header_frame, text="Customer Orders", font=("Arial", 16)).pack(side=tk.LEFT, pady=5)
+        ttk.Label(header_frame, text="Orders", font=("Arial", 16)).pack(side=tk.LEFT, pady=5)
 
         search_frame = ttk.Frame(main_frame)
         search_frame.pack(fill=tk.X, pady=5)
@@ -37,10 +54,12 @@ class OrderView(tk.Frame):
         search_entry.pack(fill=tk.X, expand=True)
         search_entry.bind("<KeyRelease>", self.filter_orders)
 
-        self.orders_tree = ttk.Treeview(main_frame, columns=("id", "customer", "date", "status"), show="headings")
-        self.orders_tree.heading("id", text="Order ID"); self.orders_tree.heading("customer", text="Customer Name"); self.orders_tree.heading("date", text="Order Date"); self.orders_tree.heading("status", text="Status")
+        self.orders_tree = ttk.Treeview(main_frame, columns=("id", "customer", "date", "status", "type"), show="tree headings")
+        self.orders_tree.heading("id", text="Order ID"); self.orders_tree.heading("customer", text="Customer Name"); self.orders_tree.heading("date", text="Order Date"); self.orders_tree.heading("status", text="Status"); self.orders_tree.heading("type", text="Type")
+        self.orders_tree.column("#0", width=30, stretch=False)
         self.orders_tree.column("id", width=80)
         self.orders_tree.pack(fill=tk.BOTH, expand=True)
+        self.orders_tree.bind("<<TreeviewOpen>>", self.on_order_open)
 
         new_order_button = TooltipButton(button_frame, text="New Order (Ctrl+N)", command=self.create_new_order)
         new_order_button.pack(side=tk.LEFT, padx=5)
@@ -50,8 +69,7 @@ class OrderView(tk.Frame):
 
         # Create a button for each status
         self.status_buttons = {}
-        statuses = ['Received', 'Ready to Pack', 'Ready to Distribute', 'Completed']
-        for i, status in enumerate(statuses):
+        for i, status in enumerate(services.ORDER_STATUSES):
             # The command uses a lambda with a default argument to capture the current status
             btn = TooltipButton(
                 status_button_frame,
@@ -60,65 +78,215 @@ class OrderView(tk.Frame):
             )
             btn.pack(side=tk.LEFT, padx=5)
             self.status_buttons[status] = btn
-            # Bind the shortcut to the main frame
-            self.bind_all(f"<Control-{i+1}>", lambda event, s=status: self._update_status(s))
+            # Bound application-wide, so only act while this view is on screen.
+            self.bind_all(f"<Control-{i+1}>", lambda event, s=status: self._on_status_shortcut(s))
+
 
+        receive_button = TooltipButton(button_frame, text="Receive into Stock", command=self.receive_selected_orders,
+                                       tooltip_text="Create batches from the selected completed purchase orders")
+        receive_button.pack(side=tk.LEFT, padx=5)
+
+        TooltipButton(button_frame, text="Pick List", command=self.show_pick_list,
+                      tooltip_text="Consolidated product quantities for the selected orders").pack(side=tk.LEFT, padx=5)
 
         if self.user_info['role'] in ['Viewer', 'Seller']:
             new_order_button.configure(state=tk.DISABLED)
+            receive_button.configure(state=tk.DISABLED)
             for btn in self.status_buttons.values():
                 btn.configure(state=tk.DISABLED)
 
         TooltipButton(button_frame, text="Back (Esc)", command=self.app_controller.show_main_dashboard).pack(side=tk.RIGHT, padx=5)
 
     def refresh_data(self):
-        self.all_orders = services.get_all_orders_with_customer_names()
-        self.filter_orders()
-
-    def filter_orders(self, event=None):
-        search_term = self.search_var.get().lower()
+        self._search_job = None
+        self.all_orders = services.get_all_orders_with_customer_names(search=self.search_var.get())
+        self.orders_by_id = {o['order_id']: o for o in self.all_orders}
+        self.order_details = {}
+        self._details_version += 1
+        self._details_reset_at = self._details_version
+        self._details_dropped_at = {}
 
         for i in self.orders_tree.get_children():
             self.orders_tree.delete(i)
 
         for o in self.all_orders:
-            customer_name = o['customer_name'].lower() if o['customer_name'] else ""
-            if search_term in customer_name:
-                display_name = o['customer_name'] if o['customer_name'] else "N/A"
-                self.orders_tree.insert("", tk.END, values=(o['order_id'], display_name, o['order_date'], o['status']))
+            display_name = o['customer_name'] if o['customer_name'] else "N/A"
+            self.orders_tree.insert("", tk.END, iid=o['order_id'], values=(o['order_id'], display_name, o['order_date'], o['status'], o['order_type']))
+            self._show_order_placeholder(o['order_id'])
 
-    def _update_status(self, new_status):
-        """Helper function to update the status of the selected order."""
-        selected_item = self.orders_tree.selection()
-        if not selected_item:
-            messagebox.showwarning("Selection Error", "Please select an order to update.")
+    def refresh_view(self):
+        self.refresh_data()
+
+    def filter_orders(self, event=None):
+        if self._search_job:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(300, self.refresh_data)
+
+    def _show_order_placeholder(self, order_id):
+        """Replaces an order's children with a placeholder so it can be expanded."""
+        self.orders_tree.delete(*self.orders_tree.get_children(order_id))
+        self.orders_tree.insert(order_id, tk.END, values=("", "Loading..."))
+
+    def on_order_open(self, event=None):
+        """Fills in the line items of an order when it is expanded."""
+        order_id = self.orders_tree.focus()
+        if not order_id or self.orders_tree.parent(order_id):
             return
+        order_id = int(order_id)
 
-        order_id = self.orders_tree.item(selected_item[0])['values'][0]
-        current_status = self.orders_tree.item(selected_item[0])['values'][3]
+        if order_id not in self.order_details:
+            # Fetch this order together with the ones listed after it.
+            visible = [int(iid) for iid in self.orders_tree.get_children()]
+            start = visible.index(order_id)
+            page = [i for i in visible[start:start + self.DETAIL_PAGE_SIZE] if i not in self.order_details]
+            try:
+                self.order_details.update(services.get_order_details(page))
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to load order details: {e}")
+                return
+            self._prefetch_order_details(visible[start + self.DETAIL_PAGE_SIZE:start + 2 * self.DETAIL_PAGE_SIZE])
+
+        self.orders_tree.delete(*self.orders_tree.get_children(order_id))
+        details = self.order_details.get(order_id)
+        if not details or not details['items']:
+            self.orders_tree.insert(order_id, tk.END, values=("", "No items"))
+            return
+        for item in details['items']:
+            self.orders_tree.insert(order_id, tk.END, values=(
+                "",
+                item['product_name'],
+                f"Qty: {item['quantity_ordered']}",
+                f"Allocated: {item['quantity_allocated']}"
+            ))
+
+    def _prefetch_order_details(self, order_ids):
+        """Loads the next page of order details in the background."""
+        order_ids = [i for i in order_ids if i not in self.order_details]
+        if not order_ids:
+            return
+        started_at = self._details_version
 
-        if new_status == current_status:
-            return # No change, do nothing
+        def worker():
+            try:
+                self.details_queue.put((started_at, services.get_order_details(order_ids)))
+            except Exception as e:
+                print(f"Error prefetching order details: {e}")
+                self.details_queue.put((started_at, {}))
+
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        self.after(100, self._check_details_queue)
 
+    def _check_details_queue(self):
+        """Stores prefetched details on the Tk thread, skipping any dropped since the fetch started."""
         try:
-            services.update_order_status(order_id, new_status)
-            # No success message to keep the workflow fast
-            self.refresh_data()
-            # Try to re-select the item
-            for item in self.orders_tree.get_children():
-                if self.orders_tree.item(item)['values'][0] == order_id:
-                    self.orders_tree.selection_set(item)
-                    self.orders_tree.focus(item)
-                    break
+            started_at, details = self.details_queue.get_nowait()
+        except queue.Empty:
+            self.after(100, self._check_details_queue)
+            return
+        if started_at < self._details_reset_at:
+            return
+        for order_id, order in details.items():
+            if self._details_dropped_at.get(order_id, 0) <= started_at:
+                self.order_details.setdefault(order_id, order)
+
+    def _selected_order_ids(self):
+        """Returns the ids of the selected orders; selected line items count as their order."""
+        order_ids = []
+        for item in self.orders_tree.selection():
+            order_id = int(self.orders_tree.parent(item) or item)
+            if order_id not in order_ids:
+                order_ids.append(order_id)
+        return order_ids
+
+    def _on_status_shortcut(self, new_status):
+        # The view stays alive while hidden and may outlive its binding.
+        if self.winfo_exists() and self.winfo_ismapped():
+            self._update_status(new_status)
+
+    def _update_status(self, new_status):
+        """Moves all selected orders to `new_status` in one operation."""
+        order_ids = self._selected_order_ids()
+        if not order_ids:
+            messagebox.showwarning("Selection Error", "Please select one or more orders to update.")
+            return
+
+        try:
+            result = services.update_order_statuses(order_ids, new_status)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to update status: {e}")
+            return
+
+        # Update the changed rows in place instead of reloading every order.
+        # No success message to keep the workflow fast.
+        self._details_version += 1
+        for order_id in result['updated']:
+            self.orders_by_id[order_id]['status'] = new_status
+            values = list(self.orders_tree.item(order_id)['values'])
+            values[3] = new_status
+            self.orders_tree.item(order_id, values=values)
+            # Allocations may have changed, so reload the lines on next expand.
+            self.order_details.pop(order_id, None)
+            self._details_dropped_at[order_id] = self._details_version
+            self.orders_tree.item(order_id, open=False)
+            self._show_order_placeholder(order_id)
+
+        if result['rejected']:
+            message = f"{len(result['rejected'])} order(s) were not updated:"
+            for order_id, reason in result['rejected'][:15]:
+                message += f"\nOrder {order_id}: {reason}"
+            messagebox.showwarning("Status Update", message)
+
+    def show_pick_list(self):
+        """Shows the consolidated pick list for the selected orders."""
+        order_ids = self._selected_order_ids()
+        if not order_ids:
+            messagebox.showwarning("Selection Error", "Please select one or more orders.")
+            return
+
+        items = services.get_pick_list(order_ids)
+        if not items:
+            messagebox.showinfo("Pick List", "The selected orders have no items.")
+            return
+
+        columns = {
+            'name': 'Product Name',
+            'category': 'Category',
+            'total_quantity': 'Total Quantity',
+            'order_count': 'Orders'
+        }
+        DetailedAlertView(self, f"Pick List ({len(order_ids)} orders)", items, columns)
+
+    def receive_selected_orders(self):
+        """Receives all selected completed orders into stock in one operation."""
+        order_ids = self._selected_order_ids()
+        if not order_ids:
+            messagebox.showwarning("Selection Error", "Please select one or more completed purchase orders to receive.")
+            return
+
+        if not messagebox.askyesno("Confirm Receipt", f"Create stock batches for {len(order_ids)} selected order(s)?"):
+            return
+
+        try:
+            result = services.receive_orders_into_stock(order_ids, self.user_info['user_id'])
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to receive orders: {e}")
+            return
+
+        message = f"Received {len(result['received'])} order(s) as {result['batches_created']} batch(es)."
+        if result['skipped']:
+            message += "\n\nSkipped:"
+            for order_id, reason in result['skipped'][:15]:
+                message += f"\nOrder {order_id}: {reason}"
+        messagebox.showinfo("Goods Received", message)
 
     def create_new_order(self):
         win = CreateOrderWindow(self)
         self.wait_window(win)
         if win.result:
             try:
-                services.create_order(win.result['customer_id'], win.result['items'])
+                services.create_order(win.result['customer_id'], win.result['items'], win.result['order_type'])
                 messagebox.showinfo("Success", "Order created successfully.")
                 self.refresh_data()
             except Exception as e:
@@ -128,28 +296,17 @@ class OrderView(tk.Frame):
 class CreateOrderWindow(BaseWindow):
     def __init__(self, parent):
         super().__init__(parent)
-        self.title("Create New Customer Order")
+        self.title("Create New Order")
         self.geometry("600x400")
         self.result = None
         self.cart = []
-        self.customers = [] # Initialize empty
-        self.products = services.get_all_products() # Get all products for ordering
+        self.products = [] # The products matching the current search
+        self._search_job = None
+        self.suggestion_queue = queue.Queue()
         self.create_widgets()
-        self.filter_products()
+        self._perform_product_filter()
         self.center_window()
 
-    def update_customer_list(self, select_customer_name=None):
-        """Refreshes the customer list in the combobox."""
-        self.customers = services.get_all_customers()
-        customer_names = [c['name'] for c in self.customers]
-        self.customer_menu['values'] = customer_names
-        if select_customer_name and select_customer_name in customer_names:
-            self.customer_var.set(select_customer_name)
-        elif customer_names:
-            self.customer_var.set(customer_names[0])
-        else:
-            self.customer_var.set("")
-
     def _add_new_customer(self):
         """Opens a dialog to add a new customer."""
         dialog = AddNewCustomerDialog(self)
@@ -160,8 +317,8 @@ class CreateOrderWindow(BaseWindow):
                 # Add customer via services
                 new_customer = services.add_customer(dialog.result['name'], dialog.result['phone'], dialog.result['address'])
                 messagebox.showinfo("Success", f"Customer '{new_customer['name']}' added successfully.", parent=self)
-                # Refresh the customer list and select the new one
-                self.update_customer_list(select_customer_name=new_customer['name'])
+                # Select the new customer
+                self.customer_menu.select_customer(new_customer)
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to add customer: {e}", parent=self)
 
@@ -174,13 +331,18 @@ class CreateOrderWindow(BaseWindow):
         # Customer selection
         ttk.Label(top_frame, text="Customer:").pack(side=tk.LEFT)
         self.customer_var = tk.StringVar()
-        self.customer_menu = ttk.Combobox(top_frame, textvariable=self.customer_var, state="readonly")
+        self.customer_menu = CustomerCombobox(top_frame, textvariable=self.customer_var, width=35)
         self.customer_menu.pack(side=tk.LEFT, padx=5)
         self.customer_menu.focus_set()
-        self.update_customer_list() # Populate the list initially
 
         TooltipButton(top_frame, text="New Customer...", command=self._add_new_customer).pack(side=tk.LEFT)
 
+        # Customer orders are filled from stock; purchase orders are received into it.
+        self.order_type_var = tk.StringVar(value=services.ORDER_TYPES[0])
+        ttk.Combobox(top_frame, textvariable=self.order_type_var, values=services.ORDER_TYPES,
+                     state="readonly", width=10).pack(side=tk.RIGHT)
+        ttk.Label(top_frame, text="Type:").pack(side=tk.RIGHT, padx=(10, 5))
+
         # Product selection and cart
         product_frame = ttk.LabelFrame(middle_frame, text="Add Products")
         product_frame.pack(side=tk.LEFT, fill=tk.Y, padx=5)
@@ -216,6 +378,9 @@ class CreateOrderWindow(BaseWindow):
         cart_buttons_frame.pack(fill=tk.X, pady=5)
         TooltipButton(cart_buttons_frame, text="Edit Qty (Ctrl+E)", command=self.edit_quantity).pack(side=tk.LEFT)
         TooltipButton(cart_buttons_frame, text="Remove (Del)", command=self.remove_from_cart).pack(side=tk.LEFT, padx=5)
+        self.suggest_button = TooltipButton(cart_buttons_frame, text="Load Suggestions", command=self.load_suggestions,
+                                            tooltip_text="Add the reorder quantities suggested by the demand forecast")
+        self.suggest_button.pack(side=tk.LEFT, padx=5)
 
         # Bottom buttons
         button_frame = ttk.Frame(self, padding=10)
@@ -238,10 +403,63 @@ class CreateOrderWindow(BaseWindow):
         self.cart.append({'product_id': product['product_id'], 'name': product['name'], 'quantity': quantity})
         self.update_cart_display()
 
+    def load_suggestions(self):
+        """Forecasts demand in the background and adds the suggested quantities to the order."""
+        self.suggest_button.config(state=tk.DISABLED)
+
+        def worker():
+            try:
+                self.suggestion_queue.put(("ok", forecasting.get_reorder_suggestions()))
+            except Exception as e:
+                self.suggestion_queue.put(("error", str(e)))
+
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        self.after(100, self._check_suggestion_queue)
+
+    def _check_suggestion_queue(self):
+        try:
+            status, data = self.suggestion_queue.get_nowait()
+        except queue.Empty:
+            self.after(100, self._check_suggestion_queue)
+            return
+        if not self.winfo_exists():
+            return
+        self.suggest_button.config(state=tk.NORMAL)
+
+        if status == "error":
+            messagebox.showerror("Error", f"Failed to forecast demand: {data}", parent=self)
+            return
+        if not data:
+            messagebox.showinfo("Suggestions", "Stock and open orders cover the forecast demand.", parent=self)
+            return
+
+        # Reorder suggestions are bought in, so they make a purchase order.
+        self.order_type_var.set('Purchase')
+        # Suggestions replace quantities already in the order for the same product.
+        in_cart = {item['product_id']: item for item in self.cart}
+        for suggestion in data:
+            item = in_cart.get(suggestion['product_id'])
+            if item:
+                item['quantity'] = suggestion['suggested_quantity']
+            else:
+                self.cart.append({
+                    'product_id': suggestion['product_id'], 'name': suggestion['name'],
+                    'quantity': suggestion['suggested_quantity'],
+                })
+        self.update_cart_display()
+
     def filter_products(self, event=None):
-        search_term = self.product_search_var.get().lower()
+        if self._search_job:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(300, self._perform_product_filter)
+
+    def _perform_product_filter(self):
+        self._search_job = None
+        self.products = services.get_all_products(search=self.product_search_var.get())
 
-        filtered_products = [p['name'] for p in self.products if search_term in p['name'].lower()]
+        filtered_products = [p['name'] for p in self.products]
         self.product_combobox['values'] = filtered_products
         if filtered_products:
             self.product_var.set(filtered_products[0])
@@ -280,19 +498,15 @@ class CreateOrderWindow(BaseWindow):
             self.update_cart_display()
 
     def on_save(self):
-        customer_name = self.customer_var.get()
-        if not customer_name:
-            messagebox.showerror("Validation Error", "Please select a customer.")
+        customer_id = self.customer_menu.get_customer_id()
+        if customer_id is None:
+            messagebox.showerror("Validation Error", "Please select a customer from the list.")
             return
         if not self.cart:
             messagebox.showerror("Validation Error", "Cannot create an empty order.")
             return
 
-        customer = next((c for c in self.customers if c['name'] == customer_name), None)
-        if not customer:
-            messagebox.showerror("Validation Error", "Selected customer not found. Please refresh.")
-            return
-        self.result = {'customer_id': customer['customer_id'], 'items': self.cart}
+        self.result = {'customer_id': customer_id, 'items': self.cart, 'order_type': self.order_type_var.get()}
         self.destroy()
 
 
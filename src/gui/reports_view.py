@@ -2,9 +2,15 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from tkcalendar import DateEntry
 import services
+import analytics
+import timeseries
+import report_cache
+from models import Money
 from .widgets.tooltip_button import TooltipButton
+from .widgets.sales_chart import SalesChart
 import threading
 import queue
+from datetime import date
 
 class ReportsView(tk.Frame):
     def __init__(self, parent, user_info, app_controller):
@@ -32,7 +38,7 @@ class ReportsView(tk.Frame):
 
         self.report_type_var = tk.StringVar()
         self.report_type_menu = ttk.Combobox(top_frame, textvariable=self.report_type_var, state="readonly", width=30)
-        self.report_type_menu['values'] = ["Sales Report", "Product Performance Report", "Inventory Report"]
+        self.report_type_menu['values'] = ["Sales Report", "Sales Trend", "Product Performance Report", "Product Analytics (ABC/XYZ)", "Inventory Report"]
         self.report_type_menu.pack(side=tk.LEFT)
         self.report_type_menu.bind("<<ComboboxSelected>>", self.on_report_type_change)
 
@@ -48,8 +54,12 @@ class ReportsView(tk.Frame):
 
         if report_type == "Sales Report":
             self.create_sales_report_view()
+        elif report_type == "Sales Trend":
+            self.create_sales_trend_view()
         elif report_type == "Product Performance Report":
             self.create_product_performance_report_view()
+        elif report_type == "Product Analytics (ABC/XYZ)":
+            self.create_product_analytics_view()
         elif report_type == "Inventory Report":
             self.create_inventory_report_view()
 
@@ -93,6 +103,7 @@ class ReportsView(tk.Frame):
         self.sales_tree.configure(yscrollcommand=vsb.set)
 
         self.sales_tree.pack(fill=tk.BOTH, expand=True)
+        self.sales_tree.tag_configure("subtotal", font=("Arial", 10, "bold"), background="#eef3fb")
 
         # --- Summary Frame ---
         summary_frame = ttk.LabelFrame(self.report_content_frame, text="Summary")
@@ -104,6 +115,9 @@ class ReportsView(tk.Frame):
         self.total_cogs_label = ttk.Label(summary_frame, text="Total COGS: 0.00 LKR", font=("Arial", 12, "bold"))
         self.total_cogs_label.pack(anchor="w", padx=10)
 
+        self.total_discount_label = ttk.Label(summary_frame, text="Total Discounts: 0.00 LKR", font=("Arial", 12, "bold"))
+        self.total_discount_label.pack(anchor="w", padx=10)
+
         self.gross_profit_label = ttk.Label(summary_frame, text="Gross Profit: 0.00 LKR", font=("Arial", 12, "bold"))
         self.gross_profit_label.pack(anchor="w", padx=10)
 
@@ -125,10 +139,12 @@ class ReportsView(tk.Frame):
         # Clear previous data
         for i in self.sales_tree.get_children():
             self.sales_tree.delete(i)
+        self.sales_report_day = None
 
         # Reset summary
         self.total_revenue_label.config(text="Total Revenue: 0.00 LKR")
         self.total_cogs_label.config(text="Total COGS: 0.00 LKR")
+        self.total_discount_label.config(text="Total Discounts: 0.00 LKR")
         self.gross_profit_label.config(text="Gross Profit: 0.00 LKR")
 
         thread = threading.Thread(target=self._fetch_sales_report_data, args=(start_date, end_date))
@@ -138,48 +154,172 @@ class ReportsView(tk.Frame):
         self.after(100, self._check_sales_queue)
 
     def _fetch_sales_report_data(self, start_date, end_date):
-        """Worker function to fetch data from the database."""
+        """
+        Worker function to fetch the sales report. Chunks are passed on as
+        they are read; a cached report is passed on in chunks of the same size.
+        """
+        streamed = False
+
+        def read_report():
+            nonlocal streamed
+            streamed = True
+            rows, totals = [], None
+            for chunk in services.stream_sales_report(start_date, end_date):
+                self.report_queue.put(("sales_chunk", chunk))
+                rows.extend(chunk['rows'])
+                totals = chunk['totals']
+            return {'rows': rows, 'totals': totals}
+
         try:
-            report_data = services.get_sales_report(start_date, end_date)
-            summary_data = services.get_sales_summary(start_date, end_date)
-            self.report_queue.put(("sales", (report_data, summary_data)))
+            report = report_cache.get_report(
+                'sales_report', (start_date, end_date), read_report,
+                tables=services.SALES_REPORT_TABLES, sales_period=(start_date, end_date),
+                persist=end_date < date.today()
+            )
+            if not streamed:
+                size = services.SALES_REPORT_CHUNK_SIZE
+                for offset in range(0, max(len(report['rows']), 1), size):
+                    self.report_queue.put(("sales_chunk", {'rows': report['rows'][offset:offset + size], 'totals': report['totals']}))
+            self.report_queue.put(("sales_done", None))
         except Exception as e:
             self.report_queue.put(("error", str(e)))
 
     def _check_sales_queue(self):
-        """Checks the queue for data and updates the UI."""
-        try:
-            message_type, data = self.report_queue.get_nowait()
+        """Shows the sales report as it arrives, a few chunks at a time so the window stays responsive."""
+        for _ in range(4):
+            try:
+                message_type, data = self.report_queue.get_nowait()
+            except queue.Empty:
+                break
 
             if message_type == "error":
                 messagebox.showerror("Error", f"Failed to generate report: {data}")
-            elif message_type == "sales":
-                report_data, summary_data = data
-                for row in report_data:
-                    customer_name = row['customer_name'] if row['customer_name'] else "Walk-in"
-                    self.sales_tree.insert("", "end", values=(
-                        row['sale_id'],
-                        row['sale_date'],
-                        row['username'],
-                        customer_name,
-                        f"{row['discount_applied']:.2f}",
-                        f"{row['total_amount']:.2f}"
-                    ))
-
-                total_revenue = summary_data.get('total_revenue', 0)
-                total_cogs = summary_data.get('total_cogs', 0)
-                gross_profit = total_revenue - total_cogs
-
-                self.total_revenue_label.config(text=f"Total Revenue: {total_revenue:.2f} LKR")
-                self.total_cogs_label.config(text=f"Total COGS: {total_cogs:.2f} LKR")
-                self.gross_profit_label.config(text=f"Gross Profit: {gross_profit:.2f} LKR")
+            elif message_type == "sales_chunk":
+                self._show_sales_chunk(data)
+                continue
 
             # Clean up
             self.sales_loading_label.config(text="")
             self.sales_generate_button.config(state=tk.NORMAL)
+            return
+
+        self.after(20, self._check_sales_queue)
+
+    def _show_sales_chunk(self, chunk):
+        """Adds a chunk of sales, with a subtotal line above each day, and updates the running totals."""
+        for row in chunk['rows']:
+            if row['day'] != self.sales_report_day:
+                self.sales_report_day = row['day']
+                self.sales_tree.insert("", "end", tags=("subtotal",), values=(
+                    "",
+                    row['day'],
+                    "Day total",
+                    f"{row['day_sale_count']} sales",
+                    Money(row['day_discount_cents']).format(currency=False),
+                    Money(row['day_amount_cents']).format(currency=False)
+                ))
+            customer_name = row['customer_name'] if row['customer_name'] else "Walk-in"
+            self.sales_tree.insert("", "end", values=(
+                row['sale_id'],
+                row['sale_date'],
+                row['username'],
+                customer_name,
+                Money(row['discount_applied_cents']).format(currency=False),
+                Money(row['total_amount_cents']).format(currency=False)
+            ))
+
+        totals = chunk['totals']
+        self.total_revenue_label.config(text=f"Total Revenue: {totals['total_revenue'].format()}")
+        self.total_cogs_label.config(text=f"Total COGS: {totals['total_cogs'].format()}")
+        self.total_discount_label.config(text=f"Total Discounts: {totals['total_discount'].format()}")
+        self.gross_profit_label.config(text=f"Gross Profit: {totals['gross_profit'].format()}")
+        self.sales_loading_label.config(text=f"Loading... {totals['sale_count']} sales so far")
+
+    def create_sales_trend_view(self):
+        """Creates the UI components for the Sales Trend chart."""
+        controls_frame = ttk.Frame(self.report_content_frame)
+        controls_frame.pack(fill=tk.X, pady=10)
+
+        ttk.Label(controls_frame, text="Start Date:").pack(side=tk.LEFT, padx=(0, 5))
+        self.trend_start_date_entry = DateEntry(controls_frame, width=12, background='darkblue', foreground='white', borderwidth=2)
+        self.trend_start_date_entry.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(controls_frame, text="End Date:").pack(side=tk.LEFT, padx=(10, 5))
+        self.trend_end_date_entry = DateEntry(controls_frame, width=12, background='darkblue', foreground='white', borderwidth=2)
+        self.trend_end_date_entry.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(controls_frame, text="Per:").pack(side=tk.LEFT, padx=(10, 5))
+        self.trend_granularity_var = tk.StringVar(value="Auto")
+        ttk.Combobox(controls_frame, textvariable=self.trend_granularity_var, state="readonly",
+                     values=["Auto", "Hour", "Day", "Week"], width=8).pack(side=tk.LEFT, padx=5)
+
+        self.trend_generate_button = TooltipButton(controls_frame, text="Generate Report", command=self.generate_sales_trend)
+        self.trend_generate_button.pack(side=tk.LEFT, padx=10)
+
+        # Regenerated for the new width when the window is resized.
+        self.sales_trend_chart = SalesChart(self.report_content_frame, on_resize=lambda width: self.generate_sales_trend(quiet=True))
+        self.sales_trend_chart.pack(fill=tk.BOTH, expand=True)
+
+        summary_frame = ttk.LabelFrame(self.report_content_frame, text="Summary")
+        summary_frame.pack(fill=tk.X, pady=10)
+        self.trend_summary_label = ttk.Label(summary_frame, text="", font=("Arial", 11))
+        self.trend_summary_label.pack(anchor="w", padx=10)
+
+        self.trend_loading_label = ttk.Label(self.report_content_frame, text="", font=("Arial", 10, "italic"))
+        self.trend_loading_label.pack(pady=5)
+
+    def generate_sales_trend(self, quiet=False):
+        """Initiates the sales trend in a background thread. `quiet` skips it if none was generated yet."""
+        if quiet and self.sales_trend_chart.series is None:
+            return
+        start_date = self.trend_start_date_entry.get_date()
+        end_date = self.trend_end_date_entry.get_date()
+
+        if not start_date or not end_date or start_date > end_date:
+            messagebox.showerror("Error", "Please select a valid date range.")
+            return
+
+        granularity = self.trend_granularity_var.get().lower()
+        self.trend_generate_button.config(state=tk.DISABLED)
+        self.trend_loading_label.config(text="Generating report, please wait...")
+
+        thread = threading.Thread(
+            target=self._fetch_sales_trend,
+            args=(start_date, end_date, self.sales_trend_chart.plot_width(), None if granularity == "auto" else granularity)
+        )
+        thread.daemon = True
+        thread.start()
+        self.after(100, self._check_trend_queue)
+
+    def _fetch_sales_trend(self, start_date, end_date, max_points, granularity):
+        """Worker function to build the sales series."""
+        try:
+            self.report_queue.put(("trend", timeseries.get_sales_series(start_date, end_date, max_points, granularity)))
+        except Exception as e:
+            self.report_queue.put(("error", str(e)))
+
+    def _check_trend_queue(self):
+        """Checks the queue for the sales series and draws it."""
+        try:
+            message_type, data = self.report_queue.get_nowait()
+
+            if message_type == "error":
+                messagebox.showerror("Error", f"Failed to generate report: {data}")
+            elif message_type == "trend":
+                self.sales_trend_chart.set_series(data)
+                per_point = data['buckets_per_point']
+                resolution = f"1 {data['granularity']}" if per_point == 1 else f"{per_point} {data['granularity']}s"
+                self.trend_summary_label.config(text=(
+                    f"Total Sales: {Money(int(data['total_cents'].sum())).format()}    "
+                    f"Number of Sales: {int(data['sale_count'].sum())}    "
+                    f"Each point: {resolution}"
+                ))
+
+            self.trend_loading_label.config(text="")
+            self.trend_generate_button.config(state=tk.NORMAL)
 
         except queue.Empty:
-            self.after(100, self._check_sales_queue)
+            self.after(100, self._check_trend_queue)
 
     def create_product_performance_report_view(self):
         """Creates the UI components for the Product Performance Report."""
@@ -244,7 +384,12 @@ class ReportsView(tk.Frame):
     def _fetch_product_performance_data(self, start_date, end_date):
         """Worker function to fetch product performance data."""
         try:
-            report_data = services.get_product_performance_report(start_date, end_date)
+            report_data = report_cache.get_report(
+                'product_performance', (start_date, end_date),
+                lambda: services.get_product_performance_report(start_date, end_date),
+                tables=services.PRODUCT_PERFORMANCE_TABLES, sales_period=(start_date, end_date),
+                persist=end_date < date.today()
+            )
             self.report_queue.put(("product", report_data))
         except Exception as e:
             self.report_queue.put(("error", str(e)))
@@ -263,7 +408,7 @@ class ReportsView(tk.Frame):
                         row['product_name'],
                         row['category'],
                         row['total_quantity_sold'],
-                        f"{row['total_revenue']:.2f}"
+                        Money(row['total_revenue_cents']).format(currency=False)
                     ))
 
             self.prod_loading_label.config(text="")
@@ -272,6 +417,115 @@ class ReportsView(tk.Frame):
         except queue.Empty:
             self.after(100, self._check_product_queue)
 
+    def create_product_analytics_view(self):
+        """Creates the UI components for the ABC/XYZ, margin and sell-through analytics."""
+        controls_frame = ttk.Frame(self.report_content_frame)
+        controls_frame.pack(fill=tk.X, pady=10)
+
+        ttk.Label(controls_frame, text="Start Date:").pack(side=tk.LEFT, padx=(0, 5))
+        self.analytics_start_date_entry = DateEntry(controls_frame, width=12, background='darkblue', foreground='white', borderwidth=2)
+        self.analytics_start_date_entry.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(controls_frame, text="End Date:").pack(side=tk.LEFT, padx=(10, 5))
+        self.analytics_end_date_entry = DateEntry(controls_frame, width=12, background='darkblue', foreground='white', borderwidth=2)
+        self.analytics_end_date_entry.pack(side=tk.LEFT, padx=5)
+
+        self.analytics_generate_button = TooltipButton(controls_frame, text="Generate Report", command=self.generate_product_analytics)
+        self.analytics_generate_button.pack(side=tk.LEFT, padx=10)
+
+        tree_frame = ttk.Frame(self.report_content_frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+
+        columns = (
+            ("name", "Product Name", 180), ("category", "Category", 90), ("abc", "ABC", 45), ("xyz", "XYZ", 45),
+            ("units", "Units Sold", 80), ("revenue", "Revenue (LKR)", 110), ("share", "Share %", 70),
+            ("margin", "Margin (LKR)", 110), ("margin_pct", "Margin %", 70), ("sell_through", "Sell-Through %", 100),
+        )
+        self.analytics_tree = ttk.Treeview(tree_frame, columns=[c[0] for c in columns], show="headings")
+        for column, heading, width in columns:
+            self.analytics_tree.heading(column, text=heading)
+            self.analytics_tree.column(column, width=width)
+
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.analytics_tree.yview)
+        vsb.pack(side='right', fill='y')
+        self.analytics_tree.configure(yscrollcommand=vsb.set)
+        self.analytics_tree.pack(fill=tk.BOTH, expand=True)
+
+        summary_frame = ttk.LabelFrame(self.report_content_frame, text="Summary")
+        summary_frame.pack(fill=tk.X, pady=10)
+        self.analytics_summary_label = ttk.Label(summary_frame, text="", font=("Arial", 11))
+        self.analytics_summary_label.pack(anchor="w", padx=10)
+
+        self.analytics_loading_label = ttk.Label(self.report_content_frame, text="", font=("Arial", 10, "italic"))
+        self.analytics_loading_label.pack(pady=5)
+
+    def generate_product_analytics(self):
+        """Initiates the product analytics in a background thread."""
+        start_date = self.analytics_start_date_entry.get_date()
+        end_date = self.analytics_end_date_entry.get_date()
+
+        if not start_date or not end_date or start_date > end_date:
+            messagebox.showerror("Error", "Please select a valid date range.")
+            return
+
+        self.analytics_generate_button.config(state=tk.DISABLED)
+        self.analytics_loading_label.config(text="Generating report, please wait...")
+        self.analytics_summary_label.config(text="")
+
+        for i in self.analytics_tree.get_children():
+            self.analytics_tree.delete(i)
+
+        thread = threading.Thread(target=self._fetch_product_analytics, args=(start_date, end_date))
+        thread.daemon = True
+        thread.start()
+        self.after(100, self._check_analytics_queue)
+
+    def _fetch_product_analytics(self, start_date, end_date):
+        """Worker function to compute the product analytics."""
+        try:
+            self.report_queue.put(("analytics", analytics.get_product_analytics(start_date, end_date)))
+        except Exception as e:
+            self.report_queue.put(("error", str(e)))
+
+    def _check_analytics_queue(self):
+        """Checks the queue for product analytics and updates the UI."""
+        try:
+            message_type, data = self.report_queue.get_nowait()
+
+            if message_type == "error":
+                messagebox.showerror("Error", f"Failed to generate report: {data}")
+            elif message_type == "analytics":
+                class_counts = {}
+                for row in data['products']:
+                    class_counts[row['abc'] + row['xyz']] = class_counts.get(row['abc'] + row['xyz'], 0) + 1
+                    self.analytics_tree.insert("", "end", values=(
+                        row['name'],
+                        row['category'],
+                        row['abc'],
+                        row['xyz'],
+                        row['units_sold'],
+                        Money(row['revenue_cents']).format(currency=False),
+                        f"{row['revenue_share']:.2f}",
+                        Money(row['margin_cents']).format(currency=False),
+                        "" if row['margin_percent'] is None else f"{row['margin_percent']:.1f}",
+                        f"{row['sell_through']:.1f}"
+                    ))
+
+                totals = data['totals']
+                classes = ", ".join(f"{name}: {count}" for name, count in sorted(class_counts.items()))
+                self.analytics_summary_label.config(text=(
+                    f"Revenue: {Money(totals['revenue_cents']).format()}    "
+                    f"Margin: {Money(totals['margin_cents']).format()}    "
+                    f"Units Sold: {totals['units_sold']}\n"
+                    f"Products per class: {classes}"
+                ))
+
+            self.analytics_loading_label.config(text="")
+            self.analytics_generate_button.config(state=tk.NORMAL)
+
+        except queue.Empty:
+            self.after(100, self._check_analytics_queue)
+
     def create_inventory_report_view(self):
         """Creates the UI components for the Inventory Report."""
         controls_frame = ttk.Frame(self.report_content_frame)
@@ -322,7 +576,11 @@ class ReportsView(tk.Frame):
     def _fetch_inventory_report_data(self):
         """Worker function to fetch inventory data."""
         try:
-            report_data = services.get_inventory_report()
+            # Stock changes with every sale, so it is not worth keeping between sessions.
+            report_data = report_cache.get_report(
+                'inventory', (), services.get_inventory_report,
+                tables=services.INVENTORY_REPORT_TABLES
+            )
             self.report_queue.put(("inventory", report_data))
         except Exception as e:
             self.report_queue.put(("error", str(e)))
@@ -341,7 +599,7 @@ class ReportsView(tk.Frame):
                         row['name'],
                         row['category'],
                         row['total_stock'],
-                        f"{row['total_cost_value']:.2f}"
+                        Money(row['total_cost_value_cents']).format(currency=False)
                     ))
 
             self.inv_loading_label.config(text="")
@@ -1,15 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import services
+from models import Money
 from .widgets.tooltip_button import TooltipButton
+from .widgets.customer_combobox import CustomerCombobox
 
 class SalesView(tk.Frame):
+    DATA_TABLES = ('products', 'batches', 'pricing_rules')
+
     def __init__(self, parent, user_info, app_controller):
         super().__init__(parent)
         self.user_info = user_info
         self.app_controller = app_controller
-        self.cart = [] # List of {'product_id':, 'name':, 'quantity':, 'price':}
-        self.customers = [] # To store full customer objects
+        self.cart = [] # List of {'product_id':, 'name':, 'quantity':}
+        self._search_job = None
 
         self.create_widgets()
         self.load_initial_data()
@@ -34,7 +38,7 @@ class SalesView(tk.Frame):
         # --- Top Frame: Customer Selection ---
         ttk.Label(top_frame, text="Customer:", font=("Arial", 12)).pack(side=tk.LEFT)
         self.customer_var = tk.StringVar()
-        self.customer_menu = ttk.Combobox(top_frame, textvariable=self.customer_var, state="readonly")
+        self.customer_menu = CustomerCombobox(top_frame, textvariable=self.customer_var, allow_walk_in=True, width=35)
         self.customer_menu.pack(side=tk.LEFT, padx=10)
 
         # --- Middle Frame: Products and Cart ---
@@ -97,42 +101,38 @@ class SalesView(tk.Frame):
         TooltipButton(bottom_frame, text="Back (Esc)", command=self.app_controller.show_main_dashboard).pack(side=tk.LEFT, padx=20)
 
     def load_initial_data(self):
-        # Load customers
-        self.customers = services.get_all_customers()
-        customer_names = ["Walk-in Customer"] + [c['name'] for c in self.customers]
-        self.customer_menu['values'] = customer_names
-        self.customer_menu.set("Walk-in Customer")
+        # Reset the customer selection
+        self.customer_menu.reset()
         # Load products
         self.refresh_products_list()
 
-    def load_initial_data(self):
-        # Load customers
-        self.customers = services.get_all_customers()
-        customer_names = ["Walk-in Customer"] + [c['name'] for c in self.customers]
-        self.customer_menu['values'] = customer_names
-        self.customer_menu.set("Walk-in Customer")
-        # Load products
-        self.all_products = []
+    def refresh_view(self):
         self.refresh_products_list()
 
-    def refresh_products_list(self):
-        self.all_products = services.get_products_for_sale()
-        self.filter_products()
-
     def filter_products(self, event=None):
-        search_term = self.product_search_var.get().lower()
+        if self._search_job:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(300, self.refresh_products_list)
+
+    def refresh_products_list(self):
+        self._search_job = None
+        products = services.get_products_for_sale(search=self.product_search_var.get())
 
         for i in self.products_tree.get_children():
             self.products_tree.delete(i)
 
-        for p in self.all_products:
-            if search_term in p['name'].lower():
-                self.products_tree.insert("", "end", values=(
-                    p['product_id'],
-                    p['name'],
-                    f"{p['selling_price']:.2f} LKR",
-                    p['total_stock']
-                ))
+        for p in products:
+            price = Money(p['price_cents'])
+            regular_price = Money(p['selling_price_cents'])
+            price_text = price.format()
+            if price < regular_price:
+                price_text += f" (was {regular_price.format(currency=False)})"
+            self.products_tree.insert("", "end", values=(
+                p['product_id'],
+                p['name'],
+                price_text,
+                p['total_stock']
+            ))
 
     def add_to_cart(self):
         selected_item = self.products_tree.selection()
@@ -141,9 +141,8 @@ class SalesView(tk.Frame):
             return
 
         item_values = self.products_tree.item(selected_item[0])['values']
-        # Unpack all values, ignoring the last one (stock)
-        product_id, name, price_str, _ = item_values
-        price = float(price_str.replace(" LKR", "").replace(",", ""))
+        # Unpack all values, ignoring the displayed price and stock
+        product_id, name, _, _ = item_values
 
         quantity = simpledialog.askinteger("Quantity", f"Enter quantity for {name}:", parent=self, minvalue=1)
         if not quantity:
@@ -155,7 +154,7 @@ class SalesView(tk.Frame):
                 item['quantity'] += quantity
                 break
         else: # If loop doesn't break, item is not in cart
-            self.cart.append({'product_id': product_id, 'name': name, 'quantity': quantity, 'price': price})
+            self.cart.append({'product_id': product_id, 'name': name, 'quantity': quantity})
 
         self.update_cart_display()
 
@@ -195,17 +194,21 @@ class SalesView(tk.Frame):
         for i in self.cart_tree.get_children():
             self.cart_tree.delete(i)
 
-        subtotal = 0
-        for item in self.cart:
-            item_total = item['quantity'] * item['price']
-            subtotal += item_total
-            self.cart_tree.insert("", "end", values=(item['product_id'], item['name'], item['quantity'], f"{item_total:.2f} LKR"))
+        # Priced by the same code as services.create_sale, including promotions
+        # and quantity breaks, so the total shown is the total charged.
+        try:
+            quote = services.quote_sale(self.cart, self.discount_var.get())
+        except ValueError as e:
+            for item in self.cart:
+                self.cart_tree.insert("", "end", values=(item['product_id'], item['name'], item['quantity'], ""))
+            self.total_label.config(text=str(e))
+            return
 
-        discount_percent = self.discount_var.get()
-        discount_amount = (subtotal * discount_percent) / 100
-        total = subtotal - discount_amount
+        for item in self.cart:
+            item_total = quote['items'][item['product_id']]
+            self.cart_tree.insert("", "end", values=(item['product_id'], item['name'], item['quantity'], item_total.format()))
 
-        self.total_label.config(text=f"Subtotal: {subtotal:.2f} LKR\nDiscount: {discount_amount:.2f} LKR\nTotal: {total:.2f} LKR")
+        self.total_label.config(text=f"Subtotal: {quote['subtotal']}\nDiscount: {quote['discount']}\nTotal: {quote['total']}")
 
     def finalize_sale(self):
         if not self.cart:
@@ -213,12 +216,10 @@ class SalesView(tk.Frame):
             return
 
         # Get customer ID
-        selected_customer_name = self.customer_var.get()
-        customer_id = None
-        if selected_customer_name != "Walk-in Customer":
-            customer = next((c for c in self.customers if c['name'] == selected_customer_name), None)
-            if customer:
-                customer_id = customer['customer_id']
+        if not self.customer_menu.is_valid_selection():
+            messagebox.showerror("Validation Error", "Please select a customer from the list.")
+            return
+        customer_id = self.customer_menu.get_customer_id()
 
         user_id = self.app_controller.current_user['user_id']
         discount = self.discount_var.get()
@@ -236,5 +237,5 @@ class SalesView(tk.Frame):
         self.cart = []
         self.update_cart_display()
         self.refresh_products_list()
-        self.customer_menu.set("Walk-in Customer")
+        self.customer_menu.reset()
         self.app_controller.show_main_dashboard() # Go back to dashboard
@@ -3,6 +3,8 @@ from tkinter import ttk, messagebox
 from services import get_all_users, create_user, update_user, delete_user, get_user_by_id
 
 class UserManagementView(ttk.Frame):
+    DATA_TABLES = ('users',)
+
     def __init__(self, parent, user_info, app_controller):
         super().__init__(parent)
         self.user_info = user_info
@@ -58,6 +60,9 @@ class UserManagementView(ttk.Frame):
     def back_to_dashboard(self):
         self.app_controller.show_main_dashboard()
 
+    def refresh_view(self):
+        self.load_users()
+
     def load_users(self):
         # Clear existing items
         for item in self.tree.get_children():
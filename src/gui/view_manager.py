@@ -0,0 +1,118 @@
+import tkinter as tk
+from tkinter import ttk
+from collections import OrderedDict
+import threading
+import queue
+import services
+
+# Views kept alive at once, and a rough budget for all of them together,
+# counted in widgets plus Treeview rows. Least recently shown views are
+# destroyed first when either is exceeded.
+MAX_CACHED_VIEWS = 6
+VIEW_CACHE_BUDGET = 50000
+
+class ViewManager:
+    """
+    Builds each view once per session and keeps it hidden between visits, so
+    switching back to a view is a pack() instead of a rebuild.
+
+    A view can declare the tables it shows in DATA_TABLES and a
+    refresh_view() method. Each time it is shown again, the data_versions of
+    those tables are read in a background thread; if any changed since the
+    view last loaded, refresh_view() is called. Views without DATA_TABLES are
+    shown exactly as they were left.
+    """
+    def __init__(self, container):
+        self.container = container
+        self.views = OrderedDict() # name -> view, least recently shown first
+        self.versions = {} # name -> data versions the view last loaded
+        self.current = None
+        self.version_queue = queue.Queue()
+
+    def show(self, name, factory):
+        """Shows the view `name`, building it with factory() on first use. Returns the view."""
+        self.hide_current()
+        view = self.views.get(name)
+        if view is None:
+            view = factory()
+            self.views[name] = view
+            self.versions[name] = None
+        else:
+            self.views.move_to_end(name)
+        view.pack(fill=tk.BOTH, expand=True)
+        self.current = name
+        self._check_versions(name, view)
+        self._evict()
+        return view
+
+    def hide_current(self):
+        if self.current in self.views:
+            self.views[self.current].pack_forget()
+        self.current = None
+
+    def is_cached(self, widget):
+        return any(view is widget for view in self.views.values())
+
+    def clear(self):
+        """Destroys every cached view, e.g. on logout, as views belong to the logged-in user."""
+        for view in self.views.values():
+            view.destroy()
+        self.views.clear()
+        self.versions.clear()
+        self.current = None
+
+    def _check_versions(self, name, view):
+        tables = getattr(view, 'DATA_TABLES', ())
+        if not tables:
+            return
+
+        def worker():
+            try:
+                self.version_queue.put((name, view, services.get_data_versions(tables)))
+            except Exception as e:
+                print(f"Could not check whether the {name} view is up to date: {e}")
+                self.version_queue.put(None)
+
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        self.container.after(100, self._check_version_queue)
+
+    def _check_version_queue(self):
+        try:
+            message = self.version_queue.get_nowait()
+        except queue.Empty:
+            self.container.after(100, self._check_version_queue)
+            return
+        if message is None:
+            return
+
+        name, view, versions = message
+        if self.views.get(name) is not view:
+            return # Evicted or rebuilt meanwhile.
+        if self.versions[name] is None:
+            # First check after building: the view has just loaded this data.
+            self.versions[name] = versions
+        elif versions != self.versions[name] and self.current == name:
+            view.refresh_view()
+            self.versions[name] = versions
+        # A stale view that is no longer shown is refreshed when next shown.
+
+    @staticmethod
+    def _estimate_cost(widget):
+        cost = 1
+        if isinstance(widget, ttk.Treeview):
+            cost += len(widget.get_children())
+        for child in widget.winfo_children():
+            cost += ViewManager._estimate_cost(child)
+        return cost
+
+    def _evict(self):
+        costs = {name: self._estimate_cost(view) for name, view in self.views.items()}
+        while len(self.views) > 1 and (len(self.views) > MAX_CACHED_VIEWS or sum(costs.values()) > VIEW_CACHE_BUDGET):
+            name = next(iter(self.views))
+            if name == self.current:
+                break
+            self.views.pop(name).destroy()
+            del self.versions[name]
+            del costs[name]
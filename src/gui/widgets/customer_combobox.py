@@ -0,0 +1,69 @@
+import tkinter as tk
+from tkinter import ttk
+import services
+
+class CustomerCombobox(ttk.Combobox):
+    """
+    A combobox for choosing a customer by typing part of their name, phone or
+    address. Matches are looked up with services.search_customers after a short
+    pause in typing, and the selection is tracked by customer id, so customers
+    with the same name can be told apart.
+    """
+    SEARCH_DELAY_MS = 250
+    WALK_IN_LABEL = "Walk-in Customer"
+
+    def __init__(self, parent, *args, allow_walk_in=False, limit=20, **kwargs):
+        self.var = kwargs.pop('textvariable', None) or tk.StringVar()
+        super().__init__(parent, *args, textvariable=self.var, **kwargs)
+        self.allow_walk_in = allow_walk_in
+        self.limit = limit
+        self.customer_ids = {} # label -> customer_id
+        self._search_job = None
+
+        self.bind("<KeyRelease>", self._on_key_release)
+        self.search("")
+
+    @staticmethod
+    def label_for(customer):
+        """Returns a display label that is unique per customer."""
+        details = customer.get('phone') or customer.get('address')
+        label = f"{customer['name']} - {details}" if details else customer['name']
+        return f"{label} (#{customer['customer_id']})"
+
+    def _on_key_release(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        if self._search_job:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(self.SEARCH_DELAY_MS, lambda: self.search(self.var.get()))
+
+    def search(self, text):
+        """Replaces the dropdown values with the customers matching `text`."""
+        self._search_job = None
+        if text in self.customer_ids or text == self.WALK_IN_LABEL:
+            return
+        customers = services.search_customers(text, self.limit)
+        self.customer_ids = {self.label_for(c): c['customer_id'] for c in customers}
+        labels = list(self.customer_ids)
+        if self.allow_walk_in:
+            labels.insert(0, self.WALK_IN_LABEL)
+        self['values'] = labels
+
+    def select_customer(self, customer):
+        """Selects `customer` (a dict with customer_id, name, phone, address)."""
+        label = self.label_for(customer)
+        self.customer_ids[label] = customer['customer_id']
+        self.var.set(label)
+
+    def reset(self):
+        """Clears the selection, falling back to the walk-in customer if allowed."""
+        self.var.set(self.WALK_IN_LABEL if self.allow_walk_in else "")
+        self.search("")
+
+    def get_customer_id(self):
+        """Returns the selected customer's id, or None for a walk-in or no valid selection."""
+        return self.customer_ids.get(self.var.get())
+
+    def is_valid_selection(self):
+        text = self.var.get()
+        return text in self.customer_ids or (self.allow_walk_in and text == self.WALK_IN_LABEL)
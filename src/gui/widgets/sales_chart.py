@@ -0,0 +1,97 @@
+import tkinter as tk
+import numpy as np
+from models import Money
+
+class SalesChart(tk.Canvas):
+    """
+    A line chart of a series from timeseries.get_sales_series.
+
+    The series should have at most plot_width() points, one per pixel column.
+    Each point is drawn from its lowest to its highest bucket, so a series
+    merged down to the chart's width still shows every peak; the whole line is
+    one canvas item, which keeps drawing fast whatever the period.
+
+    on_resize, if given, is called (debounced) with the new plot width, so the
+    owner can fetch a series for it.
+    """
+    MARGIN_LEFT = 80
+    MARGIN_RIGHT = 15
+    MARGIN_TOP = 15
+    MARGIN_BOTTOM = 25
+    LABEL_UNITS = {'hour': 'h', 'day': 'D', 'week': 'D'}
+
+    def __init__(self, parent, on_resize=None, height=220, **kwargs):
+        super().__init__(parent, height=height, background="white", highlightthickness=0, **kwargs)
+        self.on_resize = on_resize
+        self.series = None
+        self._resize_job = None
+        self._drawn_width = None
+        self.bind("<Configure>", self._on_configure)
+
+    def plot_width(self):
+        """Width of the plot area in pixels, i.e. the most points worth drawing."""
+        width = self.winfo_width()
+        if width <= 1:
+            width = int(self.cget("width"))
+        return max(1, width - self.MARGIN_LEFT - self.MARGIN_RIGHT)
+
+    def set_series(self, series):
+        self.series = series
+        self.draw()
+
+    def _on_configure(self, event):
+        if event.width == self._drawn_width:
+            return
+        self._drawn_width = event.width
+        self.draw()
+        if self.on_resize:
+            if self._resize_job:
+                self.after_cancel(self._resize_job)
+            self._resize_job = self.after(200, self._fire_resize)
+
+    def _fire_resize(self):
+        self._resize_job = None
+        self.on_resize(self.plot_width())
+
+    def draw(self):
+        self.delete("all")
+        width, height = self.winfo_width(), self.winfo_height()
+        if width <= 1:
+            width, height = int(self.cget("width")), int(self.cget("height"))
+        left, right = self.MARGIN_LEFT, width - self.MARGIN_RIGHT
+        top, bottom = self.MARGIN_TOP, height - self.MARGIN_BOTTOM
+        self.create_line(left, top, left, bottom, right, bottom, fill="gray")
+
+        series = self.series
+        if series is None or not len(series['starts']):
+            return
+        high = series['high_cents']
+        peak = int(high.max())
+        if peak <= 0:
+            self.create_text((left + right) / 2, (top + bottom) / 2, text="No sales in this period", fill="gray")
+        peak = max(peak, 1)
+
+        self.create_text(left - 5, top, text=Money(peak).format(currency=False), anchor="e", fill="gray")
+        self.create_text(left - 5, bottom, text="0.00", anchor="e", fill="gray")
+
+        points = len(series['starts'])
+        x = left + np.arange(points) * ((right - left) / max(points - 1, 1))
+        scale = (bottom - top) / peak
+        # Per point: down to its lowest bucket, then up to its highest.
+        coords = np.empty((points, 4))
+        coords[:, 0] = x
+        coords[:, 1] = bottom - series['low_cents'] * scale
+        coords[:, 2] = x
+        coords[:, 3] = bottom - high * scale
+        flat = coords.ravel().tolist()
+        if points == 1:
+            flat = [left, flat[3], right, flat[3]]
+        self.create_line(*flat, fill="#1f77b4", width=1)
+
+        unit = self.LABEL_UNITS[series['granularity']]
+        labels = ((0, "nw"), (points // 2, "n"), (points - 1, "ne")) if points > 2 else ((0, "nw"),)
+        for index, anchor in labels:
+            label = np.datetime_as_string(series['starts'][index], unit=unit).replace('T', ' ')
+            if unit == 'h':
+                label += ":00"
+            self.create_text(x[index], bottom + 5, text=label, anchor=anchor, fill="gray")
@@ -1,25 +1,69 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+import argparse
+import importlib
+from contextlib import contextmanager
 import tkinter as tk
 from tkinter import ttk, messagebox
-import time
-from database import initialize_database
-from ttkthemes import ThemedTk
+from database import initialize_database, benchmark_connection_open
+import alerts
+import recovery
+import scheduler
 from gui.login_window import LoginFrame
-from gui.main_window import MainWindow
-from gui.inventory_view import InventoryView
-from gui.sales_view import SalesView
-from gui.order_view import OrderView
-from gui.reports_view import ReportsView
-from gui.help_window import HelpWindow
-
-class App(ThemedTk):
-    def __init__(self):
+from gui.view_manager import ViewManager
+# Views, and the libraries only they need (tkcalendar, ttkthemes), are
+# imported on first use so that the login screen appears sooner.
+IMPORT_FINISHED = time.perf_counter()
+
+class StartupProfiler:
+    """
+    Records how long each startup step takes, for --profile-startup.
+    The startup steps are printed together once the login screen is up;
+    steps recorded after that, such as a view's first import, as they happen.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.steps = []
+        self.reported = False
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        if self.reported:
+            print(f"[profile] {name}: {seconds * 1000:.1f} ms")
+        else:
+            self.steps.append((name, seconds))
+
+    @contextmanager
+    def step(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start_time)
+
+    def report(self):
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        print("Startup profile:")
+        for name, seconds in self.steps:
+            print(f"  {name:<30} {seconds * 1000:8.1f} ms")
+        total = sum(seconds for _, seconds in self.steps)
+        print(f"  {'total':<30} {total * 1000:8.1f} ms")
+
+class App(tk.Tk):
+    def __init__(self, job_scheduler=None, profiler=None):
         super().__init__()
+        self.job_scheduler = job_scheduler
+        self.profiler = profiler or StartupProfiler()
         self.title("Inventory and Sales Management System")
         self.minsize(400, 300)
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
         self.current_user = None
         self.current_frame = None
+        self.view_manager = ViewManager(self)
 
         self.configure_styles()
         self.show_login_frame()
@@ -58,7 +102,7 @@ class App(ThemedTk):
             if alpha > 0.0:
                 self.after(10, animate)
             else:
-                if self.current_frame:
+                if self.current_frame and not self.view_manager.is_cached(self.current_frame):
                     self.current_frame.destroy()
                 switch_function()
                 self.fade_in_window(self)
@@ -74,20 +118,18 @@ class App(ThemedTk):
         self.bind("<Control-h>", lambda event: self.show_help_window())
 
     def show_help_window(self):
+        from gui.help_window import HelpWindow
         HelpWindow(self)
 
     def handle_new_item_shortcut(self):
         # This is a bit of a hack, as we don't know which "new" action to take.
         # A more robust solution would be a proper menu bar.
-        # For now, we'll check the type of the current frame.
-        from gui.inventory_view import InventoryView
-        from gui.order_view import OrderView
-
-        if isinstance(self.current_frame, InventoryView):
+        # For now, we'll check which view is showing.
+        if self.view_manager.current == 'inventory':
             # In inventory view, "new" could mean new product or new batch.
             # We'll default to new product.
             self.current_frame.add_product()
-        elif isinstance(self.current_frame, OrderView):
+        elif self.view_manager.current == 'orders':
             self.current_frame.create_new_order()
 
     def center_window(self, width, height):
@@ -101,6 +143,9 @@ class App(ThemedTk):
     def show_login_frame(self):
         """Shows the login frame in the main window."""
         def _switch():
+            # Cached views belong to the user logging out.
+            self.view_manager.clear()
+            self.current_user = None
             self.title("User Login")
             self.center_window(400, 300)
             self.current_frame = LoginFrame(self, on_success=self.on_login_success)
@@ -113,64 +158,136 @@ class App(ThemedTk):
         self.current_user = user_info
         self.show_main_dashboard()
 
+    def show_view(self, name, title, module_name, class_name):
+        """
+        Shows a view through the view manager, which imports and builds it on
+        first use and afterwards shows the same instance again.
+        """
+        if self.current_user is None:
+            return
+
+        def build():
+            with self.profiler.step(f"import {module_name}"):
+                view_class = getattr(importlib.import_module(module_name), class_name)
+            with self.profiler.step(f"build {name} view"):
+                return view_class(self, self.current_user, app_controller=self)
+
+        self.title(title)
+        self.current_frame = self.view_manager.show(name, build)
+
     def show_main_dashboard(self):
         """Shows the main dashboard view."""
-        def _switch():
-            self.title("Main Dashboard")
-            self.center_window(1200, 600)
-            self.current_frame = MainWindow(self, self.current_user, app_controller=self)
-            self.current_frame.pack(fill=tk.BOTH, expand=True)
-            self.current_frame.update_stats()
-        self.fade_out_and_switch(_switch)
+        if self.view_manager.current is None:
+            # Coming from the login screen, which is resized and faded out.
+            def _switch():
+                self.center_window(1200, 600)
+                self.show_view('dashboard', "Main Dashboard", 'gui.main_window', 'MainWindow')
+            self.fade_out_and_switch(_switch)
+        else:
+            self.show_view('dashboard', "Main Dashboard", 'gui.main_window', 'MainWindow')
 
     def show_inventory_view(self):
         """Shows the inventory management view."""
-        def _switch():
-            self.title("Inventory Management")
-            self.current_frame = InventoryView(self, self.current_user, app_controller=self)
-            self.current_frame.pack(fill=tk.BOTH, expand=True)
-        self.fade_out_and_switch(_switch)
+        self.show_view('inventory', "Inventory Management", 'gui.inventory_view', 'InventoryView')
 
     def show_sales_view(self):
         """Shows the sales view."""
-        def _switch():
-            self.title("New Sale")
-            self.current_frame = SalesView(self, self.current_user, app_controller=self)
-            self.current_frame.pack(fill=tk.BOTH, expand=True)
-        self.fade_out_and_switch(_switch)
+        self.show_view('sales', "New Sale", 'gui.sales_view', 'SalesView')
 
     def show_order_view(self):
         """Shows the order management view."""
-        def _switch():
-            self.title("Order Management")
-            self.current_frame = OrderView(self, self.current_user, app_controller=self)
-            self.current_frame.pack(fill=tk.BOTH, expand=True)
-        self.fade_out_and_switch(_switch)
+        self.show_view('orders', "Order Management", 'gui.order_view', 'OrderView')
 
     def show_reports_view(self):
         """Shows the reports view."""
-        def _switch():
-            self.title("Reports")
-            self.current_frame = ReportsView(self, self.current_user, app_controller=self)
-            self.current_frame.pack(fill=tk.BOTH, expand=True)
-        self.fade_out_and_switch(_switch)
+        self.show_view('reports', "Reports", 'gui.reports_view', 'ReportsView')
 
     def change_theme(self, theme_name):
         """Changes the application's theme."""
         try:
-            self.set_theme(theme_name)
+            # ttkthemes is only loaded when a theme is actually chosen.
+            from ttkthemes import ThemedStyle
+            ThemedStyle(self).set_theme(theme_name)
             print(f"Theme changed to {theme_name}")
         except Exception as e:
             print(f"Could not set theme {theme_name}: {e}")
 
     def on_closing(self):
         if messagebox.askokcancel("Quit", "Do you want to quit?"):
+            if self.job_scheduler:
+                # Jobs already running (e.g. a backup) are allowed to finish.
+                self.job_scheduler.shutdown(wait=True)
             self.destroy()
 
+    def report_startup_check(self, check_result, quick_check_thread):
+        """Tells the user about any recovery done at startup and the quick check outcome."""
+        if check_result['status'] == 'restored':
+            messagebox.showwarning(
+                "Database Restored",
+                "The database could not be opened and was moved to:\n"
+                f"{check_result['quarantined']}\n\n"
+                f"It was restored from the backup:\n{check_result['restored_from']}"
+            )
+        elif check_result['status'] == 'recreated':
+            messagebox.showwarning(
+                "Database Recreated",
+                "The database could not be opened and no usable backup was found.\n"
+                f"The old file was kept at:\n{check_result['quarantined']}\n\n"
+                "A new, empty database has been created."
+            )
+
+        def poll_quick_check():
+            if quick_check_thread.is_alive():
+                self.after(1000, poll_quick_check)
+            elif recovery.last_quick_check_result != 'ok':
+                messagebox.showwarning(
+                    "Database Check",
+                    f"The database integrity check reported a problem:\n{recovery.last_quick_check_result}\n\n"
+                    "Please restore from a backup."
+                )
+        self.after(1000, poll_quick_check)
+
 def main():
     """Main function to run the application."""
-    initialize_database()
-    app = App()
+    parser = argparse.ArgumentParser(description="Inventory and Sales Management System")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print how long each startup step takes")
+    parser.add_argument('--benchmark-cipher', action='store_true',
+                        help="print how long opening a connection takes with each key setting, then exit")
+    parser.add_argument('--archive-closed-years', action='store_true',
+                        help="move the sales of closed years to the yearly archives once a day")
+    args = parser.parse_args()
+    if args.benchmark_cipher:
+        for label, seconds in benchmark_connection_open():
+            print(f"{label:<34} {seconds * 1000:8.2f} ms per connection")
+        return
+    profiler = StartupProfiler(enabled=args.profile_startup)
+    profiler.record("import modules", IMPORT_FINISHED - IMPORT_STARTED)
+
+    try:
+        with profiler.step("database check"):
+            check_result = recovery.check_database_on_startup()
+    except (recovery.DatabaseUnavailableError, recovery.DatabaseRecoveryError) as e:
+        print(f"ERROR: {e}")
+        root = tk.Tk()
+        root.withdraw()
+        messagebox.showerror("Database Error", str(e))
+        root.destroy()
+        return
+
+    with profiler.step("schema check"):
+        initialize_database()
+    with profiler.step("expiry alerts"):
+        alerts.roll_forward_expiry_alerts()
+    quick_check_thread = recovery.start_background_quick_check()
+    with profiler.step("start scheduler"):
+        job_scheduler = scheduler.create_default_scheduler(archive_closed_years=args.archive_closed_years)
+        job_scheduler.start()
+    with profiler.step("create login window"):
+        app = App(job_scheduler, profiler)
+        app.update_idletasks()
+    profiler.report()
+    app.report_startup_check(check_result, quick_check_thread)
     app.mainloop()
 
 if __name__ == "__main__":
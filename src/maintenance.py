@@ -0,0 +1,154 @@
+"""
+Maintenance Layer: Query-planner statistics and free-space upkeep.
+
+Three things keep the database fast as it grows:
+- Every connection runs PRAGMA optimize when it closes (see
+  database.OptimizingConnection), which refreshes statistics the planner
+  found missing or stale.
+- run_maintenance runs a full ANALYZE on a schedule. analysis_limit bounds
+  the rows it reads per index, so it takes about the same time however large
+  the tables get. The resulting sqlite_stat1 rows let the planner tell a
+  selective index from one that matches most of a table.
+- The database uses auto_vacuum=INCREMENTAL, so pages freed by deletes and
+  archiving sit on the freelist until incremental_vacuum returns them to the
+  file system, a bounded number at a time.
+
+Each run records a storage report before and after, so it is possible to see
+what maintenance did.
+"""
+import time
+from datetime import datetime
+from database import get_db_connection, ANALYSIS_LIMIT
+
+# Freelist pages tolerated before an incremental vacuum is worth running.
+VACUUM_MIN_FREE_PAGES = 256
+# Pages released per run; bounds how long the write lock is held.
+VACUUM_MAX_PAGES = 20000
+
+# The report of the most recent run_maintenance, for display by the UI or scheduler.
+last_maintenance_report = None
+
+def _has_dbstat(conn):
+    try:
+        conn.execute("SELECT 1 FROM dbstat LIMIT 1").fetchall()
+        return True
+    except Exception:
+        return False
+
+def get_storage_report():
+    """
+    Describes how the database file is used.
+
+    Returns a dict:
+        {'page_size':, 'page_count':, 'freelist_count':, 'file_bytes':,
+         'free_percent': share of the file that is free pages,
+         'exact': True if per-object page counts come from dbstat,
+         'objects': [{'name':, 'table':, 'pages':, 'unused_bytes':, 'fragmentation':, 'rows':}, ...]}
+
+    Per-object pages, unused bytes and fragmentation (the share of each
+    object's pages that is unused space) need the dbstat virtual table. On
+    builds without it they are None and only row counts, taken from the
+    ANALYZE statistics, are reported.
+    """
+    conn = get_db_connection()
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+        rows = {}
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            # The first number of each stat is the (estimated) row count.
+            for stat in conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1"):
+                count = int(stat['stat'].split()[0])
+                rows[stat['idx'] or stat['tbl']] = count
+                rows.setdefault(stat['tbl'], count)
+
+        objects = []
+        exact = _has_dbstat(conn)
+        if exact:
+            stats = conn.execute("""
+                SELECT s.name, m.tbl_name, count(*) AS pages, sum(s.unused) AS unused_bytes
+                FROM dbstat s
+                LEFT JOIN sqlite_master m ON m.name = s.name
+                GROUP BY s.name
+                ORDER BY pages DESC
+            """).fetchall()
+            for stat in stats:
+                objects.append({
+                    'name': stat['name'], 'table': stat['tbl_name'] or stat['name'],
+                    'pages': stat['pages'], 'unused_bytes': stat['unused_bytes'],
+                    'fragmentation': stat['unused_bytes'] / (stat['pages'] * page_size),
+                    'rows': rows.get(stat['name']),
+                })
+        else:
+            for obj in conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index') ORDER BY name"):
+                objects.append({
+                    'name': obj['name'], 'table': obj['tbl_name'],
+                    'pages': None, 'unused_bytes': None, 'fragmentation': None,
+                    'rows': rows.get(obj['name']),
+                })
+    finally:
+        conn.close()
+
+    return {
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+        'file_bytes': page_size * page_count,
+        'free_percent': 100.0 * freelist_count / page_count if page_count else 0.0,
+        'exact': exact,
+        'objects': objects,
+    }
+
+def analyze_database(limit=ANALYSIS_LIMIT):
+    """Refreshes the planner statistics of every table and index. Returns the seconds taken."""
+    conn = get_db_connection()
+    try:
+        start_time = time.perf_counter()
+        conn.execute(f"PRAGMA analysis_limit = {int(limit)}")
+        conn.execute("ANALYZE")
+        conn.commit()
+        return time.perf_counter() - start_time
+    finally:
+        conn.close()
+
+def incremental_vacuum(max_pages=VACUUM_MAX_PAGES, min_free_pages=VACUUM_MIN_FREE_PAGES):
+    """
+    Returns up to `max_pages` free pages to the file system, if at least
+    `min_free_pages` are free. Returns the number of pages released.
+    """
+    conn = get_db_connection()
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if before < min_free_pages:
+            return 0
+        # The pragma frees one page per step, so it must be read to the end.
+        conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+        conn.commit()
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        conn.close()
+
+def run_maintenance():
+    """
+    Runs ANALYZE and an incremental vacuum, then records what changed in
+    last_maintenance_report and returns it:
+        {'started':, 'analyze_seconds':, 'vacuum_seconds':, 'pages_released':,
+         'before': storage report, 'after': storage report}
+    Run by the scheduler, the report is kept as the job's last_result.
+    """
+    global last_maintenance_report
+    report = {'started': datetime.now(), 'before': get_storage_report()}
+
+    report['analyze_seconds'] = analyze_database()
+
+    start_time = time.perf_counter()
+    report['pages_released'] = incremental_vacuum()
+    report['vacuum_seconds'] = time.perf_counter() - start_time
+
+    report['after'] = get_storage_report()
+    last_maintenance_report = report
+    return report
@@ -1,6 +1,92 @@
 """
 Domain Layer: Contains the core business entities of the application.
 """
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import total_ordering
+
+CURRENCY = "LKR"
+
+@total_ordering
+class Money:
+    """
+    An amount of money held as an integer number of cents, so that sums are
+    exact. The database stores the same integers in its *_cents columns.
+
+    Money(1250) is 12.50; use Money.parse("12.50") for amounts in rupees.
+    """
+    __slots__ = ('cents',)
+
+    def __init__(self, cents=0):
+        if isinstance(cents, Money):
+            cents = cents.cents
+        self.cents = int(cents)
+
+    @classmethod
+    def parse(cls, value):
+        """Reads an amount in rupees, e.g. "1,250.50", "12.5 LKR", 12.5 or Decimal("12.50")."""
+        if isinstance(value, Money):
+            return value
+        text = str(value).replace(CURRENCY, "").replace(",", "").strip()
+        try:
+            amount = Decimal(text)
+        except InvalidOperation:
+            raise ValueError(f"'{value}' is not a valid amount.")
+        if not amount.is_finite():
+            raise ValueError(f"'{value}' is not a valid amount.")
+        return cls(int((amount * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)))
+
+    def percent(self, percentage):
+        """Returns `percentage` percent of this amount, rounded half up to the cent."""
+        cents = (Decimal(self.cents) * Decimal(str(percentage)) / 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        return Money(int(cents))
+
+    def to_decimal(self):
+        return Decimal(self.cents).scaleb(-2)
+
+    def __add__(self, other):
+        return Money(self.cents + other.cents) if isinstance(other, Money) else NotImplemented
+
+    def __radd__(self, other):
+        # Lets sum() start from 0.
+        return Money(self.cents) if other == 0 else NotImplemented
+
+    def __sub__(self, other):
+        return Money(self.cents - other.cents) if isinstance(other, Money) else NotImplemented
+
+    def __mul__(self, quantity):
+        return Money(self.cents * quantity) if isinstance(quantity, int) else NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __eq__(self, other):
+        return isinstance(other, Money) and self.cents == other.cents
+
+    def __lt__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents < other.cents
+
+    def __hash__(self):
+        return hash(self.cents)
+
+    def format(self, currency=True):
+        """Returns e.g. "1250.50 LKR", or "1250.50" without the currency."""
+        sign = "-" if self.cents < 0 else ""
+        whole, fraction = divmod(abs(self.cents), 100)
+        text = f"{sign}{whole}.{fraction:02d}"
+        return f"{text} {CURRENCY}" if currency else text
+
+    def __str__(self):
+        return self.format()
+
+    def __repr__(self):
+        return f"<Money {self.format(currency=False)}>"
 
 class User:
     def __init__(self, user_id, username, password_hash, role, is_active=True):
@@ -31,8 +117,8 @@ class Batch:
         self.quantity = quantity
         self.manufacture_date = manufacture_date
         self.expiry_date = expiry_date
-        self.cost_price = cost_price
-        self.selling_price = selling_price
+        self.cost_price = Money(cost_price)
+        self.selling_price = Money(selling_price)
 
     def __repr__(self):
         return f"<Batch No: {self.batch_number} (Qty: {self.quantity})>"
@@ -52,8 +138,8 @@ class Sale:
         self.user_id = user_id
         self.customer_id = customer_id
         self.sale_date = sale_date
-        self.total_amount = total_amount
-        self.discount_applied = discount_applied
+        self.total_amount = Money(total_amount)
+        self.discount_applied = Money(discount_applied)
 
 class SaleItem:
     def __init__(self, sale_item_id, sale_id, batch_id, quantity_sold, price_per_unit):
@@ -61,7 +147,7 @@ class SaleItem:
         self.sale_id = sale_id
         self.batch_id = batch_id
         self.quantity_sold = quantity_sold
-        self.price_per_unit = price_per_unit
+        self.price_per_unit = Money(price_per_unit)
 
 class Order:
     def __init__(self, order_id, customer_id, order_date, status):
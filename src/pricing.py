@@ -0,0 +1,181 @@
+"""
+Pricing Layer: Promotional prices for near-expiry and bulk sales.
+
+A pricing rule marks a batch's selling price down by a percentage. A rule can
+be limited to a product category, to batches expiring within a number of
+days, and to sale lines of at least a minimum quantity (a quantity break).
+Where several rules apply, the lowest price wins; markdowns do not stack.
+
+Prices are evaluated for all batches at once by a single INSERT ... SELECT
+over batches x pricing_rules, and the result is kept in batch_prices (see
+database._create_pricing_tables). The cache holds until the day changes or a
+rule is added, changed or removed; then refresh_prices reprices every batch.
+Batches added or edited in between are queued by triggers and priced on
+their own.
+
+Quantity breaks depend on the sale, not the batch, so batch_prices keeps one
+row per quantity tier and get_unit_price picks the best tier at sale time.
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from database import get_db_connection, read_data_versions
+from models import Money
+
+# Selects (batch_id, min_quantity, price_cents, rule_id) for the batches
+# matching {target}, in one scan of batches: every batch is paired with each
+# rule that applies to it and with a "regular price" rule of no markdown, and
+# the lowest price per quantity tier is kept. Markdowns are rounded half up to
+# the cent, as Money.percent does.
+PRICE_SELECT_SQL = """
+    WITH rules AS MATERIALIZED (
+        SELECT NULL AS rule_id, NULL AS category, 1 AS min_quantity, 0 AS markdown_basis_points, NULL AS expires_by
+        UNION ALL
+        SELECT rule_id, category, min_quantity, markdown_basis_points,
+               date(:today, '+' || max_days_to_expiry || ' days')
+        FROM pricing_rules WHERE is_active
+    )
+    SELECT b.batch_id, r.min_quantity,
+           MIN(b.selling_price_cents - (b.selling_price_cents * r.markdown_basis_points + 5000) / 10000) AS price_cents,
+           r.rule_id
+    FROM batches b
+    CROSS JOIN products p ON p.product_id = b.product_id
+    CROSS JOIN rules r
+    WHERE b.quantity > 0 AND {target}
+      AND (r.category IS NULL OR r.category = p.category)
+      AND (r.expires_by IS NULL OR b.expiry_date <= r.expires_by)
+    GROUP BY b.batch_id, r.min_quantity
+"""
+
+def refresh_prices(today=None, conn=None):
+    """
+    Brings batch_prices up to date for `today` (default: today). Cheap when
+    nothing changed, so it is called before every price lookup. With `conn`,
+    runs inside the caller's transaction and does not commit, so a sale can
+    price and record itself in one transaction.
+
+    Returns a dict: {'prices': number of batch price tiers written, 'full':
+    True if every batch was repriced}
+    """
+    today = (today or date.today()).strftime('%Y-%m-%d')
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        cursor = conn.cursor()
+        state = cursor.execute("SELECT priced_on, rules_version FROM price_cache_state WHERE id = 1").fetchone()
+        rules_version = read_data_versions(cursor, ('pricing_rules',)).get('pricing_rules', 0)
+        if state['priced_on'] == today and state['rules_version'] == rules_version:
+            if cursor.execute("SELECT 1 FROM batch_price_queue LIMIT 1").fetchone() is None:
+                return {'prices': 0, 'full': False}
+            cursor.execute("DELETE FROM batch_prices WHERE batch_id IN (SELECT batch_id FROM batch_price_queue)")
+            cursor.execute(
+                "INSERT INTO batch_prices (batch_id, min_quantity, price_cents, rule_id) "
+                + PRICE_SELECT_SQL.format(target="b.batch_id IN (SELECT batch_id FROM batch_price_queue)"),
+                {'today': today}
+            )
+            prices, full = cursor.rowcount, False
+        else:
+            cursor.execute("DELETE FROM batch_prices")
+            cursor.execute(
+                "INSERT INTO batch_prices (batch_id, min_quantity, price_cents, rule_id) "
+                + PRICE_SELECT_SQL.format(target="1"),
+                {'today': today}
+            )
+            prices, full = cursor.rowcount, True
+            cursor.execute(
+                "UPDATE price_cache_state SET priced_on = ?, rules_version = ? WHERE id = 1",
+                (today, rules_version)
+            )
+        cursor.execute("DELETE FROM batch_price_queue")
+        if own_conn:
+            conn.commit()
+        return {'prices': prices, 'full': full}
+    except Exception:
+        if own_conn:
+            conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+def get_unit_price(conn, batch_id, quantity):
+    """
+    Returns (Money, rule_id) for one unit from `batch_id` on a sale line of
+    `quantity` units. rule_id is None when the regular price applies.
+    Call refresh_prices first.
+    """
+    # With MIN(), SQLite returns rule_id from the row holding the minimum.
+    row = conn.execute(
+        "SELECT MIN(price_cents), rule_id FROM batch_prices WHERE batch_id = ? AND min_quantity <= ?",
+        (batch_id, quantity)
+    ).fetchone()
+    if row[0] is None:
+        raise ValueError(f"Batch {batch_id} has no price.")
+    return Money(row[0]), row[1]
+
+def _basis_points(percent_off):
+    try:
+        basis_points = Decimal(str(percent_off)) * 100
+    except InvalidOperation:
+        raise ValueError(f"Invalid markdown percentage: {percent_off!r}")
+    if basis_points != basis_points.to_integral_value() or not 0 < basis_points <= 10000:
+        raise ValueError("A markdown must be between 0.01% and 100%, in steps of 0.01%.")
+    return int(basis_points)
+
+def get_pricing_rules():
+    """Returns all pricing rules, each with its markdown as 'percent_off' (Decimal)."""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute("""
+            SELECT rule_id, name, category, max_days_to_expiry, min_quantity, markdown_basis_points, is_active
+            FROM pricing_rules ORDER BY rule_id
+        """).fetchall()
+    finally:
+        conn.close()
+    rules = []
+    for row in rows:
+        rule = dict(row)
+        rule['percent_off'] = Decimal(rule.pop('markdown_basis_points')) / 100
+        rules.append(rule)
+    return rules
+
+def add_pricing_rule(name, percent_off, category=None, max_days_to_expiry=None, min_quantity=1):
+    """
+    Adds a rule marking prices down by `percent_off` percent for batches of
+    `category` (None: any) expiring within `max_days_to_expiry` days (None:
+    any expiry), on sale lines of at least `min_quantity` units. Returns the rule ID.
+    """
+    if not name:
+        raise ValueError("A pricing rule needs a name.")
+    if max_days_to_expiry is not None and int(max_days_to_expiry) < 0:
+        raise ValueError("Days to expiry cannot be negative.")
+    if int(min_quantity) < 1:
+        raise ValueError("The minimum quantity must be at least 1.")
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute("""
+            INSERT INTO pricing_rules (name, category, max_days_to_expiry, min_quantity, markdown_basis_points)
+            VALUES (?, ?, ?, ?, ?)
+        """, (name, category or None,
+              None if max_days_to_expiry is None else int(max_days_to_expiry),
+              int(min_quantity), _basis_points(percent_off)))
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+def set_pricing_rule_active(rule_id, active):
+    """Switches a rule on or off without deleting it."""
+    conn = get_db_connection()
+    try:
+        conn.execute("UPDATE pricing_rules SET is_active = ? WHERE rule_id = ?", (1 if active else 0, rule_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def delete_pricing_rule(rule_id):
+    conn = get_db_connection()
+    try:
+        conn.execute("DELETE FROM pricing_rules WHERE rule_id = ?", (rule_id,))
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,183 @@
+"""
+Startup integrity checks and recovery for the main database.
+
+The database is checked once when the application starts instead of on every
+connection. A file that cannot be opened with the current key, or that fails
+its integrity check, is never deleted: it is moved to the quarantine folder
+and the newest backup that passes verification is restored in its place.
+Only backups encrypted with the database key are restored automatically;
+those re-keyed to a separate backup key need that key, which the application
+does not keep (see backup.py).
+Transient conditions such as a locked or busy file are reported, and the file
+is left untouched.
+"""
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from sqlcipher3 import dbapi2 as sqlite3
+from database import DB_FILE, PROJECT_ROOT, LEGACY_CIPHER_SETTINGS, open_encrypted_connection, rekey_database
+import archive
+import backup
+
+QUARANTINE_DIR = os.path.join(PROJECT_ROOT, "quarantine")
+LOCK_RETRIES = 3
+LOCK_RETRY_DELAY = 1.0  # seconds
+
+# Result of the most recent background quick check: None while it is running,
+# then 'ok' or the first problem reported by SQLite.
+last_quick_check_result = None
+
+class DatabaseUnavailableError(Exception):
+    """The database is locked or busy. The file is fine; try again later."""
+
+class DatabaseRecoveryError(Exception):
+    """The database is unreadable and could not be restored from a backup."""
+
+def _is_transient(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+def _probe_database(path, settings=None):
+    """
+    Opens the database with its key and reads the schema.
+    Raises DatabaseUnavailableError for transient lock errors and lets other
+    sqlite3.DatabaseError exceptions (wrong key, corruption) propagate.
+    """
+    for attempt in range(LOCK_RETRIES):
+        try:
+            conn = open_encrypted_connection(path, settings=settings)
+            try:
+                conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+                return
+            finally:
+                conn.close()
+        except sqlite3.OperationalError as e:
+            if not _is_transient(e):
+                raise
+            if attempt == LOCK_RETRIES - 1:
+                raise DatabaseUnavailableError(f"The database is in use by another process: {e}") from e
+            time.sleep(LOCK_RETRY_DELAY)
+
+def _probe_or_convert(path):
+    """
+    Probes a database file like _probe_database. A file that does not open
+    with the current cipher settings but does with LEGACY_CIPHER_SETTINGS is
+    re-encrypted to the current ones. Returns True if it was converted.
+    """
+    try:
+        _probe_database(path)
+        return False
+    except sqlite3.DatabaseError as e:
+        try:
+            _probe_database(path, LEGACY_CIPHER_SETTINGS)
+        except sqlite3.DatabaseError:
+            raise e
+    print(f"Converting {os.path.basename(path)} to the current encryption settings...")
+    rekey_database(path, LEGACY_CIPHER_SETTINGS)
+    return True
+
+def convert_archives():
+    """
+    Brings every archive database to the current cipher settings and schema.
+    Unreadable archives are reported and skipped.
+    """
+    for year in archive.get_archived_years():
+        try:
+            _probe_or_convert(archive.get_archive_path(year))
+            archive.upgrade_archive(year)
+        except sqlite3.DatabaseError as e:
+            print(f"WARNING: Archive for {year} could not be opened: {e}")
+
+def quarantine_database():
+    """
+    Moves the database file and its WAL/shared-memory files to the
+    quarantine folder. Returns the quarantined database path.
+    """
+    os.makedirs(QUARANTINE_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime(backup.BACKUP_TIMESTAMP_FORMAT)
+    target = os.path.join(QUARANTINE_DIR, f"inventory-{timestamp}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(DB_FILE + suffix):
+            shutil.move(DB_FILE + suffix, target + suffix)
+    return target
+
+def restore_latest_backup():
+    """
+    Copies the newest backup under the database key that passes verification
+    into place. Returns the restored backup path, or None if no usable backup
+    exists.
+    """
+    for path in backup.list_backups():
+        if backup.uses_backup_key(path):
+            continue
+        if backup.verify_backup(path):
+            shutil.copy2(path, DB_FILE)
+            return path
+    return None
+
+def check_database_on_startup():
+    """
+    Verifies once, at startup, that the database opens with the current key.
+
+    Returns a dict: {'status': 'ok' | 'new' | 'restored' | 'recreated',
+                     'quarantined': path or None, 'restored_from': path or None}
+    'recreated' means no usable backup was found and an empty database will be
+    initialized; the quarantined file is kept for manual recovery.
+
+    Raises DatabaseUnavailableError if the file stays locked.
+    """
+    result = {'status': 'ok', 'quarantined': None, 'restored_from': None}
+    if not os.path.exists(DB_FILE):
+        result['status'] = 'new'
+        return result
+
+    try:
+        _probe_or_convert(DB_FILE)
+        convert_archives()
+        return result
+    except DatabaseUnavailableError:
+        raise
+    except sqlite3.DatabaseError as e:
+        print(f"WARNING: Database could not be opened ({e}). Moving it to quarantine.")
+
+    result['quarantined'] = quarantine_database()
+    restored_from = restore_latest_backup()
+    if restored_from:
+        try:
+            _probe_or_convert(DB_FILE)
+        except sqlite3.DatabaseError as e:
+            raise DatabaseRecoveryError(f"Restored backup {restored_from} could not be opened: {e}") from e
+        convert_archives()
+        result['status'] = 'restored'
+        result['restored_from'] = restored_from
+    else:
+        result['status'] = 'recreated'
+    return result
+
+def start_background_quick_check():
+    """
+    Runs `PRAGMA quick_check` on its own connection in a background thread.
+    The outcome is stored in `last_quick_check_result`. Returns the thread.
+    """
+    global last_quick_check_result
+    last_quick_check_result = None
+
+    def _run():
+        global last_quick_check_result
+        try:
+            conn = open_encrypted_connection(DB_FILE)
+            try:
+                rows = conn.execute("PRAGMA quick_check").fetchall()
+            finally:
+                conn.close()
+            last_quick_check_result = rows[0][0] if rows else 'ok'
+        except sqlite3.Error as e:
+            last_quick_check_result = str(e)
+        if last_quick_check_result != 'ok':
+            print(f"WARNING: Database quick check reported a problem: {last_quick_check_result}")
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    return thread
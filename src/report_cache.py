@@ -0,0 +1,146 @@
+"""
+Report Cache Layer: Generated reports kept until their data changes.
+
+A report is cached under its type and parameters, together with a stamp of
+the data it was made from:
+
+- the data_versions counters of the tables it reads, and
+- for reports over a period, the newest change to the hourly sales buckets
+  inside that period (see database._create_sales_series_tables). Sales made
+  today then leave last month's report valid, while a report that includes
+  today is made again after the next sale.
+
+A cached report is only returned while its stamp still matches. Reports are
+held in memory, least recently used dropped first, within REPORT_CACHE_SIZE
+entries and REPORT_CACHE_MAX_BYTES. Those made with persist=True are also
+written to the report_cache table, so the next session, or another user on
+the same database, gets an unchanged report without running it again. Only
+reports over data that is done changing are worth that, such as periods that
+ended before today, so persist is off by default.
+"""
+import json
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal
+from database import get_db_connection, read_data_versions
+from models import Money
+
+REPORT_CACHE_SIZE = 32
+REPORT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Total size of the reports kept in the database between sessions.
+REPORT_CACHE_DISK_MAX_BYTES = 64 * 1024 * 1024
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict() # cache_key -> (stamp, report, size_bytes)
+_cache_bytes = 0
+
+def _to_json(value):
+    if isinstance(value, Money):
+        return {'__money__': value.cents}
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    raise TypeError(f"Cannot cache a {type(value).__name__} in a report.")
+
+def _from_json(obj):
+    if '__money__' in obj:
+        return Money(obj['__money__'])
+    if '__decimal__' in obj:
+        return Decimal(obj['__decimal__'])
+    return obj
+
+def _sales_period_stamp(conn, start_date, end_date):
+    """The newest change to the sales buckets from start_date to end_date, 0 if none."""
+    return conn.execute(
+        "SELECT IFNULL(MAX(seq), 0) FROM sales_hourly WHERE hour >= ? AND hour < ?",
+        (f"{start_date} 00", f"{end_date + timedelta(days=1)} 00")
+    ).fetchone()[0]
+
+def _read_stamp(conn, tables, sales_period):
+    stamp = {'tables': read_data_versions(conn, tables)}
+    if sales_period is not None:
+        stamp['sales'] = _sales_period_stamp(conn, *sales_period)
+    return json.dumps(stamp, sort_keys=True)
+
+def _remember(key, stamp, report, size):
+    """Adds a report to the in-memory cache (under _cache_lock)."""
+    global _cache_bytes
+    if size > REPORT_CACHE_MAX_BYTES:
+        return
+    if key in _cache:
+        _cache_bytes -= _cache.pop(key)[2]
+    _cache[key] = (stamp, report, size)
+    _cache_bytes += size
+    while len(_cache) > REPORT_CACHE_SIZE or _cache_bytes > REPORT_CACHE_MAX_BYTES:
+        _cache_bytes -= _cache.popitem(last=False)[1][2]
+
+def _load_persisted(conn, key, stamp):
+    row = conn.execute("SELECT stamp, payload FROM report_cache WHERE cache_key = ?", (key,)).fetchone()
+    if row is None or row['stamp'] != stamp:
+        return None
+    conn.execute("UPDATE report_cache SET last_used_at = CURRENT_TIMESTAMP WHERE cache_key = ?", (key,))
+    conn.commit()
+    return row['payload']
+
+def _persist(key, stamp, payload):
+    """Stores a report in the database, then drops the least recently used beyond the size limit."""
+    conn = get_db_connection()
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO report_cache (cache_key, stamp, payload, size_bytes)
+            VALUES (?, ?, ?, ?)
+        """, (key, stamp, payload, len(payload)))
+        conn.execute("""
+            DELETE FROM report_cache WHERE cache_key IN (
+                SELECT cache_key FROM (
+                    SELECT cache_key,
+                           SUM(size_bytes) OVER (ORDER BY last_used_at DESC, rowid DESC) AS kept_bytes
+                    FROM report_cache
+                ) WHERE kept_bytes > ?
+            )
+        """, (REPORT_CACHE_DISK_MAX_BYTES,))
+        conn.commit()
+    except Exception as e:
+        print(f"Could not store cached report: {e}")
+    finally:
+        conn.close()
+
+def get_report(report_type, params, compute, tables=(), sales_period=None, persist=False):
+    """
+    Returns the report `report_type` for `params` (a tuple of values with a
+    stable str(), e.g. dates), calling compute() only if no cached copy
+    matches the current data.
+
+    tables are the data_versions counters the report depends on;
+    sales_period, a (start_date, end_date) pair, also makes it depend on the
+    sales in that period. With persist, the report is kept between sessions.
+    The report must be made of JSON types, Money and Decimal, and is shared
+    between callers, so it must not be modified.
+    """
+    key = json.dumps([report_type, [str(param) for param in params]])
+    conn = get_db_connection()
+    try:
+        stamp = _read_stamp(conn, tables, sales_period)
+        with _cache_lock:
+            cached = _cache.get(key)
+            if cached and cached[0] == stamp:
+                _cache.move_to_end(key)
+                return cached[1]
+        payload = _load_persisted(conn, key, stamp) if persist else None
+    finally:
+        conn.close()
+
+    if payload is not None:
+        report = json.loads(payload, object_hook=_from_json)
+    else:
+        report = compute()
+        try:
+            payload = json.dumps(report, default=_to_json, separators=(',', ':'))
+        except (TypeError, ValueError) as e:
+            print(f"Report '{report_type}' is not cached: {e}")
+            return report
+        if persist:
+            _persist(key, stamp, payload)
+    with _cache_lock:
+        _remember(key, stamp, report, len(payload))
+    return report
@@ -0,0 +1,274 @@
+"""
+Scheduler Layer: Runs background maintenance jobs inside the app process.
+
+Jobs run on a small worker pool, off the Tk thread. Each job has a trigger:
+an IntervalTrigger ("every 24 hours") or a CronTrigger ("at 00:05 every
+day"). A job that is still running when it comes due again is skipped, not
+queued, and a random jitter spreads out jobs that share a schedule.
+
+The last run of every job is stored in the scheduled_jobs table, so
+interval jobs keep their rhythm across restarts: a daily backup taken this
+morning is not taken again just because the app was reopened.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from database import get_db_connection, checkpoint_wal
+import alerts
+import archive
+import backup
+import maintenance
+import pricing
+
+SCHEDULER_WORKERS = 2
+# Interval jobs that have never run start this long after the app.
+FIRST_RUN_DELAY = timedelta(minutes=1)
+
+class IntervalTrigger:
+    """Fires every `interval`, counted from the end of the previous run."""
+    def __init__(self, jitter=0, **interval):
+        self.interval = timedelta(**interval)
+        self.jitter = jitter
+
+    def next_fire_time(self, now, last_run=None):
+        if last_run is None:
+            due = now + FIRST_RUN_DELAY
+        else:
+            due = max(now, last_run + self.interval)
+        return due + timedelta(seconds=random.uniform(0, self.jitter))
+
+class CronTrigger:
+    """
+    Fires at the minutes matching cron-style fields. Each field is '*', a
+    number, a comma-separated list or a step such as '*/15'. day_of_week
+    counts from 0 = Sunday, as in cron. As in cron, when both day and
+    day_of_week are restricted (neither starts with '*'), a day matching
+    either one fires.
+    """
+    FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('day_of_week', 0, 6))
+
+    def __init__(self, minute='*', hour='*', day='*', month='*', day_of_week='*', jitter=0):
+        spec = {'minute': minute, 'hour': hour, 'day': day, 'month': month, 'day_of_week': day_of_week}
+        self.allowed = {
+            name: self._parse(str(spec[name]), low, high) for name, low, high in self.FIELDS
+        }
+        self.either_day = not str(day).startswith('*') and not str(day_of_week).startswith('*')
+        self.jitter = jitter
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(','):
+            if part == '*':
+                values.update(range(low, high + 1))
+            elif part.startswith('*/'):
+                values.update(range(low, high + 1, int(part[2:])))
+            else:
+                value = int(part)
+                if not low <= value <= high:
+                    raise ValueError(f"Cron value {value} is outside {low}-{high}.")
+                values.add(value)
+        return values
+
+    def _matches(self, moment):
+        day = moment.day in self.allowed['day']
+        day_of_week = (moment.weekday() + 1) % 7 in self.allowed['day_of_week']
+        return (
+            moment.minute in self.allowed['minute']
+            and moment.hour in self.allowed['hour']
+            and moment.month in self.allowed['month']
+            and ((day or day_of_week) if self.either_day else (day and day_of_week))
+        )
+
+    def next_fire_time(self, now, last_run=None):
+        moment = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Scan minute by minute; every schedule matches within about a year.
+        for _ in range(366 * 24 * 60):
+            if self._matches(moment):
+                return moment + timedelta(seconds=random.uniform(0, self.jitter))
+            moment += timedelta(minutes=1)
+        raise ValueError("Cron trigger never fires.")
+
+class Job:
+    def __init__(self, name, func, trigger):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.next_run = None
+        self.running = False
+        self.metrics = {
+            'runs': 0, 'failures': 0, 'skipped': 0,
+            'last_started': None, 'last_finished': None, 'last_status': None, 'last_error': None,
+            'last_result': None, 'last_duration': None, 'max_duration': 0.0, 'total_duration': 0.0,
+        }
+
+class JobScheduler:
+    """
+    Runs registered jobs on a thread pool until shut down.
+
+    Usage:
+        scheduler = JobScheduler()
+        scheduler.add_job('backup', backup.create_backup, IntervalTrigger(hours=24))
+        scheduler.start()
+        ...
+        scheduler.shutdown()
+    """
+    def __init__(self, max_workers=SCHEDULER_WORKERS):
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._thread = None
+
+    def add_job(self, name, func, trigger):
+        """Registers a job. Jobs can be added before or after start()."""
+        with self._lock:
+            self.jobs[name] = Job(name, func, trigger)
+            if self._thread:
+                self._schedule(self.jobs[name], self._load_last_runs().get(name))
+        self._wakeup.set()
+
+    def start(self):
+        """
+        Starts the dispatch thread, which first schedules every job from its
+        persisted last run; reading those is left to it to keep startup fast.
+        """
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, wait=True):
+        """Stops dispatching jobs. Pending runs are dropped; running jobs finish if `wait`."""
+        self._stopping = True
+        self._wakeup.set()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def run_now(self, name):
+        """Runs a job as soon as possible, unless it is already running."""
+        with self._lock:
+            self.jobs[name].next_run = datetime.now()
+        self._wakeup.set()
+
+    def get_metrics(self):
+        """Returns a list of per-job metric dicts, including the next planned run."""
+        with self._lock:
+            return [
+                dict(job.metrics, name=job.name, next_run=job.next_run, running=job.running)
+                for job in self.jobs.values()
+            ]
+
+    def _schedule(self, job, last_run):
+        job.next_run = job.trigger.next_fire_time(datetime.now(), last_run)
+
+    def _run(self):
+        last_runs = self._load_last_runs()
+        with self._lock:
+            for job in self.jobs.values():
+                if job.next_run is None:
+                    self._schedule(job, last_runs.get(job.name))
+        while not self._stopping:
+            # Cleared before scanning, so a wakeup during the scan is not lost.
+            self._wakeup.clear()
+            now = datetime.now()
+            with self._lock:
+                for job in self.jobs.values():
+                    if job.next_run is None or job.next_run > now:
+                        continue
+                    if job.running:
+                        job.metrics['skipped'] += 1
+                        self._schedule(job, now)
+                        continue
+                    job.running = True
+                    try:
+                        self._executor.submit(self._execute, job)
+                    except RuntimeError:
+                        # The executor is shutting down.
+                        job.running = False
+                        return
+                    # Interval jobs are rescheduled when the run ends.
+                    job.next_run = None if isinstance(job.trigger, IntervalTrigger) else job.trigger.next_fire_time(now)
+                pending = [job.next_run for job in self.jobs.values() if job.next_run]
+            timeout = (min(pending) - datetime.now()).total_seconds() if pending else None
+            self._wakeup.wait(timeout=max(timeout, 0) if timeout is not None else None)
+
+    def _execute(self, job):
+        started = datetime.now()
+        start_time = time.perf_counter()
+        status, error, result = 'ok', None, None
+        try:
+            result = job.func()
+        except Exception as e:
+            status, error = 'failed', str(e)
+            print(f"Scheduled job '{job.name}' failed: {e}")
+        duration = time.perf_counter() - start_time
+        finished = datetime.now()
+
+        with self._lock:
+            job.running = False
+            metrics = job.metrics
+            metrics['runs'] += 1
+            if status != 'ok':
+                metrics['failures'] += 1
+            metrics.update(last_started=started, last_finished=finished, last_status=status,
+                           last_error=error, last_result=result, last_duration=duration)
+            metrics['max_duration'] = max(metrics['max_duration'], duration)
+            metrics['total_duration'] += duration
+            # Interval jobs count from the end of this run.
+            if isinstance(job.trigger, IntervalTrigger):
+                job.next_run = job.trigger.next_fire_time(finished, finished)
+        self._save_run(job.name, started, finished, status, error, duration)
+        self._wakeup.set()
+
+    def _load_last_runs(self):
+        conn = get_db_connection()
+        try:
+            rows = conn.execute("SELECT name, last_finished_at FROM scheduled_jobs").fetchall()
+        finally:
+            conn.close()
+        return {
+            row['name']: datetime.fromisoformat(row['last_finished_at'])
+            for row in rows if row['last_finished_at']
+        }
+
+    def _save_run(self, name, started, finished, status, error, duration):
+        conn = get_db_connection()
+        try:
+            conn.execute("""
+                INSERT INTO scheduled_jobs
+                    (name, last_started_at, last_finished_at, last_status, last_error, last_duration,
+                     run_count, failure_count)
+                VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    last_started_at = excluded.last_started_at,
+                    last_finished_at = excluded.last_finished_at,
+                    last_status = excluded.last_status,
+                    last_error = excluded.last_error,
+                    last_duration = excluded.last_duration,
+                    run_count = run_count + 1,
+                    failure_count = failure_count + excluded.failure_count
+            """, (name, started.isoformat(sep=' '), finished.isoformat(sep=' '), status, error,
+                  duration, 0 if status == 'ok' else 1))
+            conn.commit()
+        except Exception as e:
+            print(f"Could not record run of scheduled job '{name}': {e}")
+        finally:
+            conn.close()
+
+def create_default_scheduler(archive_closed_years=False):
+    """
+    Returns a scheduler with the application's standard maintenance jobs.
+    Archiving moves sales out of the main database, so its daily job is only
+    added with archive_closed_years.
+    """
+    scheduler = JobScheduler()
+    scheduler.add_job('expiry_alerts', alerts.roll_forward_expiry_alerts, CronTrigger(minute=5, hour=0, jitter=60))
+    # Reprices near-expiry stock for the new day before the first sale does.
+    scheduler.add_job('repricing', pricing.refresh_prices, CronTrigger(minute=10, hour=0, jitter=60))
+    scheduler.add_job('backup', backup.create_backup, IntervalTrigger(hours=24, jitter=300))
+    scheduler.add_job('wal_checkpoint', checkpoint_wal, IntervalTrigger(minutes=10, jitter=30))
+    if archive_closed_years:
+        scheduler.add_job('archive', archive.archive_closed_years, IntervalTrigger(days=1, jitter=600))
+    scheduler.add_job('maintenance', maintenance.run_maintenance, IntervalTrigger(days=1, jitter=600))
+    return scheduler
@@ -2,20 +2,88 @@
 Service Layer: Contains the business logic of the application.
 Coordinates tasks between the GUI and the Data Access Layer.
 """
-from database import get_db_connection, _hash_password, _verify_password
+from sqlcipher3 import dbapi2 as sqlite3
+from database import get_db_connection, stage_ids, fts_query, read_data_versions, VERSIONED_TABLES, _hash_password, _verify_password
+from archive import attach_archives_for_range
+import fulfilment
+import audit
+import pricing
+from audit import AuditEventType
+from models import Money
 from datetime import date, timedelta
+import csv
 
 PRODUCT_CATEGORIES = ["Water", "Soft Drink", "Juice", "Snack"]
+# Shelf life per category in years; categories not listed default to 1 year.
+SHELF_LIFE_YEARS = {"Water": 2, "Soft Drink": 1}
 
-def log_activity(user_id, action_description):
-    """Logs an activity for a given user."""
+def get_data_versions(tables=VERSIONED_TABLES):
+    """
+    Returns {table_name: version} for the given tables. A version changes
+    whenever its table is written, so comparing two results tells whether
+    data read in between is stale.
+    """
     conn = get_db_connection()
     try:
-        conn.execute(
-            "INSERT INTO activity_logs (user_id, action_description) VALUES (?, ?)",
-            (user_id, action_description)
+        return read_data_versions(conn, tables)
+    finally:
+        conn.close()
+
+# --- Search Services ---
+
+# Searchable tables for `search`:
+# table -> (hit type, key column, title expression, snippet column, candidate order)
+# Activity logs can hold millions of matches, so their candidates are the newest
+# matches (which FTS5 reads in rowid order and stops early) rather than the best ranked.
+SEARCH_SOURCES = {
+    'products': ('product', 'product_id', "t.name || ' (' || t.category || ')'", 0, "rank"),
+    'customers': ('customer', 'customer_id', "t.name", -1, "rank"),
+    'activity_logs': ('activity_log', 'log_id', "t.timestamp", 0, "rowid DESC"),
+}
+
+def search(text, sources=None, limit=20, offset=0):
+    """
+    Ranked full-text search across products, customers and activity logs.
+
+    Args:
+        text (str): What the user typed.
+        sources (list): Names from SEARCH_SOURCES to search; all by default.
+        limit (int), offset (int): The page of hits to return.
+
+    Returns:
+        A list of dicts, best matches first:
+        [{'type':, 'id':, 'title':, 'snippet':, 'rank':}, ...]
+        where matched words in the snippet are wrapped in [ and ].
+    """
+    query = fts_query(text)
+    if query is None:
+        return []
+    sources = sources or list(SEARCH_SOURCES)
+
+    selects = []
+    params = []
+    for source in sources:
+        hit_type, key, title, snippet_column, order = SEARCH_SOURCES[source]
+        fts_table = f"{source}_fts"
+        selects.append(f"""
+            SELECT * FROM (
+                SELECT '{hit_type}' AS type, t.{key} AS id, {title} AS title,
+                       snippet({fts_table}, {snippet_column}, '[', ']', '...', 10) AS snippet,
+                       {fts_table}.rank AS rank
+                FROM {fts_table} JOIN {source} t ON t.{key} = {fts_table}.rowid
+                WHERE {fts_table} MATCH ?
+                ORDER BY {fts_table}.{order} LIMIT ?
+            )
+        """)
+        params.extend((query, limit + offset))
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            " UNION ALL ".join(selects) + " ORDER BY rank LIMIT ? OFFSET ?",
+            (*params, limit, offset)
         )
-        conn.commit()
+        return [dict(row) for row in cursor.fetchall()]
     finally:
         conn.close()
 
@@ -82,51 +150,132 @@ def delete_user(user_id):
     finally:
         conn.close()
 
-def delete_batch(batch_id):
+def delete_batch(batch_id, user_id=None):
     """Deletes a specific batch."""
     conn = get_db_connection()
     try:
+        batch = conn.execute(
+            "SELECT product_id, batch_number, quantity FROM batches WHERE batch_id = ?", (batch_id,)
+        ).fetchone()
         conn.execute("DELETE FROM batches WHERE batch_id = ?", (batch_id,))
+        if batch:
+            audit.log_event(
+                user_id, AuditEventType.STOCK_REMOVED,
+                f"Deleted batch {batch['batch_number']} with {batch['quantity']} units.",
+                entity_type='batch', entity_id=batch_id, amount=batch['quantity'],
+                payload={'product_id': batch['product_id']}, conn=conn
+            )
         conn.commit()
     finally:
         conn.close()
 
-def delete_product(product_id):
+def delete_product(product_id, user_id=None):
     """Deletes a product and all its associated batches."""
     conn = get_db_connection()
     try:
+        stock = conn.execute(
+            "SELECT COUNT(*), IFNULL(SUM(quantity), 0) FROM batches WHERE product_id = ?", (product_id,)
+        ).fetchone()
         # This will also delete associated batches due to ON DELETE CASCADE
         conn.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
+        if stock[0]:
+            audit.log_event(
+                user_id, AuditEventType.STOCK_REMOVED,
+                f"Deleted product {product_id} with {stock[0]} batches and {stock[1]} units.",
+                entity_type='product', entity_id=product_id, amount=stock[1],
+                payload={'batches': stock[0]}, conn=conn
+            )
         conn.commit()
     finally:
         conn.close()
 
 # --- Order Management Services ---
 
-def get_all_orders_with_customer_names():
-    """Retrieves all orders with their associated customer's name."""
+ORDER_TYPES = ['Customer', 'Purchase']
+
+def get_all_orders_with_customer_names(search=None):
+    """
+    Retrieves all orders with their associated customer's name.
+    If `search` is given, only orders of customers matching it are returned.
+    """
+    query = fts_query(search)
     conn = get_db_connection()
     try:
-        cursor = conn.execute("""
+        sql = """
             SELECT
                 o.order_id,
                 c.name as customer_name,
                 o.order_date,
-                o.status
+                o.status,
+                o.order_type
             FROM orders o
             LEFT JOIN customers c ON o.customer_id = c.customer_id
-            ORDER BY o.order_date DESC
-        """)
+        """
+        params = ()
+        if query:
+            sql += " WHERE o.customer_id IN (SELECT rowid FROM customers_fts WHERE customers_fts MATCH ?)"
+            params = (query,)
+        cursor = conn.execute(sql + " ORDER BY o.order_date DESC", params)
         orders = cursor.fetchall()
         return [dict(row) for row in orders]
     finally:
         conn.close()
 
-def create_order(customer_id, items):
+def get_order_details(order_ids):
+    """
+    Retrieves headers and line items for a set of orders with two set-based
+    queries, however many orders are requested.
+
+    Returns a dict keyed by order_id:
+        {order_id: {'order_id':, 'customer_name':, 'order_date':, 'status':, 'order_type':,
+                    'items': [{'order_item_id':, 'product_id':, 'product_name':,
+                               'quantity_ordered':, 'quantity_allocated':}, ...]}}
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        stage_ids(cursor, "detail_orders", order_ids)
+
+        cursor.execute("""
+            SELECT o.order_id, c.name as customer_name, o.order_date, o.status, o.order_type
+            FROM temp.detail_orders r
+            JOIN orders o ON o.order_id = r.id
+            LEFT JOIN customers c ON o.customer_id = c.customer_id
+        """)
+        details = {row['order_id']: dict(row, items=[]) for row in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT
+                oi.order_id,
+                oi.order_item_id,
+                oi.product_id,
+                p.name as product_name,
+                oi.quantity_ordered,
+                (SELECT IFNULL(SUM(a.quantity_allocated), 0)
+                 FROM order_allocations a
+                 WHERE a.order_item_id = oi.order_item_id) as quantity_allocated
+            FROM temp.detail_orders r
+            JOIN order_items oi ON oi.order_id = r.id
+            JOIN products p ON p.product_id = oi.product_id
+            ORDER BY oi.order_id, oi.order_item_id
+        """)
+        for row in cursor.fetchall():
+            item = dict(row)
+            details[item.pop('order_id')]['items'].append(item)
+        return details
+    finally:
+        conn.close()
+
+def create_order(customer_id, items, order_type='Customer'):
     """
-    Creates a new customer order transactionally.
+    Creates a new order transactionally.
     `items` is a list of dicts: [{'product_id': id, 'quantity': qty}]
+    `order_type` is one of ORDER_TYPES: 'Customer' orders are filled from
+    stock, 'Purchase' orders are bought in and received into stock, with
+    customer_id naming the supplier.
     """
+    if order_type not in ORDER_TYPES:
+        raise ValueError(f"Unknown order type '{order_type}'.")
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
@@ -134,8 +283,8 @@ def create_order(customer_id, items):
         # 1. Create the main order record
         today = date.today().strftime('%Y-%m-%d')
         cursor.execute(
-            "INSERT INTO orders (customer_id, order_date, status) VALUES (?, ?, ?)",
-            (customer_id, today, 'Received')
+            "INSERT INTO orders (customer_id, order_date, status, order_type) VALUES (?, ?, ?, ?)",
+            (customer_id, today, 'Received', order_type)
         )
         order_id = cursor.lastrowid
 
@@ -154,44 +303,314 @@ def create_order(customer_id, items):
     finally:
         conn.close()
 
-def update_order_status(order_id, new_status):
-    """Updates the status of an existing order."""
+def receive_orders_into_stock(order_ids, user_id=None, received_on=None):
+    """
+    Converts completed purchase orders into batch receipts in a single transaction.
+
+    One batch is created per order and product, numbered `GRN-<order>-<product>`,
+    with the manufacture date set to `received_on` (default today), the expiry
+    date derived from SHELF_LIFE_YEARS and prices copied from the product's most
+    recent batch. Customer orders, which are filled from stock rather than
+    into it, and orders that are not completed or were already received are
+    skipped.
+
+    Returns a dict: {'received': [order_id, ...], 'batches_created': count,
+                     'skipped': [(order_id, reason), ...]}
+    """
+    received_on = (received_on or date.today()).strftime('%Y-%m-%d')
     conn = get_db_connection()
     try:
-        conn.execute(
-            "UPDATE orders SET status = ? WHERE order_id = ?",
-            (new_status, order_id)
+        cursor = conn.cursor()
+        stage_ids(cursor, "receipt_orders", order_ids)
+
+        # Work out which of the requested orders are eligible, in one pass.
+        skipped = []
+        eligible = []
+        cursor.execute("""
+            SELECT r.id, o.status, o.order_type, g.order_id IS NOT NULL AS already_received
+            FROM temp.receipt_orders r
+            LEFT JOIN orders o ON o.order_id = r.id
+            LEFT JOIN goods_receipts g ON g.order_id = r.id
+        """)
+        for order_id, status, order_type, already_received in cursor.fetchall():
+            if status is None:
+                skipped.append((order_id, "Order not found."))
+            elif order_type != 'Purchase':
+                skipped.append((order_id, "Only purchase orders can be received into stock."))
+            elif already_received:
+                skipped.append((order_id, "Order has already been received."))
+            elif status != 'Completed':
+                skipped.append((order_id, f"Order is '{status}', not 'Completed'."))
+            else:
+                eligible.append(order_id)
+
+        if not eligible:
+            conn.rollback()
+            return {'received': [], 'batches_created': 0, 'skipped': skipped}
+
+        stage_ids(cursor, "receipt_orders", eligible)
+
+        # Products without any previous batch have no price to copy.
+        cursor.execute("""
+            SELECT DISTINCT p.name
+            FROM temp.receipt_orders r
+            JOIN order_items oi ON oi.order_id = r.id
+            JOIN products p ON p.product_id = oi.product_id
+            WHERE NOT EXISTS (SELECT 1 FROM batches b WHERE b.product_id = oi.product_id)
+        """)
+        unpriced = [row[0] for row in cursor.fetchall()]
+        if unpriced:
+            raise ValueError(f"No previous batch to take prices from for: {', '.join(unpriced)}")
+
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS shelf_life (category TEXT PRIMARY KEY, days INTEGER NOT NULL)")
+        cursor.execute("DELETE FROM temp.shelf_life")
+        cursor.executemany(
+            "INSERT INTO temp.shelf_life (category, days) VALUES (?, ?)",
+            [(category, 365 * years) for category, years in SHELF_LIFE_YEARS.items()]
+        )
+
+        cursor.execute("""
+            INSERT INTO batches (product_id, batch_number, quantity, manufacture_date, expiry_date, cost_price_cents, selling_price_cents)
+            SELECT
+                oi.product_id,
+                'GRN-' || oi.order_id || '-' || oi.product_id,
+                SUM(oi.quantity_ordered),
+                :received_on,
+                date(:received_on, '+' || IFNULL(sl.days, 365) || ' days'),
+                lp.cost_price_cents,
+                lp.selling_price_cents
+            FROM temp.receipt_orders r
+            JOIN order_items oi ON oi.order_id = r.id
+            JOIN products p ON p.product_id = oi.product_id
+            LEFT JOIN temp.shelf_life sl ON sl.category = p.category
+            JOIN (
+                -- Prices of the most recent batch of each product
+                SELECT product_id, cost_price_cents, selling_price_cents, MAX(batch_id)
+                FROM batches
+                GROUP BY product_id
+            ) AS lp ON lp.product_id = oi.product_id
+            GROUP BY oi.order_id, oi.product_id
+            ORDER BY oi.order_id, oi.product_id
+        """, {'received_on': received_on})
+        batches_created = cursor.rowcount
+
+        cursor.execute(
+            "INSERT INTO goods_receipts (order_id, received_by) SELECT id, ? FROM temp.receipt_orders",
+            (user_id,)
+        )
+        units_received = cursor.execute("""
+            SELECT IFNULL(SUM(oi.quantity_ordered), 0)
+            FROM temp.receipt_orders r JOIN order_items oi ON oi.order_id = r.id
+        """).fetchone()[0]
+        audit.log_event(
+            user_id, AuditEventType.STOCK_RECEIVED,
+            f"Received {len(eligible)} orders into stock as {batches_created} batches.",
+            amount=units_received,
+            payload={'order_ids': eligible, 'batches_created': batches_created},
+            conn=conn
         )
         conn.commit()
+    except (sqlite3.Error, ValueError) as e:
+        conn.rollback()
+        raise e
     finally:
         conn.close()
 
-def create_sale(user_id, customer_id, cart, discount=0):
+    return {'received': eligible, 'batches_created': batches_created, 'skipped': skipped}
+
+ORDER_STATUSES = ['Received', 'Ready to Pack', 'Ready to Distribute', 'Completed']
+# Orders move one step forward through the workflow, or one step back to
+# correct a mistake. Completed orders are final.
+ORDER_STATUS_TRANSITIONS = {
+    'Received': {'Ready to Pack'},
+    'Ready to Pack': {'Received', 'Ready to Distribute'},
+    'Ready to Distribute': {'Ready to Pack', 'Completed'},
+    'Completed': set(),
+}
+
+def update_order_statuses(order_ids, new_status):
     """
-    Creates a new sale, updating batch quantities transactionally.
-    `cart` is a list of dictionaries, e.g., [{'product_id': 1, 'quantity': 2}, ...]
+    Moves many orders to `new_status` in one transaction.
+
+    Each order's current status is checked against ORDER_STATUS_TRANSITIONS;
+    orders that cannot make the transition are left unchanged and reported.
+    Orders already in `new_status` are ignored.
+
+    Moving customer orders to 'Ready to Distribute' allocates batch stock to
+    them as one wave (see fulfilment.allocate_orders); orders that cannot be
+    filled are rejected with their shortfalls. Stepping back releases the
+    allocations; completing takes the allocated units out of their batches.
+    Purchase orders reserve nothing; their stock comes in through
+    receive_orders_into_stock.
+
+    Returns a dict: {'updated': [order_id, ...], 'rejected': [(order_id, reason), ...],
+                     'shortfalls': {order_id: [...]}}
     """
+    if new_status not in ORDER_STATUSES:
+        raise ValueError(f"Unknown order status '{new_status}'.")
+
     conn = get_db_connection()
     try:
-        subtotal = 0
+        cursor = conn.cursor()
+        stage_ids(cursor, "status_orders", order_ids)
+        cursor.execute("""
+            SELECT r.id, o.status, o.order_type
+            FROM temp.status_orders r
+            LEFT JOIN orders o ON o.order_id = r.id
+        """)
 
-        # First, calculate subtotal and check stock availability
-        for item in cart:
-            product_id = item['product_id']
-            quantity_to_sell = item['quantity']
+        updated = []
+        rejected = []
+        releasing = []
+        purchases = []
+        for order_id, status, order_type in cursor.fetchall():
+            if status is None:
+                rejected.append((order_id, "Order not found."))
+            elif status == new_status:
+                continue
+            elif new_status not in ORDER_STATUS_TRANSITIONS[status]:
+                rejected.append((order_id, f"Cannot move from '{status}' to '{new_status}'."))
+            elif order_type == 'Purchase':
+                purchases.append(order_id)
+            else:
+                updated.append(order_id)
+                if status == fulfilment.RESERVING_STATUS and new_status != 'Completed':
+                    releasing.append(order_id)
+
+        shortfalls = {}
+        if new_status == fulfilment.RESERVING_STATUS and updated:
+            allocation = fulfilment.allocate_orders(conn, updated)
+            shortfalls = allocation['shortfalls']
+            for order_id, short in shortfalls.items():
+                details = ", ".join(f"{s['name']} ({s['available']} of {s['requested']})" for s in short)
+                rejected.append((order_id, f"Not enough stock: {details}."))
+            updated = allocation['allocated']
+        if releasing:
+            fulfilment.release_allocations(conn, releasing)
+        if new_status == 'Completed' and updated:
+            fulfilment.ship_allocations(conn, updated)
+        updated += purchases
+
+        stage_ids(cursor, "status_orders", updated)
+        cursor.execute(
+            "UPDATE orders SET status = ? WHERE order_id IN (SELECT id FROM temp.status_orders)",
+            (new_status,)
+        )
+        conn.commit()
+        return {'updated': updated, 'rejected': rejected, 'shortfalls': shortfalls}
+    except sqlite3.Error as e:
+        conn.rollback()
+        raise e
+    finally:
+        conn.close()
 
-            batches = get_batches_for_product(product_id)
-            if not batches:
-                raise ValueError(f"No batches available for product ID {product_id}")
+def update_order_status(order_id, new_status):
+    """Updates the status of an existing order."""
+    result = update_order_statuses([order_id], new_status)
+    if result['rejected']:
+        raise ValueError(result['rejected'][0][1])
 
-            total_stock = sum(b['quantity'] for b in batches)
-            if total_stock < quantity_to_sell:
-                raise ValueError(f"Not enough stock for product ID {product_id}. Available: {total_stock}, Requested: {quantity_to_sell}")
+def get_pick_list(order_ids):
+    """
+    Aggregates the items of the given orders per product in a single query,
+    so that packing can run off one consolidated list.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        stage_ids(cursor, "pick_orders", order_ids)
+        cursor.execute("""
+            SELECT
+                p.product_id,
+                p.name,
+                p.category,
+                SUM(oi.quantity_ordered) as total_quantity,
+                COUNT(DISTINCT oi.order_id) as order_count
+            FROM temp.pick_orders r
+            JOIN order_items oi ON oi.order_id = r.id
+            JOIN products p ON p.product_id = oi.product_id
+            GROUP BY p.product_id
+            ORDER BY p.category, p.name
+        """)
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
 
-            # The price is determined by the first batch we'd sell from
-            subtotal += batches[0]['selling_price'] * quantity_to_sell
+def _price_sale_lines(conn, cart):
+    """
+    Splits each cart item over the product's batches, earliest expiry first,
+    leaving the units reserved for orders (see fulfilment), and prices each
+    part with the batch's promotional price for the item's quantity. Returns
+    a list of {'batch_id':, 'quantity':, 'unit_price': Money, 'rule_id':}.
+    Raises ValueError if stock is short. Call pricing.refresh_prices first.
+    """
+    lines = []
+    for item in cart:
+        product_id = item['product_id']
+        quantity_to_sell = item['quantity']
+
+        batches = conn.execute(f"""
+            SELECT b.batch_id, b.quantity - IFNULL(res.reserved, 0) AS quantity
+            FROM batches b
+            LEFT JOIN ({fulfilment.RESERVED_STOCK_SQL}) AS res ON res.batch_id = b.batch_id
+            WHERE b.product_id = ? AND b.quantity - IFNULL(res.reserved, 0) > 0
+            ORDER BY b.expiry_date
+        """, (product_id,)).fetchall()
+        if not batches:
+            raise ValueError(f"No batches available for product ID {product_id}")
+
+        total_stock = sum(b['quantity'] for b in batches)
+        if total_stock < quantity_to_sell:
+            raise ValueError(f"Not enough stock for product ID {product_id}. Available: {total_stock}, Requested: {quantity_to_sell}")
+
+        for batch in batches:
+            if quantity_to_sell == 0:
+                break
+            sell_from_this_batch = min(quantity_to_sell, batch['quantity'])
+            # Quantity breaks apply to the whole cart item, however it is split over batches.
+            unit_price, rule_id = pricing.get_unit_price(conn, batch['batch_id'], item['quantity'])
+            lines.append({
+                'batch_id': batch['batch_id'], 'quantity': sell_from_this_batch,
+                'unit_price': unit_price, 'rule_id': rule_id,
+            })
+            quantity_to_sell -= sell_from_this_batch
+    return lines
+
+def quote_sale(cart, discount=0):
+    """
+    Prices a cart exactly as create_sale would charge it.
+
+    Returns a dict: {'items': {product_id: Money line total}, 'subtotal': Money,
+    'discount': Money, 'total': Money}
+    """
+    pricing.refresh_prices()
+    conn = get_db_connection()
+    try:
+        items = {}
+        for item in cart:
+            lines = _price_sale_lines(conn, [item])
+            items[item['product_id']] = sum(line['unit_price'] * line['quantity'] for line in lines)
+    finally:
+        conn.close()
+    subtotal = sum(items.values(), Money(0))
+    discount_amount = subtotal.percent(discount)
+    return {'items': items, 'subtotal': subtotal, 'discount': discount_amount, 'total': subtotal - discount_amount}
 
-        discount_amount = (subtotal * discount) / 100
+def create_sale(user_id, customer_id, cart, discount=0):
+    """
+    Creates a new sale, updating batch quantities transactionally.
+    `cart` is a list of dictionaries, e.g., [{'product_id': 1, 'quantity': 2}, ...]
+    Each unit is charged its batch's promotional price (see pricing.py).
+    `discount` is a percentage of the subtotal; the discount is rounded to the cent.
+    """
+    conn = get_db_connection()
+    try:
+        # First, split the cart over batches and price it. Repricing, if due,
+        # is part of the sale's transaction.
+        pricing.refresh_prices(conn=conn)
+        lines = _price_sale_lines(conn, cart)
+        subtotal = sum((line['unit_price'] * line['quantity'] for line in lines), Money(0))
+        discount_amount = subtotal.percent(discount)
         total_amount = subtotal - discount_amount
 
         # --- Begin Transaction ---
@@ -199,42 +618,41 @@ def create_sale(user_id, customer_id, cart, discount=0):
 
         # 1. Create the sale record
         cursor.execute(
-            "INSERT INTO sales (user_id, customer_id, total_amount, discount_applied) VALUES (?, ?, ?, ?)",
-            (user_id, customer_id, total_amount, discount_amount)
+            "INSERT INTO sales (user_id, customer_id, total_amount_cents, discount_applied_cents) VALUES (?, ?, ?, ?)",
+            (user_id, customer_id, total_amount.cents, discount_amount.cents)
         )
         sale_id = cursor.lastrowid
 
         # 2. Add sale items and update batch quantities
-        for item in cart:
-            product_id = item['product_id']
-            quantity_to_sell = item['quantity']
-
-            # Get batches again, this time for updating (ordered by expiry)
-            batches = get_batches_for_product(product_id)
-
-            for batch in batches:
-                if quantity_to_sell == 0:
-                    break
-
-                sell_from_this_batch = min(quantity_to_sell, batch['quantity'])
-
-                # Insert sale item record
-                cursor.execute(
-                    "INSERT INTO sale_items (sale_id, batch_id, quantity_sold, price_per_unit) VALUES (?, ?, ?, ?)",
-                    (sale_id, batch['batch_id'], sell_from_this_batch, batch['selling_price'])
-                )
-
-                # Update batch quantity
-                new_quantity = batch['quantity'] - sell_from_this_batch
-                cursor.execute(
-                    "UPDATE batches SET quantity = ? WHERE batch_id = ?",
-                    (new_quantity, batch['batch_id'])
-                )
+        for line in lines:
+            cursor.execute(
+                "INSERT INTO sale_items (sale_id, batch_id, quantity_sold, price_per_unit_cents) VALUES (?, ?, ?, ?)",
+                (sale_id, line['batch_id'], line['quantity'], line['unit_price'].cents)
+            )
+            cursor.execute(
+                "UPDATE batches SET quantity = quantity - ? WHERE batch_id = ?",
+                (line['quantity'], line['batch_id'])
+            )
 
-                quantity_to_sell -= sell_from_this_batch
+        # 3. Audit the sale, and the discount separately so it can be queried by percentage
+        audit.log_event(
+            user_id, AuditEventType.SALE, f"Created new sale with ID {sale_id}.",
+            entity_type='sale', entity_id=sale_id, amount_cents=total_amount.cents,
+            payload={
+                'customer_id': customer_id, 'items': len(cart),
+                'pricing_rules': sorted({line['rule_id'] for line in lines if line['rule_id']}),
+            },
+            conn=conn
+        )
+        if discount:
+            audit.log_event(
+                user_id, AuditEventType.DISCOUNT, f"Applied a {discount}% discount to sale {sale_id}.",
+                entity_type='sale', entity_id=sale_id, amount=discount, amount_cents=discount_amount.cents,
+                payload={'subtotal': subtotal.format(currency=False), 'discount_amount': discount_amount.format(currency=False)},
+                conn=conn
+            )
 
         conn.commit()
-        log_activity(user_id, f"Created new sale with ID {sale_id}.")
         return sale_id
 
     except (sqlite3.Error, ValueError) as e:
@@ -246,6 +664,14 @@ def create_sale(user_id, customer_id, cart, discount=0):
 
 # --- Sales Management Services ---
 
+# The data_versions counters each report reads, besides the sales of its
+# period; see report_cache.get_report.
+SALES_REPORT_TABLES = ('users', 'customers', 'batch_costs')
+PRODUCT_PERFORMANCE_TABLES = ('products', 'batch_costs')
+INVENTORY_REPORT_TABLES = ('products', 'batches')
+# Rows per chunk of stream_sales_report.
+SALES_REPORT_CHUNK_SIZE = 500
+
 def get_inventory_report():
     """
     Retrieves a report of the current inventory, including total stock and value.
@@ -258,7 +684,7 @@ def get_inventory_report():
                 p.name,
                 p.category,
                 IFNULL(SUM(b.quantity), 0) as total_stock,
-                IFNULL(SUM(b.quantity * b.cost_price), 0) as total_cost_value
+                IFNULL(SUM(b.quantity * b.cost_price_cents), 0) as total_cost_value_cents
             FROM products p
             LEFT JOIN batches b ON p.product_id = b.product_id
             GROUP BY p.product_id
@@ -269,37 +695,16 @@ def get_inventory_report():
     finally:
         conn.close()
 
-def get_sales_summary(start_date, end_date):
-    """
-    Calculates the sales summary (revenue, cogs) for a given date range.
-    """
-    conn = get_db_connection()
-    try:
-        start_datetime = f"{start_date} 00:00:00"
-        end_datetime = f"{end_date} 23:59:59"
-
-        cursor = conn.execute("""
-            SELECT
-                IFNULL(SUM(si.quantity_sold * si.price_per_unit), 0) as total_revenue,
-                IFNULL(SUM(si.quantity_sold * b.cost_price), 0) as total_cogs
-            FROM sale_items si
-            JOIN sales s ON si.sale_id = s.sale_id
-            JOIN batches b ON si.batch_id = b.batch_id
-            WHERE s.sale_date BETWEEN ? AND ?
-        """, (start_datetime, end_datetime))
-        summary_data = cursor.fetchone()
-        return dict(summary_data)
-    finally:
-        conn.close()
-
 def get_product_performance_report(start_date, end_date):
     """
     Retrieves product performance data for a given date range.
+    Archives for years inside the range are attached on demand.
     """
     conn = get_db_connection()
     try:
         start_datetime = f"{start_date} 00:00:00"
         end_datetime = f"{end_date} 23:59:59"
+        attach_archives_for_range(conn, start_date, end_date)
 
         cursor = conn.execute("""
             SELECT
@@ -307,14 +712,14 @@ def get_product_performance_report(start_date, end_date):
                 p.name as product_name,
                 p.category,
                 SUM(si.quantity_sold) as total_quantity_sold,
-                SUM(si.quantity_sold * si.price_per_unit) as total_revenue
-            FROM sale_items si
-            JOIN sales s ON si.sale_id = s.sale_id
+                SUM(si.quantity_sold * si.price_per_unit_cents) as total_revenue_cents
+            FROM all_sale_items si
+            JOIN all_sales s ON si.sale_id = s.sale_id
             JOIN batches b ON si.batch_id = b.batch_id
             JOIN products p ON b.product_id = p.product_id
             WHERE s.sale_date BETWEEN ? AND ?
             GROUP BY p.product_id
-            ORDER BY total_revenue DESC
+            ORDER BY total_revenue_cents DESC
         """, (start_datetime, end_datetime))
         report_data = cursor.fetchall()
         return [dict(row) for row in report_data]
@@ -332,7 +737,7 @@ def get_recent_sales(limit=5):
                 s.sale_id,
                 s.sale_date,
                 c.name as customer_name,
-                s.total_amount
+                s.total_amount_cents
             FROM sales s
             LEFT JOIN customers c ON s.customer_id = c.customer_id
             ORDER BY s.sale_date DESC
@@ -343,32 +748,83 @@ def get_recent_sales(limit=5):
     finally:
         conn.close()
 
-def get_sales_report(start_date, end_date):
+def stream_sales_report(start_date, end_date, chunk_size=SALES_REPORT_CHUNK_SIZE):
     """
-    Retrieves sales data for a given date range, including cashier and customer names.
+    Yields the sales of a date range, newest first, in chunks for a UI to
+    show while the rest is read. Archives for years inside the range are
+    attached on demand.
+
+    Each row has the sale with its cashier and customer names, the revenue
+    and COGS of its lines, and the subtotals of its day (day_sale_count,
+    day_amount_cents, day_discount_cents, day_revenue_cents,
+    day_cogs_cents), computed by window functions in the same query.
+    Everything is read in one transaction, so the rows, day subtotals and
+    totals agree even while sales are being made.
+
+    Yields {'rows': [...], 'totals': {'sale_count':, 'total_amount':,
+    'total_discount':, 'total_revenue':, 'total_cogs':, 'gross_profit':}},
+    the totals as Money over all rows so far; the last chunk's are the
+    grand totals. An empty range yields one chunk without rows.
     """
     conn = get_db_connection()
     try:
-        # Ensure the time part is included for accurate range filtering
         start_datetime = f"{start_date} 00:00:00"
         end_datetime = f"{end_date} 23:59:59"
+        attach_archives_for_range(conn, start_date, end_date)
+        conn.execute("BEGIN")
 
+        # Grouped per sale; the windows then run over the per-sale totals.
         cursor = conn.execute("""
             SELECT
                 s.sale_id,
                 s.sale_date,
-                s.total_amount,
-                s.discount_applied,
+                date(s.sale_date) AS day,
+                s.total_amount_cents,
+                s.discount_applied_cents,
                 u.username,
-                c.name as customer_name
-            FROM sales s
-            JOIN users u ON s.user_id = u.user_id
+                c.name as customer_name,
+                IFNULL(SUM(si.quantity_sold * si.price_per_unit_cents), 0) AS revenue_cents,
+                IFNULL(SUM(si.quantity_sold * b.cost_price_cents), 0) AS cogs_cents,
+                COUNT(*) OVER sale_day AS day_sale_count,
+                SUM(s.total_amount_cents) OVER sale_day AS day_amount_cents,
+                SUM(s.discount_applied_cents) OVER sale_day AS day_discount_cents,
+                SUM(IFNULL(SUM(si.quantity_sold * si.price_per_unit_cents), 0)) OVER sale_day AS day_revenue_cents,
+                SUM(IFNULL(SUM(si.quantity_sold * b.cost_price_cents), 0)) OVER sale_day AS day_cogs_cents
+            FROM all_sales s
+            LEFT JOIN all_sale_items si ON si.sale_id = s.sale_id
+            LEFT JOIN batches b ON si.batch_id = b.batch_id
+            LEFT JOIN users u ON s.user_id = u.user_id
             LEFT JOIN customers c ON s.customer_id = c.customer_id
-            WHERE s.sale_date BETWEEN ? AND ?
-            ORDER BY s.sale_date DESC
-        """, (start_datetime, end_datetime))
-        report_data = cursor.fetchall()
-        return [dict(row) for row in report_data]
+            WHERE s.sale_date BETWEEN :start AND :end
+            GROUP BY s.sale_id
+            WINDOW sale_day AS (PARTITION BY date(s.sale_date))
+            ORDER BY s.sale_date DESC, s.sale_id DESC
+        """, {'start': start_datetime, 'end': end_datetime})
+
+        sale_count = amount = discount = revenue = cogs = 0
+        while True:
+            rows = [dict(row) for row in cursor.fetchmany(chunk_size)]
+            for row in rows:
+                amount += row['total_amount_cents']
+                discount += row['discount_applied_cents']
+                revenue += row['revenue_cents']
+                cogs += row['cogs_cents']
+            sale_count += len(rows)
+            if rows or not sale_count:
+                yield {
+                    'rows': rows,
+                    'totals': {
+                        'sale_count': sale_count,
+                        'total_amount': Money(amount),
+                        'total_discount': Money(discount),
+                        'total_revenue': Money(revenue),
+                        'total_cogs': Money(cogs),
+                        'gross_profit': Money(revenue - cogs),
+                    },
+                }
+            if len(rows) < chunk_size:
+                break
+        conn.rollback()
     finally:
         conn.close()
 
@@ -376,29 +832,99 @@ def get_all_customers():
     """Retrieves all customers from the database."""
     conn = get_db_connection()
     try:
-        cursor = conn.execute("SELECT customer_id, name, contact_info FROM customers ORDER BY name")
+        cursor = conn.execute("SELECT customer_id, name, phone, address, contact_info FROM customers ORDER BY name")
         customers = cursor.fetchall()
         return [dict(row) for row in customers]
     finally:
         conn.close()
 
+def search_customers(text, limit=20):
+    """
+    Type-ahead customer search over name, phone and address using the
+    customers_fts index. Returns at most `limit` customers, best matches
+    first. An empty search returns the first customers by name.
+    """
+    query = fts_query(text)
+    conn = get_db_connection()
+    try:
+        if query is None:
+            cursor = conn.execute("""
+                SELECT customer_id, name, phone, address
+                FROM customers ORDER BY name COLLATE NOCASE LIMIT ?
+            """, (limit,))
+        else:
+            cursor = conn.execute("""
+                SELECT c.customer_id, c.name, c.phone, c.address
+                FROM customers_fts f
+                JOIN customers c ON c.customer_id = f.rowid
+                WHERE customers_fts MATCH ?
+                ORDER BY f.rank
+                LIMIT ?
+            """, (query, limit))
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+def find_duplicate_customers():
+    """
+    Finds groups of customers that are probably the same person: the same
+    phone number (ignoring spaces, dashes, brackets and '+'), or the same
+    name and address (ignoring case and surrounding spaces).
+
+    Returns a list of dicts: [{'match': 'phone' | 'name_address', 'key':, 'customer_ids': [...]}]
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute("""
+            SELECT 'phone' AS match, key, GROUP_CONCAT(customer_id) AS customer_ids
+            FROM (
+                SELECT customer_id,
+                       REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(phone, ' ', ''), '-', ''), '(', ''), ')', ''), '+', '') AS key
+                FROM customers
+                WHERE phone IS NOT NULL AND phone != ''
+                ORDER BY customer_id
+            )
+            GROUP BY key
+            HAVING COUNT(*) > 1
+            UNION ALL
+            SELECT 'name_address' AS match, key, GROUP_CONCAT(customer_id) AS customer_ids
+            FROM (
+                SELECT customer_id,
+                       LOWER(TRIM(name)) || '|' || LOWER(TRIM(IFNULL(address, ''))) AS key
+                FROM customers
+                ORDER BY customer_id
+            )
+            GROUP BY key
+            HAVING COUNT(*) > 1
+        """)
+        return [
+            {'match': row['match'], 'key': row['key'],
+             'customer_ids': [int(i) for i in row['customer_ids'].split(',')]}
+            for row in cursor.fetchall()
+        ]
+    finally:
+        conn.close()
 
 def add_customer(name, phone, address):
     """Adds a new customer to the database and returns the new customer object."""
     conn = get_db_connection()
     try:
-        # Combine phone and address into a single contact_info string
-        contact_info = f"Phone: {phone}, Address: {address}"
+        phone = phone.strip() or None
+        address = address.strip() or None
+        # The combined contact_info text is still written for backward compatibility.
+        contact_info = f"Phone: {phone or ''}, Address: {address or ''}"
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO customers (name, contact_info) VALUES (?, ?)",
-            (name, contact_info)
+            "INSERT INTO customers (name, contact_info, phone, address) VALUES (?, ?, ?, ?)",
+            (name, contact_info, phone, address)
         )
         new_customer_id = cursor.lastrowid
         conn.commit()
         return {
             'customer_id': new_customer_id,
             'name': name,
+            'phone': phone,
+            'address': address,
             'contact_info': contact_info
         }
     except Exception as e:
@@ -407,45 +933,54 @@ def add_customer(name, phone, address):
     finally:
         conn.close()
 
-def get_products_for_sale():
+def get_products_for_sale(search=None):
     """
     Retrieves all products that are available for sale, including total stock.
-    An available product has at least one batch with quantity > 0.
-    The price is determined by the batch that will expire first (FIFO/FEFO).
+    An available product has at least one batch with units not reserved for
+    orders; total_stock counts only those units.
+    The price is determined by the batch that will expire first (FIFO/FEFO):
+    `selling_price_cents` is its regular price and `price_cents` its
+    promotional price for one unit.
+    If `search` is given, only products matching it are returned.
     """
+    query = fts_query(search)
+    pricing.refresh_prices()
     conn = get_db_connection()
     try:
-        # This query finds the earliest-expiring batch with stock for each product,
-        # joins it with product info, and calculates the total stock for that product.
-        cursor = conn.execute("""
+        # This query finds the earliest-expiring batch with unreserved stock for
+        # each product, joins it with product info, and calculates the total
+        # stock for that product that is not reserved for orders.
+        cursor = conn.execute(f"""
+            WITH stock AS (
+                SELECT b.batch_id, b.product_id, b.expiry_date, b.selling_price_cents,
+                       b.quantity - IFNULL(res.reserved, 0) AS available
+                FROM batches b
+                LEFT JOIN ({fulfilment.RESERVED_STOCK_SQL}) AS res ON res.batch_id = b.batch_id
+            )
             SELECT
                 p.product_id,
                 p.name,
                 p.category,
-                b.selling_price,
+                b.selling_price_cents,
+                IFNULL(bp.price_cents, b.selling_price_cents) AS price_cents,
                 s.total_stock
             FROM products p
             JOIN (
-                -- Find the earliest-expiring batch for each product with stock
-                SELECT
-                    product_id,
-                    MIN(expiry_date) as min_expiry_date
-                FROM batches
-                WHERE quantity > 0
-                GROUP BY product_id
-            ) as earliest_exp_batch ON p.product_id = earliest_exp_batch.product_id
-            JOIN batches b ON p.product_id = b.product_id AND b.expiry_date = earliest_exp_batch.min_expiry_date
-            JOIN (
-                -- Calculate total stock for each product
+                -- Earliest expiry and total stock of each product with stock
                 SELECT
                     product_id,
-                    SUM(quantity) as total_stock
-                FROM batches
+                    MIN(expiry_date) as min_expiry_date,
+                    SUM(available) as total_stock
+                FROM stock
+                WHERE available > 0
                 GROUP BY product_id
             ) as s ON p.product_id = s.product_id
-            WHERE s.total_stock > 0
+            JOIN stock b ON p.product_id = b.product_id AND b.expiry_date = s.min_expiry_date
+                AND b.available > 0
+            LEFT JOIN batch_prices bp ON bp.batch_id = b.batch_id AND bp.min_quantity = 1
+            WHERE (? IS NULL OR p.product_id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?))
             ORDER BY p.name
-        """)
+        """, (query, query))
         products = cursor.fetchall()
         return [dict(row) for row in products]
     finally:
@@ -462,18 +997,19 @@ def get_product_by_id(product_id):
         conn.close()
 
 def get_near_expiry_items():
-    """Retrieves products with batches expiring in the next 30 days."""
+    """
+    Retrieves batches with stock expiring within the near-expiry horizon, as
+    of the last roll forward (see alerts.roll_forward_expiry_alerts).
+    """
     conn = get_db_connection()
     try:
-        today = date.today().strftime('%Y-%m-%d')
-        thirty_days_from_now = (date.today() + timedelta(days=30)).strftime('%Y-%m-%d')
         cursor = conn.execute("""
             SELECT p.name, b.batch_number, b.quantity, b.expiry_date
-            FROM batches b
-            JOIN products p ON b.product_id = p.product_id
-            WHERE b.expiry_date BETWEEN ? AND ? AND b.quantity > 0
-            ORDER BY b.expiry_date
-        """, (today, thirty_days_from_now))
+            FROM near_expiry_alerts a
+            JOIN batches b ON b.batch_id = a.batch_id
+            JOIN products p ON p.product_id = a.product_id
+            ORDER BY a.expiry_date
+        """)
         items = cursor.fetchall()
         return [dict(row) for row in items]
     finally:
@@ -484,11 +1020,9 @@ def get_low_stock_items():
     conn = get_db_connection()
     try:
         cursor = conn.execute("""
-            SELECT p.name, p.reorder_level, SUM(b.quantity) as total_stock
-            FROM products p
-            LEFT JOIN batches b ON p.product_id = b.product_id
-            GROUP BY p.product_id
-            HAVING IFNULL(SUM(b.quantity), 0) < p.reorder_level
+            SELECT p.name, a.reorder_level, a.total_stock
+            FROM low_stock_alerts a
+            JOIN products p ON p.product_id = a.product_id
             ORDER BY p.name
         """)
         items = cursor.fetchall()
@@ -516,9 +1050,13 @@ def authenticate_user(username, password):
         conn.close()
 
     if not user_data:
+        audit.log_event(None, AuditEventType.LOGIN_FAILED, f"Failed login for unknown user '{username}'.",
+                        payload={'username': username, 'reason': 'unknown_user'})
         return None  # User not found
 
     if not user_data['is_active']:
+        audit.log_event(user_data['user_id'], AuditEventType.LOGIN_FAILED, f"Failed login for inactive user '{username}'.",
+                        entity_type='user', entity_id=user_data['user_id'], payload={'reason': 'inactive'})
         return None # User is not active
 
     stored_hash = user_data['password_hash']
@@ -530,9 +1068,12 @@ def authenticate_user(username, password):
             'role': user_data['role']
         }
         # Log the successful login
-        log_activity(user_info['user_id'], f"User '{username}' logged in.")
+        audit.log_event(user_info['user_id'], AuditEventType.LOGIN, f"User '{username}' logged in.",
+                        entity_type='user', entity_id=user_info['user_id'])
         return user_info
 
+    audit.log_event(user_data['user_id'], AuditEventType.LOGIN_FAILED, f"Failed login for user '{username}'.",
+                    entity_type='user', entity_id=user_data['user_id'], payload={'reason': 'wrong_password'})
     return None
 
 def get_dashboard_stats():
@@ -541,38 +1082,25 @@ def get_dashboard_stats():
     try:
         cursor = conn.cursor()
 
-        # 1. Total Sales Today
-        today = date.today().strftime('%Y-%m-%d')
-        cursor.execute(
-            "SELECT SUM(total_amount) FROM sales WHERE DATE(sale_date) = ?",
-            (today,)
-        )
-        total_sales_today = cursor.fetchone()[0] or 0.0
-
-        # 2. Items Nearing Expiry (in the next 30 days)
-        thirty_days_from_now = (date.today() + timedelta(days=30)).strftime('%Y-%m-%d')
+        # 1. Total Sales Today, as a range on the sale_date index
+        today = date.today()
         cursor.execute(
-            "SELECT COUNT(*) FROM batches WHERE expiry_date BETWEEN ? AND ? AND quantity > 0",
-            (today, thirty_days_from_now)
+            "SELECT IFNULL(SUM(total_amount_cents), 0) FROM sales WHERE sale_date >= ? AND sale_date < ?",
+            (f"{today} 00:00:00", f"{today + timedelta(days=1)} 00:00:00")
         )
-        near_expiry_items = cursor.fetchone()[0] or 0
+        total_sales_today = Money(cursor.fetchone()[0])
 
-        # 3. Low Stock Alerts
-        cursor.execute("""
-            SELECT COUNT(p.product_id)
-            FROM products p
-            WHERE (
-                SELECT SUM(b.quantity)
-                FROM batches b
-                WHERE b.product_id = p.product_id
-            ) < p.reorder_level
-        """)
-        low_stock_items = cursor.fetchone()[0] or 0
+        # 2. and 3. Alert counts, kept current by the alert tables
+        cursor.execute("SELECT alert_type, item_count FROM alert_counts")
+        counts = dict(cursor.fetchall())
+        cursor.execute("SELECT value FROM alert_settings WHERE key = 'near_expiry_days'")
+        near_expiry_days = int(cursor.fetchone()[0])
 
         return {
             "total_sales_today": total_sales_today,
-            "near_expiry_items": near_expiry_items,
-            "low_stock_items": low_stock_items
+            "near_expiry_items": counts.get('near_expiry', 0),
+            "low_stock_items": counts.get('low_stock', 0),
+            "near_expiry_days": near_expiry_days
         }
     finally:
         conn.close()
@@ -603,25 +1131,48 @@ def get_all_products_with_stock():
     finally:
         conn.close()
 
-def get_all_products():
-    """Retrieves all products from the database."""
+def get_all_products(search=None):
+    """
+    Retrieves all products from the database.
+    If `search` is given, only products whose name or category match it are returned.
+    """
+    query = fts_query(search)
     conn = get_db_connection()
     try:
-        cursor = conn.execute("SELECT product_id, name, category, reorder_level FROM products ORDER BY name")
+        if query:
+            cursor = conn.execute("""
+                SELECT product_id, name, category, reorder_level FROM products
+                WHERE product_id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)
+                ORDER BY name
+            """, (query,))
+        else:
+            cursor = conn.execute("SELECT product_id, name, category, reorder_level FROM products ORDER BY name")
         products = cursor.fetchall()
         return [dict(row) for row in products]
     finally:
         conn.close()
 
+def get_default_expiry_date(category, manufacture_date):
+    """Returns the default expiry date for a batch of the given category."""
+    years = SHELF_LIFE_YEARS.get(category, 1)
+    return manufacture_date + timedelta(days=365 * years)
+
 def get_batches_for_product(product_id):
-    """Retrieves all batches for a specific product."""
+    """
+    Retrieves all batches for a specific product. `price_cents` is the
+    promotional price of one unit, or the selling price if no rule applies.
+    """
+    pricing.refresh_prices()
     conn = get_db_connection()
     try:
-        cursor = conn.execute(
-            "SELECT batch_id, batch_number, quantity, manufacture_date, expiry_date, cost_price, selling_price "
-            "FROM batches WHERE product_id = ? ORDER BY expiry_date",
-            (product_id,)
-        )
+        cursor = conn.execute("""
+            SELECT b.batch_id, b.batch_number, b.quantity, b.manufacture_date, b.expiry_date,
+                   b.cost_price_cents, b.selling_price_cents,
+                   IFNULL(bp.price_cents, b.selling_price_cents) AS price_cents
+            FROM batches b
+            LEFT JOIN batch_prices bp ON bp.batch_id = b.batch_id AND bp.min_quantity = 1
+            WHERE b.product_id = ? ORDER BY b.expiry_date
+        """, (product_id,))
         batches = cursor.fetchall()
         return [dict(row) for row in batches]
     finally:
@@ -651,13 +1202,16 @@ def update_product(product_id, name, category, reorder_level):
     finally:
         conn.close()
 
-def add_batch(product_id, data):
-    """Adds a new batch for a product."""
+def add_batch(product_id, data, user_id=None):
+    """
+    Adds a new batch for a product. The prices in `data` are Money, or
+    amounts in rupees that Money.parse accepts.
+    """
     conn = get_db_connection()
     try:
-        conn.execute(
+        cursor = conn.execute(
             """
-            INSERT INTO batches (product_id, batch_number, quantity, manufacture_date, expiry_date, cost_price, selling_price)
+            INSERT INTO batches (product_id, batch_number, quantity, manufacture_date, expiry_date, cost_price_cents, selling_price_cents)
             VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
             (
@@ -666,10 +1220,232 @@ def add_batch(product_id, data):
                 data['quantity'],
                 data['manufacture_date'],
                 data['expiry_date'],
-                data['cost_price'],
-                data['selling_price']
+                Money.parse(data['cost_price']).cents,
+                Money.parse(data['selling_price']).cents
             )
         )
+        audit.log_event(
+            user_id, AuditEventType.STOCK_ADDED,
+            f"Added batch {data['batch_number']} with {data['quantity']} units.",
+            entity_type='batch', entity_id=cursor.lastrowid, amount=data['quantity'],
+            payload={'product_id': product_id}, conn=conn
+        )
         conn.commit()
     finally:
         conn.close()
+
+# --- Bulk Import Services ---
+
+IMPORT_CHUNK_SIZE = 5000
+PRODUCT_IMPORT_COLUMNS = ['name', 'category']
+BATCH_IMPORT_COLUMNS = ['product_name', 'batch_number', 'quantity', 'expiry_date', 'cost_price', 'selling_price']
+
+def _read_csv_chunks(file_path, required_columns, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Streams a CSV file as lists of (line_number, row) tuples so that large
+    files never have to be held in memory at once.
+    """
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        fieldnames = [name.strip() for name in (reader.fieldnames or [])]
+        missing = [c for c in required_columns if c not in fieldnames]
+        if missing:
+            raise ValueError(f"CSV file is missing required columns: {', '.join(missing)}")
+        reader.fieldnames = fieldnames
+
+        chunk = []
+        for row in reader:
+            chunk.append((reader.line_num, row))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def _csv_value(row, column):
+    """Returns a stripped CSV cell, treating missing cells as empty strings."""
+    return (row.get(column) or '').strip()
+
+def import_inventory_csv(file_path, user_id=None):
+    """
+    Imports a CSV file of either products or batches, depending on its header.
+    A file with a `batch_number` column is treated as a batch import.
+    """
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        header = [name.strip() for name in next(csv.reader(f), [])]
+
+    if 'batch_number' in header:
+        return import_batches_csv(file_path, user_id)
+    return import_products_csv(file_path, user_id)
+
+def import_products_csv(file_path, user_id=None):
+    """
+    Bulk-imports products from a CSV file with `name`, `category` and an optional
+    `reorder_level` column.
+
+    Rows are validated in memory against PRODUCT_CATEGORIES and the existing
+    product names, loaded into a temporary staging table with executemany and
+    then copied into `products` with a single INSERT ... SELECT in one transaction.
+
+    Returns a dict: {'imported': count, 'rejected': [(line_number, reason), ...]}
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        known_names = {row[0] for row in cursor.execute("SELECT name FROM products")}
+        valid_categories = set(PRODUCT_CATEGORIES)
+        rejected = []
+
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS import_products (
+                name TEXT NOT NULL,
+                category TEXT NOT NULL,
+                reorder_level INTEGER NOT NULL
+            )""")
+        cursor.execute("DELETE FROM temp.import_products")
+
+        for chunk in _read_csv_chunks(file_path, PRODUCT_IMPORT_COLUMNS):
+            staged = []
+            for line_number, row in chunk:
+                name = _csv_value(row, 'name')
+                category = _csv_value(row, 'category')
+                reorder_level = _csv_value(row, 'reorder_level') or '10'
+
+                if not name:
+                    rejected.append((line_number, "Product name is empty."))
+                    continue
+                if category not in valid_categories:
+                    rejected.append((line_number, f"Unknown category '{category}'."))
+                    continue
+                if name in known_names:
+                    rejected.append((line_number, f"Product '{name}' already exists."))
+                    continue
+                try:
+                    reorder_level = int(reorder_level)
+                    if reorder_level < 0:
+                        raise ValueError
+                except ValueError:
+                    rejected.append((line_number, f"Invalid reorder level '{reorder_level}'."))
+                    continue
+
+                known_names.add(name)
+                staged.append((name, category, reorder_level))
+
+            cursor.executemany(
+                "INSERT INTO temp.import_products (name, category, reorder_level) VALUES (?, ?, ?)",
+                staged
+            )
+
+        cursor.execute("""
+            INSERT INTO products (name, category, reorder_level)
+            SELECT name, category, reorder_level FROM temp.import_products ORDER BY rowid
+        """)
+        imported = cursor.rowcount
+        cursor.execute("DROP TABLE temp.import_products")
+        if user_id is not None:
+            audit.log_event(user_id, AuditEventType.IMPORT, f"Imported {imported} products from CSV ({len(rejected)} rejected).",
+                            entity_type='product', amount=imported, payload={'rejected': len(rejected)}, conn=conn)
+        conn.commit()
+    except (sqlite3.Error, ValueError) as e:
+        conn.rollback()
+        raise e
+    finally:
+        conn.close()
+
+    return {'imported': imported, 'rejected': rejected}
+
+def import_batches_csv(file_path, user_id=None):
+    """
+    Bulk-imports batches from a CSV file with `product_name`, `batch_number`,
+    `quantity`, `expiry_date`, `cost_price`, `selling_price` and an optional
+    `manufacture_date` column.
+
+    Product names are resolved against a single lookup of all products, valid
+    rows are staged with executemany and copied into `batches` with one
+    INSERT ... SELECT, all inside one transaction.
+
+    Returns a dict: {'imported': count, 'rejected': [(line_number, reason), ...]}
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        product_ids = {row[1]: row[0] for row in cursor.execute("SELECT product_id, name FROM products")}
+        rejected = []
+
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS import_batches (
+                product_id INTEGER NOT NULL,
+                batch_number TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                manufacture_date DATE,
+                expiry_date DATE,
+                cost_price_cents INTEGER NOT NULL,
+                selling_price_cents INTEGER NOT NULL
+            )""")
+        cursor.execute("DELETE FROM temp.import_batches")
+
+        for chunk in _read_csv_chunks(file_path, BATCH_IMPORT_COLUMNS):
+            staged = []
+            for line_number, row in chunk:
+                product_name = _csv_value(row, 'product_name')
+                product_id = product_ids.get(product_name)
+                if product_id is None:
+                    rejected.append((line_number, f"Unknown product '{product_name}'."))
+                    continue
+
+                batch_number = _csv_value(row, 'batch_number')
+                if not batch_number:
+                    rejected.append((line_number, "Batch number is empty."))
+                    continue
+
+                try:
+                    quantity = int(_csv_value(row, 'quantity'))
+                    cost_price = Money.parse(_csv_value(row, 'cost_price'))
+                    selling_price = Money.parse(_csv_value(row, 'selling_price'))
+                except ValueError:
+                    rejected.append((line_number, "Quantity and prices must be numeric."))
+                    continue
+                if quantity <= 0 or cost_price.cents < 0 or selling_price.cents < 0:
+                    rejected.append((line_number, "Quantity must be positive and prices cannot be negative."))
+                    continue
+
+                manufacture_date = _csv_value(row, 'manufacture_date') or None
+                expiry_date = _csv_value(row, 'expiry_date')
+                try:
+                    expiry = date.fromisoformat(expiry_date)
+                    if manufacture_date and date.fromisoformat(manufacture_date) > expiry:
+                        rejected.append((line_number, "Expiry date is before the manufacture date."))
+                        continue
+                except ValueError:
+                    rejected.append((line_number, "Dates must be in YYYY-MM-DD format."))
+                    continue
+
+                staged.append((product_id, batch_number, quantity, manufacture_date, expiry_date, cost_price.cents, selling_price.cents))
+
+            cursor.executemany(
+                """
+                INSERT INTO temp.import_batches
+                    (product_id, batch_number, quantity, manufacture_date, expiry_date, cost_price_cents, selling_price_cents)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                staged
+            )
+
+        cursor.execute("""
+            INSERT INTO batches (product_id, batch_number, quantity, manufacture_date, expiry_date, cost_price_cents, selling_price_cents)
+            SELECT product_id, batch_number, quantity, manufacture_date, expiry_date, cost_price_cents, selling_price_cents
+            FROM temp.import_batches ORDER BY rowid
+        """)
+        imported = cursor.rowcount
+        cursor.execute("DROP TABLE temp.import_batches")
+        if user_id is not None:
+            audit.log_event(user_id, AuditEventType.IMPORT, f"Imported {imported} batches from CSV ({len(rejected)} rejected).",
+                            entity_type='batch', amount=imported, payload={'rejected': len(rejected)}, conn=conn)
+        conn.commit()
+    except (sqlite3.Error, ValueError) as e:
+        conn.rollback()
+        raise e
+    finally:
+        conn.close()
+
+    return {'imported': imported, 'rejected': rejected}
@@ -0,0 +1,155 @@
+"""
+Time Series Layer: Sales over time, bucketed by hour, day or week.
+
+Sales are counted per hour by triggers into sales_hourly (see
+database._create_sales_series_tables), so even years of history are a few
+tens of thousands of buckets. Those are held in memory as sorted NumPy
+columns; each call first fetches only the buckets changed since the last
+one, so a new sale costs one row, not a reload.
+
+A series is then built for a chart of a given width: the finest of hour, day
+or week that fits is chosen, and when even weeks are more than there are
+pixels, consecutive buckets are merged into one point per pixel. Each point
+keeps the lowest and highest bucket it covers, so peaks stay visible.
+"""
+import math
+import threading
+from datetime import date, timedelta
+import numpy as np
+from database import get_db_connection
+
+GRANULARITIES = ('hour', 'day', 'week')
+BUCKET_HOURS = {'hour': 1, 'day': 24, 'week': 24 * 7}
+
+_cache_lock = threading.Lock()
+# Sorted by hour: hours since 1970-01-01 00:00, sale counts and amounts.
+_cache = {
+    'seq': None,
+    'hours': np.empty(0, dtype=np.int64),
+    'counts': np.empty(0, dtype=np.int64),
+    'amounts': np.empty(0, dtype=np.int64),
+}
+
+def _to_hours(labels):
+    """'YYYY-MM-DD HH' strings -> hours since the epoch."""
+    return np.array([label.replace(' ', 'T') for label in labels], dtype='datetime64[h]').astype(np.int64)
+
+def _merge(rows, full):
+    """Merges changed sales_hourly rows, in any order, into the cache (under _cache_lock)."""
+    if not rows:
+        return
+    hours = _to_hours([row[0] for row in rows])
+    counts = np.array([row[1] for row in rows], dtype=np.int64)
+    amounts = np.array([row[2] for row in rows], dtype=np.int64)
+    # np.insert below keeps new buckets that share a position in the order given.
+    order = np.argsort(hours)
+    hours, counts, amounts = hours[order], counts[order], amounts[order]
+    if full:
+        _cache.update(hours=hours, counts=counts, amounts=amounts)
+        return
+
+    # New arrays rather than in-place writes: callers may still be reading the old ones.
+    positions = np.searchsorted(_cache['hours'], hours)
+    known = positions < len(_cache['hours'])
+    known[known] = _cache['hours'][positions[known]] == hours[known]
+    merged = {'hours': _cache['hours'].copy(), 'counts': _cache['counts'].copy(), 'amounts': _cache['amounts'].copy()}
+    merged['counts'][positions[known]] = counts[known]
+    merged['amounts'][positions[known]] = amounts[known]
+    new = ~known
+    for name, values in (('hours', hours), ('counts', counts), ('amounts', amounts)):
+        _cache[name] = np.insert(merged[name], positions[new], values[new])
+
+def _refresh_buckets():
+    """
+    Brings the in-memory buckets up to date and returns (hours, counts,
+    amounts). Only buckets with a seq above the last one seen are read; a
+    lower seq than seen (e.g. after a restore from backup) reloads them all.
+    """
+    conn = get_db_connection()
+    try:
+        with _cache_lock:
+            latest = conn.execute("SELECT IFNULL(MAX(seq), 0) FROM sales_hourly").fetchone()[0]
+            seen = _cache['seq']
+            if seen is None or latest < seen:
+                rows = conn.execute("SELECT hour, sale_count, total_amount_cents FROM sales_hourly").fetchall()
+                _merge(rows, full=True)
+            elif latest > seen:
+                rows = conn.execute(
+                    "SELECT hour, sale_count, total_amount_cents FROM sales_hourly WHERE seq > ?", (seen,)
+                ).fetchall()
+                _merge(rows, full=False)
+            _cache['seq'] = latest
+            return _cache['hours'], _cache['counts'], _cache['amounts']
+    finally:
+        conn.close()
+
+def _choose_granularity(first_hour, end_hour, max_points):
+    """The finest granularity with no more buckets than max_points, else 'week'."""
+    for granularity in GRANULARITIES:
+        if math.ceil((end_hour - first_hour) / BUCKET_HOURS[granularity]) <= max_points:
+            return granularity
+    return 'week'
+
+def _hour_of(day):
+    return int(np.datetime64(day, 'h').astype(np.int64))
+
+def get_sales_series(start_date=None, end_date=None, max_points=1000, granularity=None):
+    """
+    Returns the sales from start_date to end_date (inclusive; default: the
+    first day with sales, and today) as at most max_points points, e.g. the
+    chart's width in pixels.
+
+    granularity is 'hour', 'day', 'week', or None for the finest that fits.
+    Weeks start on Monday. Returns a dict:
+        {'granularity':, 'buckets_per_point':, 'bucket_count':,
+         'starts': [datetime64[h] of each point's first bucket],
+         'sale_count': [...], 'total_cents': [...],
+         'low_cents': [...], 'high_cents': [...]}
+    The lists are NumPy arrays; low/high are the smallest and largest bucket
+    within each point, and equal total_cents when buckets_per_point is 1.
+    """
+    if granularity is not None and granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity!r}")
+    max_points = max(1, int(max_points))
+    hours, counts, amounts = _refresh_buckets()
+
+    end_date = end_date or date.today()
+    if start_date is None:
+        start_date = np.datetime64(int(hours[0]), 'h').astype('datetime64[D]').item() if len(hours) else end_date
+    if start_date > end_date:
+        raise ValueError("The start date is after the end date.")
+    start_hour = _hour_of(start_date)
+    end_hour = _hour_of(end_date + timedelta(days=1))
+
+    granularity = granularity or _choose_granularity(start_hour, end_hour, max_points)
+    size = BUCKET_HOURS[granularity]
+    first_hour = start_hour
+    if granularity == 'week':
+        # Day 0 (1970-01-01) was a Thursday, three days after a Monday.
+        first_hour -= ((start_hour // 24 + 3) % 7) * 24
+    bucket_count = math.ceil((end_hour - first_hour) / size)
+
+    lo, hi = np.searchsorted(hours, [start_hour, end_hour])
+    index = (hours[lo:hi] - first_hour) // size
+    bucket_counts = np.bincount(index, weights=counts[lo:hi], minlength=bucket_count).astype(np.int64)
+    bucket_amounts = np.bincount(index, weights=amounts[lo:hi], minlength=bucket_count).astype(np.int64)
+
+    # One point per group of consecutive buckets; the last group is padded.
+    per_point = math.ceil(bucket_count / max_points)
+    points = math.ceil(bucket_count / per_point)
+    padding = points * per_point - bucket_count
+    grouped = np.pad(bucket_amounts, (0, padding)).reshape(points, per_point)
+    # Padding is less than a group, so every group has a real bucket for min().
+    low = np.pad(bucket_amounts, (0, padding), constant_values=np.iinfo(np.int64).max)
+    low = low.reshape(points, per_point).min(axis=1)
+
+    return {
+        'granularity': granularity,
+        'buckets_per_point': per_point,
+        'bucket_count': bucket_count,
+        'starts': (first_hour + np.arange(points) * per_point * size).astype('datetime64[h]'),
+        'sale_count': np.pad(bucket_counts, (0, padding)).reshape(points, per_point).sum(axis=1),
+        'total_cents': grouped.sum(axis=1),
+        'low_cents': low,
+        'high_cents': grouped.max(axis=1),
+    }
@@ -0,0 +1,77 @@
+import os
+import sys
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import archive
+import backup
+import database
+import forecasting
+import recovery
+import report_cache
+import services
+import timeseries
+
+
+@pytest.fixture(autouse=True)
+def db(tmp_path, monkeypatch):
+    """A fresh encrypted database, key file and archive/backup directories per test."""
+    db_file = str(tmp_path / "inventory.db")
+    monkeypatch.setattr(database, 'DB_FILE', db_file)
+    monkeypatch.setattr(database, 'KEY_FILE', str(tmp_path / "db.key"))
+    monkeypatch.setattr(database, '_db_key', None)
+    monkeypatch.setattr(recovery, 'DB_FILE', db_file)
+    monkeypatch.setattr(recovery, 'QUARANTINE_DIR', str(tmp_path / "quarantine"))
+    monkeypatch.setattr(archive, 'ARCHIVE_DIR', str(tmp_path / "archive"))
+    monkeypatch.setattr(backup, 'BACKUP_DIR', str(tmp_path / "backups"))
+
+    monkeypatch.setattr(report_cache, '_cache', OrderedDict())
+    monkeypatch.setattr(report_cache, '_cache_bytes', 0)
+    monkeypatch.setattr(forecasting, '_cache', {'key': None, 'forecast': None})
+    monkeypatch.setattr(timeseries, '_cache', {
+        'seq': None,
+        'hours': np.empty(0, dtype=np.int64),
+        'counts': np.empty(0, dtype=np.int64),
+        'amounts': np.empty(0, dtype=np.int64),
+    })
+
+    database.initialize_database()
+    return db_file
+
+
+@pytest.fixture
+def customer_id():
+    return services.add_customer("Corner Shop", "0771234567", "Main Street")['customer_id']
+
+
+@pytest.fixture
+def make_product(add_batch):
+    """Adds a product with one batch and returns its product_id."""
+    def make(name, quantity=10, category='Water', selling_price='100.00', cost_price='60.00',
+             expiry_date=None, batch_number=None):
+        services.add_product(name, category, 5)
+        product_id = next(p['product_id'] for p in services.get_all_products() if p['name'] == name)
+        add_batch(product_id, quantity, selling_price, cost_price, expiry_date, batch_number)
+        return product_id
+    return make
+
+
+@pytest.fixture
+def add_batch():
+    """Adds a batch to a product; expiry_date is a 'YYYY-MM-DD' string, default a year from today."""
+    def add(product_id, quantity, selling_price='100.00', cost_price='60.00', expiry_date=None, batch_number=None):
+        today = date.today()
+        services.add_batch(product_id, {
+            'batch_number': batch_number or f"B-{product_id}-{quantity}-{expiry_date}",
+            'quantity': quantity,
+            'manufacture_date': today.strftime('%Y-%m-%d'),
+            'expiry_date': expiry_date or (today + timedelta(days=365)).strftime('%Y-%m-%d'),
+            'cost_price': cost_price,
+            'selling_price': selling_price,
+        })
+    return add
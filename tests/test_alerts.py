@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+import alerts
+import services
+from database import get_db_connection
+
+
+def _in_days(days):
+    return (date.today() + timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def test_reading_alerts_does_not_write(make_product):
+    make_product("Still Water", expiry_date=_in_days(5))
+    conn = get_db_connection()
+    try:
+        conn.execute("INSERT OR REPLACE INTO alert_settings (key, value) VALUES ('near_expiry_rolled_forward_on', '2000-01-01')")
+        conn.commit()
+    finally:
+        conn.close()
+
+    services.get_near_expiry_items()
+    services.get_dashboard_stats()
+
+    conn = get_db_connection()
+    try:
+        rolled_on = conn.execute(
+            "SELECT value FROM alert_settings WHERE key = 'near_expiry_rolled_forward_on'"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    assert rolled_on == '2000-01-01'
+
+
+def test_roll_forward_leaves_the_callers_transaction_open(make_product):
+    make_product("Still Water", expiry_date=_in_days(40))
+    tomorrow = date.today() + timedelta(days=15)
+
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN")
+        result = alerts.roll_forward_expiry_alerts(today=tomorrow, conn=conn)
+        assert result == {'added': 1, 'removed': 0}
+        assert conn.in_transaction
+        conn.rollback()
+    finally:
+        conn.close()
+
+    assert services.get_near_expiry_items() == []
+
+
+def test_roll_forward_moves_the_window(make_product):
+    make_product("Still Water", expiry_date=_in_days(40))
+    make_product("Sparkling Water", expiry_date=_in_days(3))
+    assert [item['name'] for item in services.get_near_expiry_items()] == ["Sparkling Water"]
+
+    result = alerts.roll_forward_expiry_alerts(today=date.today() + timedelta(days=15))
+
+    assert result == {'added': 1, 'removed': 1}
+    assert [item['name'] for item in services.get_near_expiry_items()] == ["Still Water"]
+    assert alerts.roll_forward_expiry_alerts(today=date.today() + timedelta(days=15)) == {'added': 0, 'removed': 0}
@@ -0,0 +1,81 @@
+from datetime import date
+
+import numpy as np
+
+import analytics
+import services
+
+
+def _products(*stocks):
+    return [{'product_id': i + 1, 'name': f"P{i + 1}", 'category': 'Water', 'stock': stock}
+            for i, stock in enumerate(stocks)]
+
+
+def _by_name(result):
+    return {row['name']: row for row in result['products']}
+
+
+def test_abc_classes_follow_the_revenue_share_ranked_above():
+    # Revenue shares 40, 30, 20, 6 and 4 percent, and a product without sales.
+    revenue = [4000, 3000, 2000, 600, 400]
+    sales = np.array([[i + 1, 0, 1, cents, 0] for i, cents in enumerate(revenue)], dtype=np.int64)
+
+    result = _by_name(analytics._compute(_products(0, 0, 0, 0, 0, 0), sales, 7))
+
+    # P3 is A: only 70% of revenue ranks above it, though it takes the total to 90%.
+    assert {name: row['abc'] for name, row in result.items()} == {
+        'P1': 'A', 'P2': 'A', 'P3': 'A', 'P4': 'B', 'P5': 'C', 'P6': 'C'
+    }
+    assert [row['revenue_share'] for row in result.values()][:5] == [40.0, 30.0, 20.0, 6.0, 4.0]
+
+
+def test_xyz_classes_follow_the_weekly_variation_of_demand():
+    sales = np.array([
+        [1, 0, 7, 0, 0], [1, 7, 7, 0, 0],      # 1/day in both weeks: cv 0
+        [2, 0, 12, 0, 0], [2, 7, 2, 0, 0],     # rates 12/7 and 2/7: cv 5/7
+        [3, 0, 14, 0, 0],                      # all in the first week: cv 1
+    ], dtype=np.int64)
+
+    result = _by_name(analytics._compute(_products(0, 0, 0, 0), sales, 14))
+
+    assert [(result[p]['cv'], result[p]['xyz']) for p in ('P1', 'P2', 'P3', 'P4')] == [
+        (0.0, 'X'), (0.71, 'Y'), (1.0, 'Z'), (None, 'Z')
+    ]
+
+
+def test_short_last_week_is_scaled_to_a_daily_rate():
+    sales = np.array([[1, day, 1, 0, 0] for day in range(10)], dtype=np.int64)
+
+    result = _by_name(analytics._compute(_products(0), sales, 10))
+
+    assert (result['P1']['cv'], result['P1']['xyz']) == (0.0, 'X')
+
+
+def test_margin_and_sell_through():
+    sales = np.array([
+        [1, 0, 3, 3000, 1800],
+        [1, 1, 1, 1000, 600],
+        [7, 0, 5, 5000, 0],     # a product deleted since
+    ], dtype=np.int64)
+
+    result = analytics._compute(_products(12, 0), sales, 2)
+    row = _by_name(result)['P1']
+
+    assert (row['units_sold'], row['margin_cents'], row['margin_percent']) == (4, 1600, 40.0)
+    assert row['sell_through'] == 25.0
+    assert _by_name(result)['P2']['margin_percent'] is None
+    assert result['totals'] == {'revenue_cents': 4000, 'cogs_cents': 2400, 'margin_cents': 1600, 'units_sold': 4}
+
+
+def test_product_analytics_read_the_sales_of_the_period(make_product):
+    product_id = make_product("Still Water", quantity=10, selling_price='100.00', cost_price='60.00')
+    make_product("Orange Juice", category='Juice')
+    services.create_sale(1, None, [{'product_id': product_id, 'quantity': 2}])
+    today = date.today()
+
+    result = analytics.get_product_analytics(today, today)
+
+    water = result['products'][0]
+    assert (water['name'], water['abc'], water['units_sold']) == ("Still Water", 'A', 2)
+    assert (water['revenue_cents'], water['margin_percent'], water['sell_through']) == (20000, 40.0, 20.0)
+    assert _by_name(result)["Orange Juice"]['abc'] == 'C'
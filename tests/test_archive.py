@@ -0,0 +1,123 @@
+import os
+from datetime import date
+
+import archive
+import audit
+import recovery
+import services
+from database import get_db_connection, open_encrypted_connection
+
+LAST_YEAR = date.today().year - 1
+
+
+def _add_sale(sale_date, product_id, quantity=1, price_cents=10000):
+    conn = get_db_connection()
+    try:
+        sale_id = conn.execute(
+            "INSERT INTO sales (user_id, sale_date, total_amount_cents) VALUES (1, ?, ?)",
+            (sale_date, quantity * price_cents)
+        ).lastrowid
+        batch_id = conn.execute("SELECT batch_id FROM batches WHERE product_id = ?", (product_id,)).fetchone()[0]
+        conn.execute(
+            "INSERT INTO sale_items (sale_id, batch_id, quantity_sold, price_per_unit_cents) VALUES (?, ?, ?, ?)",
+            (sale_id, batch_id, quantity, price_cents)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _report_totals(start_date, end_date):
+    chunks = list(services.stream_sales_report(start_date, end_date))
+    return sum(len(chunk['rows']) for chunk in chunks), chunks[-1]['totals']
+
+
+def test_closed_years_move_to_the_archive_and_stay_in_reports(make_product):
+    product_id = make_product("Still Water")
+    _add_sale(f"{LAST_YEAR}-03-01 10:00:00", product_id, quantity=2)
+    _add_sale(f"{date.today()} 10:00:00", product_id)
+    before = _report_totals(date(LAST_YEAR, 1, 1), date.today())
+
+    results = archive.archive_closed_years()
+
+    assert [(r['year'], r['sales'], r['sale_items']) for r in results] == [(LAST_YEAR, 1, 1)]
+    assert archive.get_archived_years() == [LAST_YEAR]
+    conn = get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 1
+        rollup = conn.execute("SELECT sale_count, total_revenue_cents FROM sales_daily_rollups").fetchone()
+        assert tuple(rollup) == (1, 20000)
+    finally:
+        conn.close()
+    assert _report_totals(date(LAST_YEAR, 1, 1), date.today()) == before
+
+
+def test_reports_read_archives_without_writing(make_product):
+    product_id = make_product("Still Water")
+    _add_sale(f"{LAST_YEAR}-03-01 10:00:00", product_id)
+    archive.archive_closed_years()
+
+    conn = get_db_connection()
+    try:
+        assert archive.attach_archives_for_range(conn, date(LAST_YEAR, 1, 1), date.today()) == [LAST_YEAR]
+        assert conn.execute("SELECT COUNT(*) FROM all_sales").fetchone()[0] == 1
+        assert conn.total_changes == 0
+        assert not conn.in_transaction
+    finally:
+        conn.close()
+
+
+def test_old_archives_are_upgraded_at_startup():
+    os.makedirs(archive.ARCHIVE_DIR)
+    conn = open_encrypted_connection(archive.get_archive_path(LAST_YEAR))
+    try:
+        conn.execute("""
+            CREATE TABLE sales (sale_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, customer_id INTEGER,
+                                sale_date TIMESTAMP, total_amount REAL NOT NULL, discount_applied REAL NOT NULL DEFAULT 0)
+        """)
+        conn.execute("INSERT INTO sales VALUES (1, 1, NULL, ?, 12.345, 0.5)", (f"{LAST_YEAR}-03-01 10:00:00",))
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert recovery.check_database_on_startup()['status'] == 'ok'
+
+    conn = open_encrypted_connection(archive.get_archive_path(LAST_YEAR))
+    try:
+        row = conn.execute("SELECT total_amount_cents, discount_applied_cents FROM sales").fetchone()
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    assert row == (1235, 50)
+    assert {'sales', 'sale_items', 'activity_logs'} <= tables
+
+
+def test_reports_and_logs_read_more_archives_than_can_be_attached(make_product):
+    product_id = make_product("Still Water")
+    years = list(range(LAST_YEAR - archive.MAX_ATTACHED_ARCHIVES - 1, LAST_YEAR + 1))
+    conn = get_db_connection()
+    try:
+        conn.executemany(
+            "INSERT INTO activity_logs (user_id, timestamp, action_description, event_type) VALUES (1, ?, ?, 'sale')",
+            [(f"{year}-06-01 10:00:00", f"Sale in {year}.") for year in years]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    for year in years:
+        _add_sale(f"{year}-06-01 10:00:00", product_id)
+    archive.archive_closed_years()
+    assert archive.get_archived_years() == years
+
+    count, totals = _report_totals(date(years[0], 1, 1), date.today())
+    assert (count, totals['total_revenue'].cents) == (len(years), 10000 * len(years))
+    performance = services.get_product_performance_report(date(years[0], 1, 1), date.today())
+    assert performance[0]['total_quantity_sold'] == len(years)
+
+    first = audit.get_activity_logs(event_type='sale', limit=len(years) - 1)
+    rest = audit.get_activity_logs(event_type='sale', after=first['next'], limit=len(years) - 1)
+    newest_first = [f"Sale in {year}." for year in reversed(years)]
+    assert [row['action_description'] for row in first['rows'] + rest['rows']] == newest_first
+    assert [row['action_description'] for row in audit.get_activity_logs(text=str(years[0]))['rows']] == [
+        f"Sale in {years[0]}."
+    ]
@@ -0,0 +1,109 @@
+import csv
+from datetime import date
+
+import archive
+import audit
+import services
+from database import get_db_connection, initialize_database
+
+LAST_YEAR = date.today().year - 1
+
+
+def _add_logs(entries):
+    conn = get_db_connection()
+    try:
+        conn.executemany(
+            "INSERT INTO activity_logs (user_id, timestamp, action_description, event_type) VALUES (1, ?, ?, ?)",
+            entries
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _descriptions(result):
+    return [row['action_description'] for row in result['rows']]
+
+
+def _archive_logs():
+    _add_logs([
+        (f"{LAST_YEAR}-02-01 09:00:00", "Created new sale with ID 1.", 'sale'),
+        (f"{LAST_YEAR}-11-30 09:00:00", "Imported 5 products.", 'import'),
+        (f"{date.today()} 00:00:01", "Created new sale with ID 2.", 'sale'),
+    ])
+    archive.archive_closed_years()
+    conn = get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM activity_logs").fetchone()[0] == 1
+    finally:
+        conn.close()
+
+
+def test_archived_logs_are_still_listed_in_order():
+    _archive_logs()
+
+    first = audit.get_activity_logs(limit=2)
+    second = audit.get_activity_logs(after=first['next'], limit=2)
+
+    assert _descriptions(first) == ["Created new sale with ID 2.", "Imported 5 products."]
+    assert _descriptions(second) == ["Created new sale with ID 1."]
+    assert second['next'] is None
+    assert first['rows'][0]['username'] == 'admin'
+
+
+def test_archived_logs_match_filters():
+    _archive_logs()
+
+    assert _descriptions(audit.get_activity_logs(event_type='sale')) == [
+        "Created new sale with ID 2.", "Created new sale with ID 1."
+    ]
+    assert _descriptions(audit.get_activity_logs(text="import")) == ["Imported 5 products."]
+    assert _descriptions(audit.get_activity_logs(
+        start_date=date(LAST_YEAR, 1, 1), end_date=date(LAST_YEAR, 6, 30)
+    )) == ["Created new sale with ID 1."]
+
+
+def test_export_includes_archived_logs(tmp_path):
+    _archive_logs()
+    path = tmp_path / "activity.csv"
+
+    assert audit.export_activity_logs(str(path)) == 3
+
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['action_description'] for row in rows] == [
+        "Created new sale with ID 2.", "Imported 5 products.", "Created new sale with ID 1."
+    ]
+
+
+def test_sales_log_their_totals_in_cents(make_product):
+    product_id = make_product("Still Water", quantity=10, selling_price='33.33')
+    services.create_sale(1, None, [{'product_id': product_id, 'quantity': 3}], discount=10)
+
+    rows = {row['event_type']: row for row in audit.get_activity_logs()['rows']}
+
+    assert (rows['sale']['amount'], rows['sale']['amount_cents']) == (None, 8999)
+    assert (rows['discount']['amount'], rows['discount']['amount_cents']) == (10, 1000)
+    assert _descriptions(audit.get_activity_logs(min_amount_cents=5000)) == [rows['sale']['action_description']]
+    assert audit.get_activity_logs(min_amount=50)['rows'] == []
+
+
+def test_logged_sale_totals_move_to_cents():
+    conn = get_db_connection()
+    try:
+        conn.execute("ALTER TABLE activity_logs DROP COLUMN amount_cents")
+        conn.execute("PRAGMA user_version = 6")
+        conn.execute("""
+            INSERT INTO activity_logs (user_id, action_description, event_type, amount)
+            VALUES (1, 'Created new sale with ID 1.', 'sale', 12.5), (1, 'Added 4 units.', 'stock_added', 4)
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
+    initialize_database()
+
+    rows = audit.get_activity_logs()['rows']
+    assert sorted((row['event_type'], row['amount'], row['amount_cents']) for row in rows) == [
+        ('sale', None, 1250), ('stock_added', 4, None)
+    ]
@@ -0,0 +1,51 @@
+import os
+from datetime import datetime
+
+import backup
+
+
+def test_backup_with_its_own_key_verifies_only_with_that_key():
+    key = "it's a \"quoted\" passphrase; --"
+
+    path = backup.create_backup(backup_key=key, sleep=0)['path']
+
+    assert backup.verify_backup(path, key)
+    assert not backup.verify_backup(path)
+    assert not backup.verify_backup(path, "another passphrase")
+
+
+def test_backup_verifies_with_database_key():
+    path = backup.create_backup(sleep=0)['path']
+
+    assert backup.verify_backup(path)
+
+
+def test_backups_in_the_same_second_do_not_collide(monkeypatch):
+    frozen = datetime(2026, 10, 19, 12, 0, 0, 500)
+
+    class FrozenClock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return frozen
+
+    monkeypatch.setattr(backup, 'datetime', FrozenClock)
+    first = backup.create_backup(sleep=0)['path']
+    second = backup.create_backup(sleep=0)['path']
+
+    assert first != second
+    assert backup.list_backups() == [second, first]
+
+
+def test_rotation_keeps_the_newest_generations():
+    paths = [backup.create_backup(sleep=0, keep=2)['path'] for _ in range(3)]
+
+    assert backup.list_backups() == [paths[2], paths[1]]
+
+
+def test_older_second_resolution_names_sort_before_newer_ones():
+    os.makedirs(backup.BACKUP_DIR)
+    names = ["inventory-20261019-120000.db", "inventory-20261019-120000-000001.db", "inventory-20261019-115959-999999.db"]
+    for name in names:
+        open(os.path.join(backup.BACKUP_DIR, name), 'w').close()
+
+    assert [os.path.basename(path) for path in backup.list_backups()] == [names[1], names[0], names[2]]
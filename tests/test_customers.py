@@ -0,0 +1,74 @@
+import services
+from database import get_db_connection, initialize_database
+
+
+def _add(name, phone, address=""):
+    return services.add_customer(name, phone, address)['customer_id']
+
+
+def test_search_matches_name_phone_and_address():
+    corner = _add("Corner Shop", "077 123 4567", "12 Main Street")
+    kiosk = _add("Station Kiosk", "0119876543", "Railway Road")
+
+    assert [c['customer_id'] for c in services.search_customers("corner")] == [corner]
+    assert [c['customer_id'] for c in services.search_customers("0119")] == [kiosk]
+    assert [c['customer_id'] for c in services.search_customers("railway ro")] == [kiosk]
+    assert services.search_customers("main kiosk") == []
+    assert [c['name'] for c in services.search_customers("")] == ["Corner Shop", "Station Kiosk"]
+
+
+def test_blank_contact_fields_are_stored_as_null():
+    customer = services.add_customer("Corner Shop", "  ", " ")
+
+    assert (customer['phone'], customer['address']) == (None, None)
+    assert services.find_duplicate_customers() == []
+
+
+def test_duplicates_by_phone_ignore_formatting():
+    first = _add("Corner Shop", "+94 (77) 123-4567")
+    second = _add("Corner Store", "94771234567")
+    _add("Station Kiosk", "0119876543")
+
+    assert services.find_duplicate_customers() == [
+        {'match': 'phone', 'key': '94771234567', 'customer_ids': [first, second]}
+    ]
+
+
+def test_duplicates_by_name_and_address_ignore_case_and_spaces():
+    first = _add("Corner Shop", "0771234567", "12 Main Street")
+    second = _add("  corner shop ", "0719999999", "12 MAIN STREET ")
+    _add("Corner Shop", "0720000000", "3 Lake Road")
+
+    assert services.find_duplicate_customers() == [
+        {'match': 'name_address', 'key': 'corner shop|12 main street', 'customer_ids': [first, second]}
+    ]
+
+
+def test_old_contact_info_is_split_into_phone_and_address():
+    conn = get_db_connection()
+    try:
+        for trigger in ('insert', 'update', 'delete'):
+            conn.execute(f"DROP TRIGGER customers_fts_{trigger}")
+        conn.execute("DROP TABLE customers_fts")
+        conn.execute("DROP INDEX idx_customers_phone")
+        conn.execute("ALTER TABLE customers DROP COLUMN phone")
+        conn.execute("ALTER TABLE customers DROP COLUMN address")
+        conn.executemany("INSERT INTO customers (name, contact_info) VALUES (?, ?)", [
+            ("Corner Shop", "Phone: 0771234567, Address: 12 Main Street"),
+            ("Station Kiosk", "Phone: , Address: Railway Road"),
+            ("Market Stall", "ask at the gate"),
+        ])
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+    finally:
+        conn.close()
+
+    initialize_database()
+
+    customers = {c['name']: (c['phone'], c['address']) for c in services.search_customers("")}
+    assert customers == {
+        "Corner Shop": ("0771234567", "12 Main Street"),
+        "Station Kiosk": (None, "Railway Road"),
+        "Market Stall": (None, None),
+    }
+    assert [c['name'] for c in services.search_customers("railway")] == ["Station Kiosk"]
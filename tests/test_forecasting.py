@@ -0,0 +1,79 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+import forecasting
+import services
+from database import get_db_connection
+
+
+def _record_daily_sales(product_id, units_per_day, days, end=None):
+    """Records a sale of units_per_day on each of the `days` days before `end` (default today)."""
+    end = end or date.today()
+    conn = get_db_connection()
+    try:
+        batch_id = conn.execute("SELECT batch_id FROM batches WHERE product_id = ?", (product_id,)).fetchone()[0]
+        for age in range(1, days + 1):
+            sale_id = conn.execute(
+                "INSERT INTO sales (user_id, sale_date, total_amount_cents) VALUES (1, ?, 0)",
+                (f"{end - timedelta(days=age)} 12:00:00",)
+            ).lastrowid
+            conn.execute(
+                "INSERT INTO sale_items (sale_id, batch_id, quantity_sold, price_per_unit_cents) VALUES (?, ?, ?, 0)",
+                (sale_id, batch_id, units_per_day)
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_smoothing_weights_match_recursive_smoothing():
+    history = np.array([3.0, 0.0, 5.0, 2.0, 8.0, 1.0])
+    level = history[0]
+    for value in history[1:]:
+        level = forecasting.SMOOTHING_ALPHA * value + (1 - forecasting.SMOOTHING_ALPHA) * level
+
+    weights = forecasting._smoothing_weights(len(history), forecasting.SMOOTHING_ALPHA)
+
+    assert np.isclose(weights.sum(), 1)
+    assert np.isclose(history @ weights, level)
+
+
+def test_steady_demand_forecast_and_suggestion(make_product):
+    product_id = make_product("Still Water", quantity=10)
+    _record_daily_sales(product_id, 2, forecasting.HISTORY_DAYS)
+
+    forecast = forecasting.forecast_demand()[0]
+
+    assert (forecast['sma'], forecast['smoothed']) == (2.0, 2.0)
+    assert forecast['days_of_cover'] == 5.0
+    cover = 2 * (forecasting.LEAD_TIME_DAYS + forecasting.COVER_DAYS)
+    assert forecast['suggested_quantity'] == cover - 10
+
+
+def test_products_without_sales_are_topped_up_to_their_reorder_level(make_product):
+    make_product("Still Water", quantity=2)
+    make_product("Sparkling Water", quantity=50)
+
+    suggestions = forecasting.get_reorder_suggestions()
+
+    assert [(s['name'], s['days_of_cover'], s['suggested_quantity']) for s in suggestions] == [("Still Water", None, 3)]
+
+
+def test_todays_sales_are_left_out(make_product):
+    product_id = make_product("Still Water", quantity=10)
+    services.create_sale(1, None, [{'product_id': product_id, 'quantity': 4}])
+
+    assert forecasting.forecast_demand()[0]['sma'] == 0
+
+
+def test_forecast_is_cached_until_sales_change(make_product):
+    product_id = make_product("Still Water", quantity=10)
+    first = forecasting.forecast_demand()
+    assert forecasting.forecast_demand() is first
+
+    _record_daily_sales(product_id, 28, 1)
+
+    second = forecasting.forecast_demand()
+    assert second is not first
+    assert second[0]['sma'] == 1.0
@@ -0,0 +1,73 @@
+import pytest
+
+import services
+from database import get_db_connection
+
+
+def _batch_quantities(product_id):
+    return [b['quantity'] for b in services.get_batches_for_product(product_id)]
+
+
+def _reserve(customer_id, product_id, quantity):
+    order_id = services.create_order(customer_id, [{'product_id': product_id, 'quantity': quantity}])
+    services.update_order_statuses([order_id], 'Ready to Pack')
+    result = services.update_order_statuses([order_id], 'Ready to Distribute')
+    assert result['updated'] == [order_id]
+    return order_id
+
+
+def test_sale_cannot_take_reserved_units(make_product, customer_id):
+    product_id = make_product("Still Water", quantity=10)
+    _reserve(customer_id, product_id, 8)
+
+    with pytest.raises(ValueError, match="Available: 2"):
+        services.create_sale(1, None, [{'product_id': product_id, 'quantity': 10}])
+
+    services.create_sale(1, None, [{'product_id': product_id, 'quantity': 2}])
+    assert _batch_quantities(product_id) == [8]
+
+
+def test_products_for_sale_show_unreserved_stock(make_product, customer_id):
+    product_id = make_product("Still Water", quantity=10)
+    _reserve(customer_id, product_id, 8)
+    assert services.get_products_for_sale()[0]['total_stock'] == 2
+
+    _reserve(customer_id, product_id, 2)
+    assert services.get_products_for_sale() == []
+
+
+def test_sale_skips_fully_reserved_batch(make_product, add_batch, customer_id):
+    product_id = make_product("Still Water", quantity=5, expiry_date='2099-01-01', selling_price='100.00')
+    add_batch(product_id, 5, expiry_date='2099-06-01', selling_price='120.00')
+    _reserve(customer_id, product_id, 5)
+
+    product = services.get_products_for_sale()[0]
+    assert product['selling_price_cents'] == 12000
+    assert services.quote_sale([{'product_id': product_id, 'quantity': 5}])['total'].cents == 60000
+
+
+def test_completing_an_order_takes_its_units_out_of_stock(make_product, customer_id):
+    product_id = make_product("Still Water", quantity=10)
+    order_id = _reserve(customer_id, product_id, 8)
+
+    services.update_order_statuses([order_id], 'Completed')
+
+    assert _batch_quantities(product_id) == [2]
+    assert services.get_products_for_sale()[0]['total_stock'] == 2
+    details = services.get_order_details([order_id])[order_id]
+    assert details['items'][0]['quantity_allocated'] == 8
+
+
+def test_stepping_back_releases_reservation(make_product, customer_id):
+    product_id = make_product("Still Water", quantity=10)
+    order_id = _reserve(customer_id, product_id, 8)
+
+    services.update_order_statuses([order_id], 'Ready to Pack')
+
+    assert _batch_quantities(product_id) == [10]
+    assert services.get_products_for_sale()[0]['total_stock'] == 10
+    conn = get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM order_allocations").fetchone()[0] == 0
+    finally:
+        conn.close()
@@ -0,0 +1,59 @@
+import forecasting
+import services
+
+
+def _complete(order_id):
+    for status in ('Ready to Pack', 'Ready to Distribute', 'Completed'):
+        result = services.update_order_statuses([order_id], status)
+        assert result['updated'] == [order_id], result['rejected']
+
+
+def _stock(product_id):
+    return sum(b['quantity'] for b in services.get_batches_for_product(product_id))
+
+
+def test_purchase_order_is_received_into_stock(make_product, customer_id):
+    product_id = make_product("Still Water", quantity=0)
+    order_id = services.create_order(customer_id, [{'product_id': product_id, 'quantity': 5}], 'Purchase')
+    _complete(order_id)
+
+    result = services.receive_orders_into_stock([order_id])
+
+    assert result == {'received': [order_id], 'batches_created': 1, 'skipped': []}
+    assert _stock(product_id) == 5
+    again = services.receive_orders_into_stock([order_id])
+    assert again['received'] == [] and again['skipped'][0][0] == order_id
+
+
+def test_customer_order_filled_from_stock_is_not_received(make_product, customer_id):
+    product_id = make_product("Still Water", quantity=10)
+    order_id = services.create_order(customer_id, [{'product_id': product_id, 'quantity': 5}])
+    _complete(order_id)
+    assert _stock(product_id) == 5
+
+    result = services.receive_orders_into_stock([order_id])
+
+    assert result['received'] == []
+    assert result['skipped'] == [(order_id, "Only purchase orders can be received into stock.")]
+    assert _stock(product_id) == 5
+
+
+def test_purchase_order_reserves_no_stock(make_product, customer_id):
+    product_id = make_product("Still Water", quantity=0)
+    order_id = services.create_order(customer_id, [{'product_id': product_id, 'quantity': 50}], 'Purchase')
+
+    _complete(order_id)
+
+    assert services.get_order_details([order_id])[order_id]['items'][0]['quantity_allocated'] == 0
+
+
+def test_only_open_purchase_orders_count_as_on_order(make_product, customer_id):
+    product_id = make_product("Still Water", quantity=10)
+    services.create_order(customer_id, [{'product_id': product_id, 'quantity': 4}])
+    purchase_id = services.create_order(customer_id, [{'product_id': product_id, 'quantity': 7}], 'Purchase')
+
+    assert forecasting.forecast_demand()[0]['on_order'] == 7
+
+    _complete(purchase_id)
+    services.receive_orders_into_stock([purchase_id])
+    assert forecasting.forecast_demand()[0]['on_order'] == 0
@@ -0,0 +1,90 @@
+import pytest
+
+import audit
+import services
+
+
+def _write_csv(tmp_path, text, name="import.csv"):
+    path = tmp_path / name
+    path.write_bytes(text.encode('utf-8') if isinstance(text, str) else text)
+    return str(path)
+
+
+def _product_names():
+    return [p['name'] for p in services.get_all_products()]
+
+
+def test_product_import_rejects_bad_rows(tmp_path, make_product):
+    make_product("Still Water")
+    path = _write_csv(tmp_path, (
+        "name,category,reorder_level\n"
+        "Orange Juice,Juice,12\n"
+        ",Water,5\n"
+        "Cola,Beer,5\n"
+        "Still Water,Water,5\n"
+        "Orange Juice,Juice,3\n"
+        "Crisps,Snack,-1\n"
+        "Soda,Soft Drink,\n"
+    ))
+
+    result = services.import_inventory_csv(path, user_id=1)
+
+    assert result['imported'] == 2
+    assert result['rejected'] == [
+        (3, "Product name is empty."),
+        (4, "Unknown category 'Beer'."),
+        (5, "Product 'Still Water' already exists."),
+        (6, "Product 'Orange Juice' already exists."),
+        (7, "Invalid reorder level '-1'."),
+    ]
+    assert sorted(_product_names()) == ["Orange Juice", "Soda", "Still Water"]
+    soda = next(p for p in services.get_all_products() if p['name'] == "Soda")
+    assert soda['reorder_level'] == 10
+    event = audit.get_activity_logs(event_type='import')['rows'][0]
+    assert (event['amount'], event['payload']) == (2, '{"rejected":5}')
+
+
+def test_batch_import_parses_prices_and_checks_dates(tmp_path, make_product):
+    product_id = make_product("Still Water", quantity=1)
+    path = _write_csv(tmp_path, (
+        "product_name,batch_number,quantity,manufacture_date,expiry_date,cost_price,selling_price\n"
+        "Still Water,B-100,24,2026-01-01,2027-01-01,\"1,250.5\",1500.005\n"
+        "Sparkling Water,B-101,5,,2027-01-01,10,20\n"
+        "Still Water,,5,,2027-01-01,10,20\n"
+        "Still Water,B-102,many,,2027-01-01,10,20\n"
+        "Still Water,B-103,0,,2027-01-01,10,20\n"
+        "Still Water,B-104,5,2027-02-01,2027-01-01,10,20\n"
+        "Still Water,B-105,5,,01/01/2027,10,20\n"
+    ))
+
+    result = services.import_inventory_csv(path)
+
+    assert result['imported'] == 1
+    assert [reason for _, reason in result['rejected']] == [
+        "Unknown product 'Sparkling Water'.",
+        "Batch number is empty.",
+        "Quantity and prices must be numeric.",
+        "Quantity must be positive and prices cannot be negative.",
+        "Expiry date is before the manufacture date.",
+        "Dates must be in YYYY-MM-DD format.",
+    ]
+    batch = next(b for b in services.get_batches_for_product(product_id) if b['batch_number'] == "B-100")
+    assert (batch['quantity'], batch['cost_price_cents'], batch['selling_price_cents']) == (24, 125050, 150001)
+    assert audit.get_activity_logs(event_type='import')['rows'] == []
+
+
+def test_import_is_all_or_nothing(tmp_path):
+    path = _write_csv(tmp_path, b"name,category\nOrange Juice,Juice\nCola,Soft Drink\nCrisps,Snack\xff\n")
+
+    with pytest.raises(ValueError):
+        services.import_inventory_csv(path, user_id=1)
+
+    assert _product_names() == []
+    assert audit.get_activity_logs(event_type='import')['rows'] == []
+
+
+def test_import_requires_its_columns(tmp_path):
+    path = _write_csv(tmp_path, "name,reorder_level\nOrange Juice,5\n")
+
+    with pytest.raises(ValueError, match="missing required columns: category"):
+        services.import_inventory_csv(path)
@@ -0,0 +1,62 @@
+import database
+import maintenance
+from database import get_db_connection, initialize_database
+
+
+def _auto_vacuum():
+    conn = get_db_connection()
+    try:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_existing_database_is_converted_to_incremental_vacuum_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_FILE', str(tmp_path / "legacy.db"))
+    conn = get_db_connection()
+    try:
+        conn.execute("CREATE TABLE notes (note TEXT)")
+        conn.execute("INSERT INTO notes VALUES ('kept')")
+        conn.commit()
+    finally:
+        conn.close()
+    assert _auto_vacuum() == 0
+
+    assert initialize_database() == {'upgraded': True, 'vacuumed': True}
+    assert _auto_vacuum() == 2
+
+    assert initialize_database() == {'upgraded': False, 'vacuumed': False}
+    conn = get_db_connection()
+    try:
+        conn.execute("PRAGMA user_version = 0")
+        assert conn.execute("SELECT note FROM notes").fetchone()[0] == 'kept'
+    finally:
+        conn.close()
+    assert initialize_database() == {'upgraded': True, 'vacuumed': False}
+
+
+def test_new_database_needs_no_vacuum(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_FILE', str(tmp_path / "new.db"))
+
+    assert initialize_database() == {'upgraded': True, 'vacuumed': False}
+    assert _auto_vacuum() == 2
+
+
+def test_maintenance_returns_its_report_without_printing(capsys):
+    conn = get_db_connection()
+    try:
+        conn.execute("CREATE TABLE scratch (data BLOB)")
+        conn.executemany("INSERT INTO scratch VALUES (randomblob(4000))", [()] * 1000)
+        conn.commit()
+        conn.execute("DELETE FROM scratch")
+        conn.commit()
+    finally:
+        conn.close()
+    capsys.readouterr()
+
+    report = maintenance.run_maintenance()
+
+    assert capsys.readouterr().out == ""
+    assert maintenance.last_maintenance_report is report
+    assert report['pages_released'] >= maintenance.VACUUM_MIN_FREE_PAGES
+    assert report['after']['freelist_count'] < report['before']['freelist_count']
@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+import pytest
+from sqlcipher3 import dbapi2 as sqlite3
+
+import services
+from database import migrate_money_columns
+from models import Money
+
+
+@pytest.mark.parametrize("text, cents", [
+    ("12.50", 1250),
+    ("1,250.5 LKR", 125050),
+    (12.5, 1250),
+    (Decimal("0.005"), 1),
+    ("0.004", 0),
+    ("-0.005", -1),
+])
+def test_parse_rounds_half_up_to_the_cent(text, cents):
+    assert Money.parse(text) == Money(cents)
+
+
+@pytest.mark.parametrize("text", ["abc", "NaN", "Infinity", ""])
+def test_parse_rejects_non_amounts(text):
+    with pytest.raises(ValueError):
+        Money.parse(text)
+
+
+def test_percent_rounds_half_up():
+    assert Money(333).percent(12.5) == Money(42)    # 41.625
+    assert Money(250).percent(1) == Money(3)        # 2.5
+    assert Money(1999).percent(0) == Money(0)
+
+
+def test_sums_are_exact():
+    amounts = [Money.parse("0.10")] * 10
+    assert sum(amounts) == Money(100)
+    assert sum(amounts, Money(0)).to_decimal() == Decimal("1.00")
+    assert 3 * Money(333) - Money(999) == Money(0)
+
+
+def test_format():
+    assert Money(125050).format() == "1250.50 LKR"
+    assert Money(-5).format(currency=False) == "-0.05"
+
+
+def test_sale_discount_is_rounded_to_the_cent(make_product):
+    product_id = make_product("Still Water", selling_price='3.33')
+
+    quote = services.quote_sale([{'product_id': product_id, 'quantity': 1}], discount=12.5)
+
+    assert (quote['subtotal'], quote['discount'], quote['total']) == (Money(333), Money(42), Money(291))
+
+
+def test_real_money_columns_are_migrated_to_cents():
+    conn = sqlite3.connect(":memory:")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE sales (sale_id INTEGER PRIMARY KEY, total_amount REAL, discount_applied REAL)")
+        cursor.executemany("INSERT INTO sales VALUES (?, ?, ?)", [(1, 0.1 + 0.2, 0.005), (2, 19.99, None)])
+
+        migrate_money_columns(cursor)
+
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(sales)")]
+        assert columns == ['sale_id', 'total_amount_cents', 'discount_applied_cents']
+        assert cursor.execute("SELECT * FROM sales ORDER BY sale_id").fetchall() == [(1, 30, 1), (2, 1999, 0)]
+    finally:
+        conn.close()
@@ -0,0 +1,75 @@
+import pytest
+
+import services
+
+
+def _status(order_id):
+    return next(o['status'] for o in services.get_all_orders_with_customer_names() if o['order_id'] == order_id)
+
+
+def _order(customer_id, *items):
+    return services.create_order(customer_id, [{'product_id': p, 'quantity': q} for p, q in items])
+
+
+def test_orders_move_together(make_product, customer_id):
+    product_id = make_product("Still Water", quantity=10)
+    order_ids = [_order(customer_id, (product_id, 2)) for _ in range(3)]
+
+    result = services.update_order_statuses(order_ids, 'Ready to Pack')
+
+    assert result == {'updated': order_ids, 'rejected': [], 'shortfalls': {}}
+    assert [_status(order_id) for order_id in order_ids] == ['Ready to Pack'] * 3
+
+
+def test_invalid_transitions_are_rejected_and_the_rest_applied(make_product, customer_id):
+    product_id = make_product("Still Water", quantity=10)
+    received, packing, same = (_order(customer_id, (product_id, 1)) for _ in range(3))
+    services.update_order_statuses([packing, same], 'Ready to Pack')
+
+    result = services.update_order_statuses([received, packing, same, 999], 'Ready to Distribute')
+
+    assert result['updated'] == [packing, same]
+    assert result['rejected'] == [
+        (received, "Cannot move from 'Received' to 'Ready to Distribute'."),
+        (999, "Order not found."),
+    ]
+    assert _status(received) == 'Received'
+    assert services.update_order_statuses([packing], 'Ready to Distribute')['updated'] == []
+
+
+def test_unknown_status_raises(make_product, customer_id):
+    order_id = _order(customer_id, (make_product("Still Water"), 1))
+
+    with pytest.raises(ValueError, match="Unknown order status"):
+        services.update_order_statuses([order_id], 'Shipped')
+    assert _status(order_id) == 'Received'
+
+
+def test_orders_short_of_stock_are_rejected_with_their_shortfall(make_product, customer_id):
+    product_id = make_product("Still Water", quantity=5)
+    first, second = _order(customer_id, (product_id, 4)), _order(customer_id, (product_id, 4))
+    services.update_order_statuses([first, second], 'Ready to Pack')
+
+    result = services.update_order_statuses([first, second], 'Ready to Distribute')
+
+    assert result['updated'] == [first]
+    assert result['rejected'] == [(second, "Not enough stock: Still Water (1 of 4).")]
+    assert _status(second) == 'Ready to Pack'
+
+
+def test_pick_list_consolidates_orders(make_product, customer_id):
+    water = make_product("Still Water")
+    juice = make_product("Orange Juice", category='Juice')
+    order_ids = [
+        _order(customer_id, (water, 2), (juice, 1)),
+        _order(customer_id, (water, 3)),
+        _order(customer_id, (juice, 4)),
+    ]
+
+    pick_list = services.get_pick_list(order_ids[:2] + [order_ids[2], order_ids[2]])
+
+    assert [(p['name'], p['total_quantity'], p['order_count']) for p in pick_list] == [
+        ("Orange Juice", 5, 2),
+        ("Still Water", 5, 2),
+    ]
+    assert services.get_pick_list([]) == []
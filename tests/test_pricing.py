@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+
+import pytest
+
+import pricing
+import services
+from database import get_db_connection
+
+
+def _in_days(days):
+    return (date.today() + timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def _quote(product_id, quantity):
+    return services.quote_sale([{'product_id': product_id, 'quantity': quantity}])['total'].cents
+
+
+def test_near_expiry_markdown_applies_only_within_its_window(make_product):
+    soon = make_product("Still Water", expiry_date=_in_days(5), selling_price='100.00')
+    later = make_product("Sparkling Water", expiry_date=_in_days(60), selling_price='100.00')
+    pricing.add_pricing_rule("Clearance", 25, max_days_to_expiry=7)
+
+    assert _quote(soon, 1) == 7500
+    assert _quote(later, 1) == 10000
+
+
+def test_rules_are_limited_to_their_category(make_product):
+    water = make_product("Still Water", category='Water')
+    snack = make_product("Crisps", category='Snack')
+    pricing.add_pricing_rule("Snack promo", 10, category='Snack')
+
+    assert _quote(water, 1) == 10000
+    assert _quote(snack, 1) == 9000
+
+
+def test_quantity_break_and_lowest_price_wins(make_product):
+    product_id = make_product("Still Water", quantity=20)
+    pricing.add_pricing_rule("Any", 5)
+    pricing.add_pricing_rule("Bulk", 20, min_quantity=10)
+
+    assert _quote(product_id, 9) == 9 * 9500
+    assert _quote(product_id, 10) == 10 * 8000
+
+
+def test_markdowns_round_half_up_to_the_cent(make_product):
+    product_id = make_product("Still Water", selling_price='0.50')
+    pricing.add_pricing_rule("Odd", 1)
+
+    # 1% of 50 cents is half a cent, rounded up to 1.
+    assert _quote(product_id, 1) == 49
+
+
+def test_inactive_rules_do_not_apply(make_product):
+    product_id = make_product("Still Water")
+    rule_id = pricing.add_pricing_rule("Any", 50)
+    pricing.set_pricing_rule_active(rule_id, False)
+
+    assert _quote(product_id, 1) == 10000
+
+
+def test_invalid_markdowns_are_rejected():
+    with pytest.raises(ValueError):
+        pricing.add_pricing_rule("Too much", 150)
+    with pytest.raises(ValueError):
+        pricing.add_pricing_rule("Too fine", "0.001")
+
+
+def test_refresh_prices_leaves_the_callers_transaction_open(make_product):
+    make_product("Still Water")
+    pricing.add_pricing_rule("Any", 50)
+
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN")
+        assert pricing.refresh_prices(conn=conn)['full']
+        assert conn.in_transaction
+        conn.rollback()
+    finally:
+        conn.close()
+
+    # The rolled back repricing is still due.
+    assert pricing.refresh_prices()['full']
+
+
+def test_sale_charges_the_promotional_price(make_product):
+    product_id = make_product("Still Water", expiry_date=_in_days(3))
+    pricing.add_pricing_rule("Clearance", 30, max_days_to_expiry=7)
+
+    sale_id = services.create_sale(1, None, [{'product_id': product_id, 'quantity': 2}])
+
+    conn = get_db_connection()
+    try:
+        sale = conn.execute("SELECT total_amount_cents FROM sales WHERE sale_id = ?", (sale_id,)).fetchone()
+        item = conn.execute("SELECT price_per_unit_cents FROM sale_items WHERE sale_id = ?", (sale_id,)).fetchone()
+    finally:
+        conn.close()
+    assert (sale[0], item[0]) == (14000, 7000)
@@ -0,0 +1,113 @@
+import os
+from datetime import date
+
+import pytest
+from sqlcipher3 import dbapi2 as sqlite3
+
+import archive
+import backup
+import recovery
+import services
+from database import get_db_key, open_encrypted_connection
+
+LAST_YEAR = date.today().year - 1
+
+
+def _corrupt_database(db_file):
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+    with open(db_file, 'wb') as f:
+        f.write(os.urandom(8192))
+
+
+def _write_legacy_database(path, passphrase=None):
+    """Writes a file the way versions before raw keys did: SQLCipher 4 defaults, the key text as passphrase."""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(f'PRAGMA key = "{passphrase or get_db_key()}"')
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("CREATE TABLE notes (note TEXT)")
+        conn.execute("INSERT INTO notes VALUES ('kept')")
+        conn.execute("PRAGMA user_version = 5")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _read_converted(path):
+    conn = open_encrypted_connection(path)
+    try:
+        return (
+            conn.execute("SELECT note FROM notes").fetchone()[0],
+            conn.execute("PRAGMA user_version").fetchone()[0],
+            conn.execute("PRAGMA auto_vacuum").fetchone()[0],
+            conn.execute("PRAGMA journal_mode").fetchone()[0],
+        )
+    finally:
+        conn.close()
+
+
+def test_legacy_file_is_rekeyed_to_the_raw_key(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    _write_legacy_database(path)
+    with pytest.raises(sqlite3.DatabaseError):
+        _read_converted(path)
+
+    assert recovery._probe_or_convert(path) is True
+
+    assert _read_converted(path) == ('kept', 5, 2, 'wal')
+    assert not any(name.startswith("legacy.db.rekey") for name in os.listdir(tmp_path))
+    assert recovery._probe_or_convert(path) is False
+
+
+def test_file_under_another_key_is_left_untouched(tmp_path):
+    path = str(tmp_path / "other.db")
+    _write_legacy_database(path, passphrase="some other key")
+    with open(path, 'rb') as f:
+        before = f.read()
+
+    with pytest.raises(sqlite3.DatabaseError):
+        recovery._probe_or_convert(path)
+
+    with open(path, 'rb') as f:
+        assert f.read() == before
+
+
+def test_legacy_archives_are_converted_at_startup():
+    os.makedirs(archive.ARCHIVE_DIR)
+    _write_legacy_database(archive.get_archive_path(LAST_YEAR))
+
+    assert recovery.check_database_on_startup()['status'] == 'ok'
+
+    assert _read_converted(archive.get_archive_path(LAST_YEAR))[0] == 'kept'
+    conn = open_encrypted_connection(archive.get_archive_path(LAST_YEAR))
+    try:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    assert {'sales', 'sale_items', 'activity_logs'} <= tables
+
+
+def test_restores_newest_backup_under_the_database_key(db, make_product):
+    make_product("Still Water")
+    restorable = backup.create_backup(sleep=0)['path']
+    make_product("Sparkling Water")
+    backup.create_backup(backup_key="off-site passphrase", sleep=0)
+    _corrupt_database(db)
+
+    result = recovery.check_database_on_startup()
+
+    assert result['status'] == 'restored'
+    assert result['restored_from'] == restorable
+    assert os.path.exists(result['quarantined'])
+    assert [p['name'] for p in services.get_all_products()] == ["Still Water"]
+
+
+def test_backup_key_backups_are_named_and_skipped(db):
+    path = backup.create_backup(backup_key="off-site passphrase", sleep=0)['path']
+    _corrupt_database(db)
+
+    assert backup.uses_backup_key(path)
+    assert recovery.restore_latest_backup() is None
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import report_cache
+from database import get_db_connection
+from models import Money
+
+LAST_WEEK = (date.today() - timedelta(days=7), date.today() - timedelta(days=1))
+
+
+def _add_sale(sale_date, amount_cents=1000):
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            "INSERT INTO sales (user_id, sale_date, total_amount_cents) VALUES (1, ?, ?)",
+            (f"{sale_date} 10:00:00", amount_cents)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _persisted_count():
+    conn = get_db_connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM report_cache").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {'calls': self.calls, 'total': Money(1234)}
+
+
+def _report(compute, period=LAST_WEEK, **kwargs):
+    return report_cache.get_report('test', period, compute, tables=('users',), sales_period=period, **kwargs)
+
+
+def test_report_is_made_again_only_after_a_sale_in_its_period():
+    compute = Counter()
+    assert _report(compute) == {'calls': 1, 'total': Money(1234)}
+
+    _add_sale(date.today())
+    assert _report(compute)['calls'] == 1
+
+    _add_sale(LAST_WEEK[0])
+    assert _report(compute)['calls'] == 2
+
+
+def test_report_is_made_again_after_a_table_it_reads_changes():
+    compute = Counter()
+    _report(compute)
+
+    conn = get_db_connection()
+    try:
+        conn.execute("UPDATE users SET is_active = 1")
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert _report(compute)['calls'] == 2
+
+
+def test_reports_are_not_persisted_by_default(monkeypatch):
+    compute = Counter()
+    _report(compute)
+    assert _persisted_count() == 0
+
+    monkeypatch.setattr(report_cache, '_cache', OrderedDict())
+    assert _report(compute)['calls'] == 2
+
+
+def test_persisted_report_outlives_the_session(monkeypatch):
+    compute = Counter()
+    _report(compute, persist=True)
+    assert _persisted_count() == 1
+
+    monkeypatch.setattr(report_cache, '_cache', OrderedDict())
+    assert _report(compute, persist=True) == {'calls': 1, 'total': Money(1234)}
+
+    _add_sale(LAST_WEEK[1])
+    assert _report(compute, persist=True)['calls'] == 2
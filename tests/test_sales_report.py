@@ -0,0 +1,35 @@
+from datetime import date, timedelta
+
+import services
+
+
+def test_sales_report_streams_running_totals(make_product):
+    product_id = make_product("Still Water", quantity=10, selling_price='100.00', cost_price='60.00')
+    services.create_sale(1, None, [{'product_id': product_id, 'quantity': 3}])
+    services.create_sale(1, None, [{'product_id': product_id, 'quantity': 2}])
+    today = date.today()
+
+    chunks = list(services.stream_sales_report(today, today, chunk_size=1))
+
+    assert [len(chunk['rows']) for chunk in chunks] == [1, 1]
+    first, last = chunks[0]['rows'][0], chunks[1]['rows'][0]
+    assert (first['revenue_cents'], last['revenue_cents']) == (20000, 30000)
+    assert first['day_sale_count'] == 2
+    assert first['day_revenue_cents'] == first['day_amount_cents'] == 50000
+    assert first['day_cogs_cents'] == 30000
+
+    assert chunks[0]['totals']['total_revenue'].cents == 20000
+    totals = chunks[-1]['totals']
+    assert totals['sale_count'] == 2
+    assert (totals['total_revenue'].cents, totals['total_cogs'].cents) == (50000, 30000)
+    assert totals['gross_profit'].cents == 20000
+
+
+def test_empty_sales_report_yields_one_chunk():
+    yesterday = date.today() - timedelta(days=1)
+
+    chunks = list(services.stream_sales_report(yesterday, yesterday))
+
+    assert len(chunks) == 1
+    assert chunks[0]['rows'] == []
+    assert chunks[0]['totals']['sale_count'] == 0
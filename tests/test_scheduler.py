@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+
+from scheduler import CronTrigger, IntervalTrigger, JobScheduler, create_default_scheduler
+
+
+def test_daily_trigger_fires_at_the_next_matching_minute():
+    trigger = CronTrigger(minute=5, hour=0)
+
+    assert trigger.next_fire_time(datetime(2026, 10, 19, 0, 4, 30)) == datetime(2026, 10, 19, 0, 5)
+    assert trigger.next_fire_time(datetime(2026, 10, 19, 0, 5)) == datetime(2026, 10, 20, 0, 5)
+
+
+def test_steps_and_lists():
+    trigger = CronTrigger(minute='*/15', hour='9,17')
+
+    assert trigger.next_fire_time(datetime(2026, 10, 19, 9, 16)) == datetime(2026, 10, 19, 9, 30)
+    assert trigger.next_fire_time(datetime(2026, 10, 19, 9, 50)) == datetime(2026, 10, 19, 17, 0)
+
+
+def test_day_of_week_counts_from_sunday():
+    # 2026-10-19 is a Monday.
+    trigger = CronTrigger(minute=0, hour=0, day_of_week=0)
+
+    assert trigger.next_fire_time(datetime(2026, 10, 19, 12, 0)) == datetime(2026, 10, 25, 0, 0)
+
+
+def test_day_and_day_of_week_are_either_when_both_restricted():
+    # The 1st of the month or any Friday, as in cron.
+    trigger = CronTrigger(minute=0, hour=0, day=1, day_of_week=5)
+
+    assert trigger.next_fire_time(datetime(2026, 10, 19, 12, 0)) == datetime(2026, 10, 23, 0, 0)
+    assert trigger.next_fire_time(datetime(2026, 10, 30, 12, 0)) == datetime(2026, 11, 1, 0, 0)
+
+
+def test_day_and_day_of_week_are_both_when_one_is_a_wildcard():
+    # Odd days of the month, but only on Fridays: 2026-10-23, then 2026-11-13.
+    trigger = CronTrigger(minute=0, hour=0, day='*/2', day_of_week=5)
+
+    assert trigger.next_fire_time(datetime(2026, 10, 19, 12, 0)) == datetime(2026, 10, 23, 0, 0)
+    assert trigger.next_fire_time(datetime(2026, 10, 24, 12, 0)) == datetime(2026, 11, 13, 0, 0)
+
+
+def test_out_of_range_values_are_rejected():
+    with pytest.raises(ValueError):
+        CronTrigger(hour=24)
+
+
+def test_archiving_is_opt_in():
+    assert 'archive' not in create_default_scheduler().jobs
+    assert 'archive' in create_default_scheduler(archive_closed_years=True).jobs
+
+
+def test_job_results_are_kept_in_the_metrics():
+    scheduler = JobScheduler()
+    scheduler.add_job('report', lambda: {'pages_released': 3}, IntervalTrigger(hours=1))
+
+    scheduler._execute(scheduler.jobs['report'])
+
+    metrics = scheduler.get_metrics()[0]
+    assert (metrics['last_status'], metrics['last_result']) == ('ok', {'pages_released': 3})
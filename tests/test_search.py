@@ -0,0 +1,65 @@
+import pytest
+
+import services
+from database import fts_query, get_db_connection
+
+
+def _product_hits(text):
+    return [hit['title'] for hit in services.search(text, sources=['products'])]
+
+
+def _check_index(table):
+    """Fails if the FTS index of `table` disagrees with the table's rows."""
+    conn = get_db_connection()
+    try:
+        conn.execute(f"INSERT INTO {table}_fts ({table}_fts, rank) VALUES ('integrity-check', 1)")
+    finally:
+        conn.close()
+
+
+def test_index_follows_inserts_updates_and_deletes(make_product):
+    product_id = make_product("Still Water")
+    assert _product_hits("still") == ["Still Water (Water)"]
+
+    services.update_product(product_id, "Sparkling Water", "Water", 5)
+    assert _product_hits("still") == []
+    assert _product_hits("sparkling") == ["Sparkling Water (Water)"]
+    _check_index('products')
+
+    services.delete_product(product_id)
+    assert _product_hits("sparkling") == []
+    _check_index('products')
+
+
+def test_last_word_matches_as_a_prefix(make_product, customer_id):
+    make_product("Still Water")
+
+    assert _product_hits("still wat") == ["Still Water (Water)"]
+    assert _product_hits("wat still") == []
+    hits = services.search("077123", sources=['customers'])
+    assert [(hit['type'], hit['id']) for hit in hits] == [('customer', customer_id)]
+
+
+@pytest.mark.parametrize("text, query", [
+    ("still water", '"still" "water"*'),
+    ('wat"er', '"wat" "er"*'),
+    ("water* OR juice", '"water" "OR" "juice"*'),
+    ("NEAR(a b) -c ^d", '"NEAR" "a" "b" "c" "d"*'),
+    ("", None),
+    ('"*" ()', None),
+])
+def test_fts_query_quotes_every_word(text, query):
+    assert fts_query(text) == query
+
+
+@pytest.mark.parametrize("text", ['"', "water*", "still AND", "(water", "NOT water", "col:water"])
+def test_search_treats_operators_as_text(make_product, text):
+    make_product("Still Water")
+
+    assert isinstance(services.search(text), list)
+
+
+def test_operator_characters_do_not_change_the_match(make_product):
+    make_product("Still Water")
+
+    assert _product_hits("(water*") == _product_hits("water") == ["Still Water (Water)"]
@@ -0,0 +1,25 @@
+import importlib
+import os
+import re
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+LAZY_MODULES = ['gui.main_window', 'gui.inventory_view', 'gui.sales_view', 'gui.order_view', 'gui.reports_view',
+                'tkcalendar', 'ttkthemes']
+
+
+def test_views_are_not_imported_at_startup():
+    code = f"import sys, main; print([m for m in {LAZY_MODULES!r} if m in sys.modules])"
+    output = subprocess.run([sys.executable, "-c", code], cwd=SRC, capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == "[]"
+
+
+def test_lazily_imported_views_exist():
+    with open(os.path.join(SRC, 'main.py'), encoding='utf-8') as f:
+        views = re.findall(r"show_view\('\w+', \"[^\"]*\", '([\w.]+)', '(\w+)'\)", f.read())
+
+    assert {module for module, _ in views} >= set(LAZY_MODULES[:5])
+    for module, class_name in views:
+        assert hasattr(importlib.import_module(module), class_name)
@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+import timeseries
+from database import get_db_connection
+
+
+def _add_sale(day, amount_cents, hour=10):
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            "INSERT INTO sales (user_id, sale_date, total_amount_cents) VALUES (1, ?, ?)",
+            (f"{day} {hour:02d}:00:00", amount_cents)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _days_ago(days):
+    return date.today() - timedelta(days=days)
+
+
+def test_daily_series_sums_sales_per_day():
+    _add_sale(_days_ago(2), 1000, hour=9)
+    _add_sale(_days_ago(2), 500, hour=15)
+    _add_sale(_days_ago(0), 250)
+
+    series = timeseries.get_sales_series(_days_ago(2), date.today(), granularity='day')
+
+    assert series['total_cents'].tolist() == [1500, 0, 250]
+    assert series['sale_count'].tolist() == [2, 0, 1]
+
+
+def test_buckets_added_out_of_hour_order_are_merged_in_order():
+    _add_sale(_days_ago(10), 100)
+    _add_sale(_days_ago(0), 100)
+    timeseries.get_sales_series(_days_ago(10), date.today())
+
+    # Both new buckets fall in the same gap of the cached ones, newest hour first.
+    _add_sale(_days_ago(3), 300)
+    _add_sale(_days_ago(5), 500)
+    _add_sale(_days_ago(10), 50)
+
+    series = timeseries.get_sales_series(_days_ago(10), date.today(), granularity='day')
+    assert np.all(np.diff(timeseries._cache['hours']) > 0)
+    expected = [0] * 11
+    expected[0], expected[5], expected[7], expected[10] = 150, 500, 300, 100
+    assert series['total_cents'].tolist() == expected
+
+
+def test_merge_sorts_changed_rows_by_hour():
+    timeseries._merge([("2026-01-01 00", 1, 100), ("2026-01-05 00", 1, 500)], full=True)
+
+    timeseries._merge([("2026-01-04 00", 1, 400), ("2026-01-02 00", 1, 200), ("2026-01-01 00", 2, 150)], full=False)
+
+    assert np.all(np.diff(timeseries._cache['hours']) > 0)
+    assert timeseries._cache['amounts'].tolist() == [150, 200, 400, 500]
+    assert timeseries._cache['counts'].tolist() == [2, 1, 1, 1]
+
+
+def test_merged_points_keep_their_peaks():
+    _add_sale(_days_ago(3), 900)
+    _add_sale(_days_ago(2), 100)
+
+    series = timeseries.get_sales_series(_days_ago(3), _days_ago(0), max_points=2, granularity='day')
+
+    assert series['buckets_per_point'] == 2
+    assert series['high_cents'].tolist() == [900, 0]
+    assert series['low_cents'].tolist() == [100, 0]
+    assert series['total_cents'].tolist() == [1000, 0]
@@ -0,0 +1,98 @@
+import time
+
+import services
+from gui import view_manager
+from gui.view_manager import ViewManager
+
+
+class FakeContainer:
+    """Collects after() callbacks so a test can run them on its own thread."""
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, func):
+        self.pending.append(func)
+
+    def run_pending(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.pending:
+            assert time.monotonic() < deadline, "after() callbacks kept rescheduling"
+            func = self.pending.pop(0)
+            func()
+            time.sleep(0.01)
+
+
+class FakeView:
+    def __init__(self, tables=()):
+        self.DATA_TABLES = tables
+        self.packed = False
+        self.destroyed = False
+        self.refreshes = 0
+
+    def pack(self, **options):
+        self.packed = True
+
+    def pack_forget(self):
+        self.packed = False
+
+    def destroy(self):
+        self.destroyed = True
+
+    def winfo_children(self):
+        return []
+
+    def refresh_view(self):
+        self.refreshes += 1
+
+
+def test_views_are_built_once_and_hidden_between_visits():
+    manager = ViewManager(FakeContainer())
+    built = []
+
+    def factory(name):
+        def build():
+            built.append(name)
+            return FakeView()
+        return build
+
+    orders = manager.show('orders', factory('orders'))
+    reports = manager.show('reports', factory('reports'))
+    assert (orders.packed, reports.packed) == (False, True)
+
+    assert manager.show('orders', factory('orders')) is orders
+    assert built == ['orders', 'reports']
+    assert (orders.packed, reports.packed) == (True, False)
+
+
+def test_least_recently_shown_views_are_evicted(monkeypatch):
+    monkeypatch.setattr(view_manager, 'MAX_CACHED_VIEWS', 2)
+    manager = ViewManager(FakeContainer())
+    first = manager.show('first', FakeView)
+    second = manager.show('second', FakeView)
+    manager.show('first', lambda: first)
+
+    manager.show('third', FakeView)
+
+    assert list(manager.views) == ['first', 'third']
+    assert second.destroyed and not first.destroyed
+
+    manager.clear()
+    assert first.destroyed and manager.views == {}
+
+
+def test_views_refresh_when_their_tables_changed():
+    container = FakeContainer()
+    manager = ViewManager(container)
+    customers = FakeView(tables=('customers',))
+    manager.show('customers', lambda: customers)
+    container.run_pending()
+
+    manager.show('other', FakeView)
+    manager.show('customers', lambda: customers)
+    container.run_pending()
+    assert customers.refreshes == 0
+
+    services.add_customer("Corner Shop", "0771234567", "Main Street")
+    manager.show('customers', lambda: customers)
+    container.run_pending()
+    assert customers.refreshes == 1